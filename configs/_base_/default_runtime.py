@@ -7,3 +7,5 @@ load_from = None
 resume_from = None
 workflow = [('train', 1)]
 cudnn_benchmark = True
+# NOTE: automatic mixed precision training (evaluation runs in the same precision)
+# amp = dict(precision='fp16', loss_scale='dynamic')
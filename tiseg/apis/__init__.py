@@ -1,4 +1,8 @@
+from .export import build_exported_segmentor, export_calculate, load_exported_calculate
 from .test import multi_gpu_test, single_gpu_test
 from .train import set_random_seed, train_segmentor, init_random_seed
 
-__all__ = ['init_random_seed', 'set_random_seed', 'train_segmentor', 'single_gpu_test', 'multi_gpu_test']
+__all__ = [
+    'init_random_seed', 'set_random_seed', 'train_segmentor', 'single_gpu_test', 'multi_gpu_test', 'export_calculate',
+    'load_exported_calculate', 'build_exported_segmentor'
+]
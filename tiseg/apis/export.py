@@ -0,0 +1,118 @@
+import copy
+import inspect
+import os.path as osp
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from tiseg.models import SEGMENTORS
+
+
+class CalculateWrapper(nn.Module):
+    """Expose `calculate` of segmentor as `forward` for tracing."""
+
+    def __init__(self, segmentor):
+        super(CalculateWrapper, self).__init__()
+        self.segmentor = segmentor
+
+    def forward(self, img):
+        outputs = self.segmentor.calculate(img)
+        if isinstance(outputs, list):
+            outputs = tuple(outputs)
+
+        return outputs
+
+
+def export_calculate(model, input_shape, torchscript_file=None, onnx_file=None, opset_version=13):
+    """Export `calculate` of segmentor to TorchScript and/or ONNX with dynamic
+    batch size, height and width.
+
+    Args:
+        model (nn.Module): The segmentor.
+        input_shape (tuple[int]): The (N, C, H, W) shape of dummy input.
+        torchscript_file (str, optional): The TorchScript output file.
+        onnx_file (str, optional): The ONNX output file.
+        opset_version (int): The ONNX opset version. Default: 13
+    """
+    wrapper = CalculateWrapper(model).eval()
+    device = next(model.parameters()).device
+    dummy_input = torch.rand(input_shape, device=device)
+
+    with torch.no_grad():
+        outputs = wrapper(dummy_input)
+    num_outputs = len(outputs) if isinstance(outputs, tuple) else 1
+
+    if torchscript_file is not None:
+        with torch.no_grad():
+            traced = torch.jit.trace(wrapper, dummy_input, check_trace=False)
+        traced = torch.jit.freeze(traced)
+        traced.save(torchscript_file)
+
+    if onnx_file is not None:
+        output_names = [f'output_{i}' for i in range(num_outputs)]
+        dynamic_axes = {name: {0: 'batch', 2: 'height', 3: 'width'} for name in ['img'] + output_names}
+        # use TorchScript based exporter on torch versions which default to
+        # dynamo based exporter.
+        extra_kwargs = {}
+        if 'dynamo' in inspect.signature(torch.onnx.export).parameters:
+            extra_kwargs['dynamo'] = False
+        with torch.no_grad():
+            torch.onnx.export(
+                wrapper,
+                dummy_input,
+                onnx_file,
+                input_names=['img'],
+                output_names=output_names,
+                dynamic_axes=dynamic_axes,
+                opset_version=opset_version,
+                do_constant_folding=True,
+                **extra_kwargs)
+
+
+class ONNXCalculate(object):
+    """Run exported ONNX graph by onnxruntime like `calculate`."""
+
+    def __init__(self, onnx_file, device='cpu'):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError('Please install onnxruntime to run exported ONNX model.')
+
+        providers = ['CPUExecutionProvider']
+        if torch.device(device).type == 'cuda':
+            providers = ['CUDAExecutionProvider'] + providers
+        self.session = ort.InferenceSession(onnx_file, providers=providers)
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, img):
+        outputs = self.session.run(None, {self.input_name: img.detach().float().cpu().numpy().astype(np.float32)})
+        outputs = tuple(torch.from_numpy(output).to(img.device) for output in outputs)
+
+        return outputs if len(outputs) > 1 else outputs[0]
+
+
+def load_exported_calculate(exported_file, device='cpu'):
+    """Load exported graph (.pt TorchScript or .onnx) as a `calculate`
+    callable."""
+    if osp.splitext(exported_file)[1] == '.onnx':
+        return ONNXCalculate(exported_file, device)
+
+    return torch.jit.load(exported_file, map_location=device)
+
+
+def build_exported_segmentor(cfg, exported_file, device='cpu'):
+    """Build segmentor on exported graph (.pt TorchScript or .onnx) without
+    building the network or loading checkpoint, see
+    `BaseSegmentor.from_exported`.
+
+    Args:
+        cfg (dict): The segmentor config (`cfg.model`).
+        exported_file (str): The exported graph file.
+        device (str | torch.device): The inference device. Default: 'cpu'
+    """
+    cfg = copy.deepcopy(cfg)
+    segmentor_cls = SEGMENTORS.get(cfg.pop('type'))
+    exported_calculate = load_exported_calculate(exported_file, device)
+
+    return segmentor_cls.from_exported(exported_calculate, **cfg)
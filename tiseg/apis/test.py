@@ -3,24 +3,28 @@ import torch
 from mmcv.engine import collect_results_cpu, collect_results_gpu
 from mmcv.runner import get_dist_info
 
+from tiseg.utils import MetricAccumulator
+
 
 def single_gpu_test(model, data_loader, pre_eval=False, pre_eval_args={}):
-    """Test with single GPU by progressive mode.
+    """Test with single GPU (or cpu) by progressive mode.
 
     Args:
-        model (nn.Module): Model to be tested.
+        model (nn.Module): Model to be tested, which is wrapped by
+            `MMDataParallel` on gpu or `CPUDataParallel` on cpu.
         data_loader (utils.data.Dataloader): Pytorch data loader.
         pre_eval (bool): Whether to evaluation by pre_eval mode. Default: False
         pre_eval_args (dict): The arguments of `def pre_eval` of dataset. Default: {}
 
     Returns:
-        object: The processor containing results.
+        list | MetricAccumulator: The segmentation results, or the
+            accumulated pre-eval results in pre_eval mode.
     """
     # when none of them is set true, return segmentation results as
     # a list of np.array.
 
     model.eval()
-    results = []
+    results = MetricAccumulator() if pre_eval else []
     dataset = data_loader.dataset
 
     prog_bar = mmcv.ProgressBar(len(dataset))
@@ -34,8 +38,9 @@ def single_gpu_test(model, data_loader, pre_eval=False, pre_eval_args={}):
             # TODO: adapt samples_per_gpu > 1.
             # only samples_per_gpu=1 valid now
             result = dataset.pre_eval(result, indices=batch_indices, **pre_eval_args)
-
-        results.extend(result)
+            results.update(result, batch_indices)
+        else:
+            results.extend(result)
 
         batch_size = len(result)
         for _ in range(batch_size):
@@ -56,14 +61,16 @@ def multi_gpu_test(model, data_loader, pre_eval=False, pre_eval_args={}):
         pre_eval_args (dict): The arguments of `def pre_eval` of dataset. Default: {}
 
     Returns:
-        list: list of evaluation pre-results or list of save file names.
+        list | MetricAccumulator: The segmentation results, or the merged
+            pre-eval results of all ranks in pre_eval mode (only on rank 0,
+            the other ranks get None).
     """
 
     # when none of them is set true, return segmentation results as
     # a list of np.array.
 
     model.eval()
-    results = []
+    results = MetricAccumulator() if pre_eval else []
     dataset = data_loader.dataset
     # The pipeline about how the data_loader retrieval samples from dataset:
     # sampler -> batch_sampler -> indices
@@ -87,8 +94,9 @@ def multi_gpu_test(model, data_loader, pre_eval=False, pre_eval_args={}):
             # TODO: adapt samples_per_gpu > 1.
             # only samples_per_gpu=1 valid now
             result = dataset.pre_eval(result, indices=batch_indices, **pre_eval_args)
-
-        results.extend(result)
+            results.update(result, batch_indices)
+        else:
+            results.extend(result)
 
         if rank == 0:
             batch_size = len(result) * world_size
@@ -96,6 +104,15 @@ def multi_gpu_test(model, data_loader, pre_eval=False, pre_eval_args={}):
                 prog_bar.update()
 
     # collect results from all ranks
+    if pre_eval:
+        # the accumulators are small, merge them on rank 0
+        accumulators = collect_results_cpu([results], world_size, None)
+        if rank != 0:
+            return None
+        for accumulator in accumulators[1:]:
+            results.merge(accumulator)
+        return results
+
     # NOTE: GPU memory is really expensive
     gpu_collect = False
     if gpu_collect:
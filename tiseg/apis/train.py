@@ -8,8 +8,8 @@ from mmcv.parallel import MMDataParallel, MMDistributedDataParallel
 from mmcv.runner import HOOKS, build_optimizer, build_runner, get_dist_info
 from mmcv.utils import build_from_cfg, get_logger
 
-from tiseg.datasets import build_dataloader, build_dataset
-from tiseg.utils import DistEvalHook, EvalHook
+from tiseg.datasets import DevicePrefetcher, InstanceBalancedSampler, build_dataloader, build_dataset
+from tiseg.utils import DeferredLogVarsHook, DistEvalHook, EvalHook, HardExampleHook, PrefetchMetricsHook
 
 
 def init_random_seed(seed=None, device='cuda'):
@@ -67,6 +67,9 @@ def train_segmentor(model, dataset, cfg, distributed=False, validate=False, time
 
     # prepare data loaders
     dataset = dataset if isinstance(dataset, (list, tuple)) else [dataset]
+    # `data.sampler = dict(...)` balances the loading cost of batches by the
+    # instance counts of images (see `InstanceBalancedSampler`)
+    sampler_cfg = cfg.data.get('sampler', None)
     data_loaders = [
         build_dataloader(
             ds,
@@ -76,8 +79,29 @@ def train_segmentor(model, dataset, cfg, distributed=False, validate=False, time
             len(cfg.gpu_ids),
             dist=distributed,
             seed=cfg.seed,
-            drop_last=True) for ds in dataset
+            drop_last=True,
+            sampler_cfg=sampler_cfg) for ds in dataset
     ]
+    samplers = [data_loader.sampler for data_loader in data_loaders]
+
+    # prefetch next batches to device while the current step runs
+    prefetch_cfg = cfg.get('prefetch_config', None)
+    prefetch_device = None
+    if prefetch_cfg is not None:
+        if distributed:
+            prefetch_device = torch.device('cuda', torch.cuda.current_device())
+        elif not torch.cuda.is_available():
+            prefetch_device = torch.device('cpu')
+        elif len(cfg.gpu_ids) == 1:
+            prefetch_device = torch.device('cuda', cfg.gpu_ids[0])
+        else:
+            warnings.warn('`prefetch_config` is ignored, because `MMDataParallel` splits batches to multiple gpus.')
+    if prefetch_device is not None:
+        data_loaders = [DevicePrefetcher(data_loader, prefetch_device, **prefetch_cfg) for data_loader in data_loaders]
+
+    # evaluate in the same precision as mixed precision training
+    if cfg.get('amp', None) is not None and model.test_cfg is not None:
+        model.test_cfg.setdefault('precision', cfg.amp.get('precision', 'fp16'))
 
     # put model on gpus
     if distributed:
@@ -109,13 +133,43 @@ def train_segmentor(model, dataset, cfg, distributed=False, validate=False, time
         default_args=dict(
             model=model, batch_processor=None, optimizer=optimizer, work_dir=cfg.work_dir, logger=logger, meta=meta))
 
+    # gradient accumulation over `cumulative_iters` micro-batches, the losses
+    # are scaled and the optimizer steps once per `cumulative_iters` iters.
+    # automatic mixed precision training (`amp = dict(precision='fp16')`) runs
+    # `train_step` under autocast and scales fp16 losses by `AmpOptimizerHook`.
+    optimizer_config = cfg.optimizer_config
+    cumulative_iters = (cfg.model.get('train_cfg') or {}).get('cumulative_iters', 1)
+    amp_cfg = cfg.get('amp', None)
+    if (cumulative_iters > 1 or amp_cfg is not None) and optimizer_config is not None:
+        assert optimizer_config.get('type', 'OptimizerHook') == 'OptimizerHook', \
+            '`cumulative_iters` and `amp` only work with default `OptimizerHook`.'
+        if amp_cfg is not None:
+            optimizer_config = dict(
+                optimizer_config, type='AmpOptimizerHook', cumulative_iters=cumulative_iters, **amp_cfg)
+        else:
+            optimizer_config = dict(
+                optimizer_config, type='CumulativeOptimizerHook', cumulative_iters=cumulative_iters)
+
     # register hooks
-    runner.register_training_hooks(cfg.lr_config, cfg.optimizer_config, cfg.checkpoint_config, cfg.log_config,
+    runner.register_training_hooks(cfg.lr_config, optimizer_config, cfg.checkpoint_config, cfg.log_config,
                                    cfg.get('momentum_config', None))
 
     # an ugly walkaround to make the .log and .log.json filenames the same
     runner.timestamp = timestamp
 
+    if prefetch_device is not None:
+        runner.register_hook(PrefetchMetricsHook(), priority='LOW')
+
+    # keep log variables on device between logged iterations, it must run
+    # before logger hooks (VERY_LOW).
+    if cfg.get('deferred_log_config', None) is not None:
+        runner.register_hook(
+            DeferredLogVarsHook(
+                interval=cfg.log_config.interval,
+                by_epoch=cfg.runner['type'] != 'IterBasedRunner',
+                **cfg.deferred_log_config),
+            priority='LOW')
+
     # register eval hooks
     if validate:
         val_dataset = build_dataset(cfg.data.val, dict(test_mode=True))
@@ -124,7 +178,16 @@ def train_segmentor(model, dataset, cfg, distributed=False, validate=False, time
         eval_cfg = cfg.get('evaluation', {})
         eval_cfg['by_epoch'] = cfg.runner['type'] != 'IterBasedRunner'
         eval_hook = DistEvalHook if distributed else EvalHook
-        runner.register_hook(eval_hook(val_dataloader, **eval_cfg), priority='LOW')
+        eval_hook = eval_hook(val_dataloader, **eval_cfg)
+        # mmcv eval hooks only accept `DataLoader`, so wrap it afterwards
+        if prefetch_device is not None:
+            eval_hook.dataloader = DevicePrefetcher(val_dataloader, prefetch_device, **prefetch_cfg)
+        runner.register_hook(eval_hook, priority='LOW')
+
+        # oversample hard examples by the per-image metrics of evaluation
+        if sampler_cfg is not None and sampler_cfg.get('hard_example_ratio', 0) > 0:
+            samplers = [sampler for sampler in samplers if isinstance(sampler, InstanceBalancedSampler)]
+            runner.register_hook(HardExampleHook(eval_hook, samplers), priority='LOW')
 
     # user-defined hooks
     if cfg.get('custom_hooks', None):
@@ -1,4 +1,7 @@
 from .builder import DATASETS, PIPELINES, build_dataloader, build_dataset
+from .manifest import DataManifest, load_manifest
+from .prefetcher import DevicePrefetcher
+from .samplers import InstanceBalancedSampler, build_instance_count_index
 from .consep import CoNSePDataset
 from .cpm17 import CPM17Dataset
 from .custom import CustomDataset
@@ -13,6 +16,11 @@ __all__ = [
     'PIPELINES',
     'build_dataloader',
     'build_dataset',
+    'DataManifest',
+    'load_manifest',
+    'DevicePrefetcher',
+    'InstanceBalancedSampler',
+    'build_instance_count_index',
     'MoNuSegDataset',
     'CPM17Dataset',
     'CoNSePDataset',
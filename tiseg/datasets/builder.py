@@ -9,6 +9,8 @@ from mmcv.runner import get_dist_info
 from mmcv.utils import Registry, build_from_cfg, digit_version
 from torch.utils.data import DataLoader, DistributedSampler
 
+from .samplers import InstanceBalancedSampler
+
 if platform.system() != 'Windows':
     # https://github.com/pytorch/pytorch/issues/973
     import resource
@@ -38,6 +40,7 @@ def build_dataloader(dataset,
                      drop_last=False,
                      pin_memory=True,
                      persistent_workers=True,
+                     sampler_cfg=None,
                      **kwargs):
     """Build PyTorch DataLoader.
 
@@ -64,20 +67,38 @@ def build_dataloader(dataset,
             This allows to maintain the workers Dataset instances alive.
             The argument also has effect in PyTorch>=1.7.0.
             Default: True
+        sampler_cfg (dict | None): The arguments of
+            `InstanceBalancedSampler`, it balances the loading cost of batches
+            by instance counts and replaces the default (distributed) sampler.
+            Default: None
         kwargs: any keyword argument to be used to initialize DataLoader
 
     Returns:
         DataLoader: A PyTorch dataloader.
     """
     rank, world_size = get_dist_info()
-    if dist:
+    if sampler_cfg is not None:
+        sampler = InstanceBalancedSampler(
+            dataset,
+            samples_per_gpu if dist else num_gpus * samples_per_gpu,
+            workers_per_gpu if dist else num_gpus * workers_per_gpu,
+            num_replicas=world_size if dist else 1,
+            rank=rank if dist else 0,
+            shuffle=shuffle,
+            seed=seed,
+            **sampler_cfg)
+        shuffle = False
+    elif dist:
         sampler = DistributedSampler(
             dataset, world_size, rank, shuffle=shuffle)
         shuffle = False
+    else:
+        sampler = None
+
+    if dist:
         batch_size = samples_per_gpu
         num_workers = workers_per_gpu
     else:
-        sampler = None
         batch_size = num_gpus * samples_per_gpu
         num_workers = num_gpus * workers_per_gpu
 
@@ -3,7 +3,6 @@ import os.path as osp
 import warnings
 from collections import OrderedDict
 
-import mmcv
 import numpy as np
 from mmcv.utils import print_log
 from prettytable import PrettyTable
@@ -11,9 +10,11 @@ from torch.utils.data import Dataset
 
 from tiseg.utils import (pre_eval_all_semantic_metric, pre_eval_bin_aji, pre_eval_bin_pq, pre_eval_to_sem_metrics,
                          pre_eval_to_imw_sem_metrics, pre_eval_aji, pre_eval_pq, pre_eval_to_bin_aji, pre_eval_to_aji,
-                         pre_eval_to_bin_pq, pre_eval_to_pq, pre_eval_to_imw_pq, pre_eval_to_imw_aji)
+                         pre_eval_to_bin_pq, pre_eval_to_pq, pre_eval_to_imw_pq, pre_eval_to_imw_aji, MetricAccumulator)
 from .builder import DATASETS
 from .dataset_mapper import DatasetMapper
+from .gt_cache import GTCache
+from .manifest import load_manifest
 from .utils import re_instance, assign_sem_class_to_insts
 
 
@@ -42,7 +43,9 @@ class CoNICDataset(Dataset):
                  sem_suffix='_sem.png',
                  inst_suffix='_inst.npy',
                  test_mode=False,
-                 split=None):
+                 split=None,
+                 manifest=True,
+                 cache_gt=True):
 
         self.mapper = DatasetMapper(test_mode, processes=processes)
 
@@ -56,6 +59,9 @@ class CoNICDataset(Dataset):
 
         self.test_mode = test_mode
         self.split = split
+        self.manifest = manifest
+        # ground truth of evaluation is normalized once
+        self.gt_cache = GTCache(len(self.CLASSES), enabled=cache_gt)
 
         # join paths if data_root is specified
         if self.data_root is not None:
@@ -67,7 +73,7 @@ class CoNICDataset(Dataset):
                 self.split = osp.join(self.data_root, self.split)
 
         self.data_infos = self.load_annotations(self.img_dir, self.ann_dir, self.img_suffix, self.sem_suffix,
-                                                self.inst_suffix, self.split)
+                                                self.inst_suffix, self.split, self.manifest)
 
     def __len__(self):
         """Total number of samples of data."""
@@ -84,7 +90,7 @@ class CoNICDataset(Dataset):
         data_info = self.data_infos[index]
         return self.mapper(data_info)
 
-    def load_annotations(self, img_dir, ann_dir, img_suffix, sem_suffix, inst_suffix, split=None):
+    def load_annotations(self, img_dir, ann_dir, img_suffix, sem_suffix, inst_suffix, split=None, manifest=True):
         """Load annotation from directory.
         Args:
             img_dir (str): Path to image directory.
@@ -93,35 +99,14 @@ class CoNICDataset(Dataset):
             ann_suffix (str): Suffix of segmentation maps.
             split (str | None): Split txt file. If split is specified, only
                 file with suffix in the splits will be loaded.
+            manifest (bool | str): Whether to cache the data manifest (ids,
+                image shapes and instance counts) in `ann_dir`, or the path
+                of manifest file. Default: True
         Returns:
-            list[dict]: All data info of dataset, data info contains image,
+            DataManifest: All data info of dataset, data info contains image,
                 segmentation map.
         """
-        data_infos = []
-        if split is not None:
-            with open(split, 'r') as fp:
-                for line in fp.readlines():
-                    img_id = line.strip()
-                    img_name = img_id + img_suffix
-                    sem_name = img_id + sem_suffix
-                    inst_name = img_id + inst_suffix
-                    img_file_name = osp.join(img_dir, img_name)
-                    sem_file_name = osp.join(ann_dir, sem_name)
-                    inst_file_name = osp.join(ann_dir, inst_name)
-                    data_info = dict(
-                        file_name=img_file_name, sem_file_name=sem_file_name, inst_file_name=inst_file_name)
-                    data_infos.append(data_info)
-        else:
-            for img_name in mmcv.scandir(img_dir, img_suffix, recursive=True):
-                sem_name = img_name.replace(img_suffix, sem_suffix)
-                inst_name = img_name.replace(img_suffix, inst_suffix)
-                img_file_name = osp.join(img_dir, img_name)
-                sem_file_name = osp.join(ann_dir, sem_name)
-                inst_file_name = osp.join(ann_dir, inst_name)
-                data_info = dict(file_name=img_file_name, sem_file_name=sem_file_name, inst_file_name=inst_file_name)
-                data_infos.append(data_info)
-
-        return data_infos
+        return load_manifest(img_dir, ann_dir, img_suffix, sem_suffix, inst_suffix, split, manifest)
 
     def pre_eval(self, preds, indices, show=False, show_folder='.nuclei_show'):
         """Collect eval result from each iteration.
@@ -155,14 +140,10 @@ class CoNICDataset(Dataset):
         pre_eval_results = []
 
         for pred, index in zip(preds, indices):
-            # img related infos
-            sem_file_name = self.data_infos[index]['sem_file_name']
-            # semantic level label make
-            sem_gt = mmcv.imread(sem_file_name, flag='unchanged', backend='pillow')
-            # instance level label make
-            inst_file_name = self.data_infos[index]['inst_file_name']
-            inst_gt = np.load(inst_file_name)
-            inst_gt = re_instance(inst_gt)
+            # semantic level & instance level (relabelled) ground truth and
+            # the class of each gt instance
+            gt = self.gt_cache.get(index, self.data_infos[index])
+            sem_gt = gt.sem_gt
 
             # metric calculation & post process codes:
             sem_pred = pred['sem_pred'].copy()
@@ -173,19 +154,23 @@ class CoNICDataset(Dataset):
 
             # make contiguous ids
             inst_pred = re_instance(inst_pred)
-            inst_gt = re_instance(inst_gt)
 
             pred_id_list_per_class = assign_sem_class_to_insts(inst_pred, sem_pred, len(self.CLASSES))
-            gt_id_list_per_class = assign_sem_class_to_insts(inst_gt, sem_gt, len(self.CLASSES))
 
             # instance metric calculation
-            aji_pre_eval_res = pre_eval_aji(inst_pred, inst_gt, pred_id_list_per_class, gt_id_list_per_class,
-                                            len(self.CLASSES))
-            bin_aji_pre_eval_res = pre_eval_bin_aji(inst_pred, inst_gt)
-
-            pq_pre_eval_res = pre_eval_pq(inst_pred, inst_gt, pred_id_list_per_class, gt_id_list_per_class,
-                                          len(self.CLASSES))
-            bin_pq_pre_eval_res = pre_eval_bin_pq(inst_pred, inst_gt)
+            aji_pre_eval_res = pre_eval_aji(
+                inst_pred,
+                None,
+                pred_id_list_per_class,
+                gt.id_list_per_class,
+                len(self.CLASSES),
+                gt_comps=gt.comps,
+                gt_inst_areas=gt.inst_areas)
+            bin_aji_pre_eval_res = pre_eval_bin_aji(inst_pred, None, gt_comps=gt.comps)
+
+            pq_pre_eval_res = pre_eval_pq(
+                inst_pred, None, pred_id_list_per_class, gt.id_list_per_class, len(self.CLASSES), gt_comps=gt.comps)
+            bin_pq_pre_eval_res = pre_eval_bin_pq(inst_pred, None, gt_comps=gt.comps)
 
             single_loop_results = dict(
                 bin_aji_pre_eval_res=bin_aji_pre_eval_res,
@@ -211,16 +196,10 @@ class CoNICDataset(Dataset):
             dict[str, float]: Default metrics.
         """
 
-        ret_metrics = {}
         img_ret_metrics = {}
 
-        # list to dict
-        for result in results:
-            for key, value in result.items():
-                if key not in ret_metrics:
-                    ret_metrics[key] = [value]
-                else:
-                    ret_metrics[key].append(value)
+        # stacked per image results of each key
+        ret_metrics = MetricAccumulator.from_results(results).compute()
 
         # semantic metrics
         sem_pre_eval_results = ret_metrics.pop('sem_pre_eval_res')
@@ -5,7 +5,6 @@ from collections import OrderedDict
 
 import cv2
 import matplotlib.pyplot as plt
-import mmcv
 import numpy as np
 from mmcv.utils import print_log
 from prettytable import PrettyTable
@@ -14,11 +13,13 @@ from torch.utils.data import Dataset
 from tiseg.utils import (pre_eval_all_semantic_metric, pre_eval_to_sem_metrics, pre_eval_bin_aji, pre_eval_bin_pq,
                          pre_eval_to_aji, pre_eval_to_pq, pre_eval_to_inst_dice, pre_eval_to_imw_pq,
                          pre_eval_to_imw_aji, pre_eval_to_imw_inst_dice, pre_eval_to_imw_sem_metrics,
-                         pre_eval_to_bin_aji, pre_eval_to_bin_pq)
+                         pre_eval_to_bin_aji, pre_eval_to_bin_pq, MetricAccumulator)
 
 from .builder import DATASETS
 from .dataset_mapper import DatasetMapper
-from .utils import colorize_seg_map, re_instance, get_tc_from_inst
+from .gt_cache import GTCache
+from .manifest import load_manifest
+from .utils import colorize_seg_map, re_instance
 
 
 def draw_all(save_folder,
@@ -128,7 +129,9 @@ class CustomDataset(Dataset):
                  sem_suffix='_sem.png',
                  inst_suffix='_inst.npy',
                  test_mode=False,
-                 split=None):
+                 split=None,
+                 manifest=True,
+                 cache_gt=True):
 
         self.mapper = DatasetMapper(test_mode, processes=processes)
 
@@ -142,6 +145,9 @@ class CustomDataset(Dataset):
 
         self.test_mode = test_mode
         self.split = split
+        self.manifest = manifest
+        # ground truth of evaluation is normalized once
+        self.gt_cache = GTCache(enabled=cache_gt)
 
         # join paths if data_root is specified
         if self.data_root is not None:
@@ -153,7 +159,7 @@ class CustomDataset(Dataset):
                 self.split = osp.join(self.data_root, self.split)
 
         self.data_infos = self.load_annotations(self.img_dir, self.ann_dir, self.img_suffix, self.sem_suffix,
-                                                self.inst_suffix, self.split)
+                                                self.inst_suffix, self.split, self.manifest)
 
     def __len__(self):
         """Total number of samples of data."""
@@ -170,7 +176,7 @@ class CustomDataset(Dataset):
         data_info = self.data_infos[index]
         return self.mapper(data_info)
 
-    def load_annotations(self, img_dir, ann_dir, img_suffix, sem_suffix, inst_suffix, split=None):
+    def load_annotations(self, img_dir, ann_dir, img_suffix, sem_suffix, inst_suffix, split=None, manifest=True):
         """Load annotation from directory.
         Args:
             img_dir (str): Path to image directory.
@@ -179,42 +185,14 @@ class CustomDataset(Dataset):
             ann_suffix (str): Suffix of segmentation maps.
             split (str | None): Split txt file. If split is specified, only
                 file with suffix in the splits will be loaded.
+            manifest (bool | str): Whether to cache the data manifest (ids,
+                image shapes and instance counts) in `ann_dir`, or the path
+                of manifest file. Default: True
         Returns:
-            list[dict]: All data info of dataset, data info contains image,
+            DataManifest: All data info of dataset, data info contains image,
                 segmentation map.
         """
-        data_infos = []
-        if split is not None:
-            with open(split, 'r') as fp:
-                for line in fp.readlines():
-                    img_id = line.strip()
-                    img_name = img_id + img_suffix
-                    sem_name = img_id + sem_suffix
-                    inst_name = img_id + inst_suffix
-                    img_file_name = osp.join(img_dir, img_name)
-                    sem_file_name = osp.join(ann_dir, sem_name)
-                    inst_file_name = osp.join(ann_dir, inst_name)
-                    data_info = dict(
-                        data_id=osp.splitext(img_name)[0],
-                        file_name=img_file_name,
-                        sem_file_name=sem_file_name,
-                        inst_file_name=inst_file_name)
-                    data_infos.append(data_info)
-        else:
-            for img_name in mmcv.scandir(img_dir, img_suffix, recursive=True):
-                sem_name = img_name.replace(img_suffix, sem_suffix)
-                inst_name = img_name.replace(img_suffix, inst_suffix)
-                img_file_name = osp.join(img_dir, img_name)
-                sem_file_name = osp.join(ann_dir, sem_name)
-                inst_file_name = osp.join(ann_dir, inst_name)
-                data_info = dict(
-                    data_id=osp.splitext(img_name)[0],
-                    file_name=img_file_name,
-                    sem_file_name=sem_file_name,
-                    inst_file_name=inst_file_name)
-                data_infos.append(data_info)
-
-        return data_infos
+        return load_manifest(img_dir, ann_dir, img_suffix, sem_suffix, inst_suffix, split, manifest)
 
     def pre_eval(self, preds, indices, show=False, show_folder=None):
         """Collect eval result from each iteration.
@@ -251,12 +229,9 @@ class CustomDataset(Dataset):
             # img related infos
             img_file_name = self.data_infos[index]['file_name']
             img_name = osp.splitext(osp.basename(img_file_name))[0]
-            sem_file_name = self.data_infos[index]['sem_file_name']
-            # semantic level label make
-            sem_gt = mmcv.imread(sem_file_name, flag='unchanged', backend='pillow')
-            # instance level label make
-            inst_file_name = self.data_infos[index]['inst_file_name']
-            inst_gt = re_instance(np.load(inst_file_name))
+            # semantic level & instance level (relabelled) ground truth
+            gt = self.gt_cache.get(index, self.data_infos[index])
+            sem_gt = gt.sem_gt
 
             data_id = osp.basename(self.data_infos[index]['sem_file_name']).replace(self.sem_suffix, '')
 
@@ -270,11 +245,10 @@ class CustomDataset(Dataset):
 
             # make contiguous ids
             inst_pred = re_instance(inst_pred)
-            inst_gt = re_instance(inst_gt)
 
             # instance metric calculation
-            bin_aji_pre_eval_res = pre_eval_bin_aji(inst_pred, inst_gt)
-            bin_pq_pre_eval_res = pre_eval_bin_pq(inst_pred, inst_gt)
+            bin_aji_pre_eval_res = pre_eval_bin_aji(inst_pred, None, gt_comps=gt.comps)
+            bin_pq_pre_eval_res = pre_eval_bin_pq(inst_pred, None, gt_comps=gt.comps)
 
             single_loop_results = dict(
                 name=data_id,
@@ -289,7 +263,6 @@ class CustomDataset(Dataset):
                     tc_sem_pred = pred['tc_sem_pred']
                 else:
                     tc_sem_pred = pred['sem_pred']
-                tc_sem_gt = get_tc_from_inst(inst_gt)
                 draw_all(
                     show_folder,
                     img_name,
@@ -297,9 +270,9 @@ class CustomDataset(Dataset):
                     sem_pred,
                     sem_gt,
                     inst_pred,
-                    inst_gt,
+                    gt.inst_gt,
                     tc_sem_pred,
-                    tc_sem_gt,
+                    gt.tc_gt,
                 )
 
         return pre_eval_results
@@ -317,15 +290,8 @@ class CustomDataset(Dataset):
         """
 
         img_ret_metrics = {}
-        ret_metrics = {}
-
-        # list to dict
-        for result in results:
-            for key, value in result.items():
-                if key not in ret_metrics:
-                    ret_metrics[key] = [value]
-                else:
-                    ret_metrics[key].append(value)
+        # stacked per image results of each key
+        ret_metrics = MetricAccumulator.from_results(results).compute()
 
         # All dataset
         # name id
@@ -420,6 +386,9 @@ class CustomDataset(Dataset):
         storage_results = {
             'mean_metrics': mean_metrics,
             'overall_metrics': overall_metrics,
+            # per image metrics (w/o average) for hard example sampling
+            'img_metrics': dict(name=name_list[:-1], **{key: value[:-1].tolist()
+                                                        for key, value in img_ret_metrics.items()}),
         }
 
         eval_results = {}
@@ -1,4 +1,3 @@
-import copy
 import os.path as osp
 
 import cv2
@@ -34,7 +33,9 @@ class DatasetMapper(object):
             self.processes.append(pipeline)
 
     def __call__(self, data_info):
-        data_info = copy.deepcopy(data_info)
+        # data info is a fresh dict of `DataManifest` (paths only), a shallow
+        # copy is enough to keep the plain dict data infos unchanged
+        data_info = dict(data_info)
 
         img = read_image(data_info['file_name'])
         sem_gt = read_image(data_info['sem_file_name'])
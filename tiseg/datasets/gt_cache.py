@@ -0,0 +1,93 @@
+import mmcv
+import numpy as np
+
+from tiseg.utils import label_inst_components
+from .utils import assign_sem_class_to_insts, get_tc_from_inst, re_instance
+
+
+def _compact(array):
+    """Cast label map to the smallest unsigned integer type."""
+    max_value = int(array.max()) if array.size > 0 else 0
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if max_value <= np.iinfo(dtype).max:
+            return array.astype(dtype, copy=False)
+    return array
+
+
+class GTEntry(object):
+    """The normalized ground truth of one image.
+
+    Attributes:
+        sem_gt (np.ndarray): The semantic map.
+        comps (tuple): The connected components of relabelled instance map
+            (component map, instance id & area of each component), see
+            `label_inst_components`.
+        inst_areas (np.ndarray): The area of each instance (index 0 is the
+            background).
+        id_list_per_class (dict | None): The instance ids of each class, see
+            `assign_sem_class_to_insts`.
+    """
+
+    def __init__(self, sem_gt, inst_gt, num_classes=None):
+        comp_map, comp_parents, comp_areas = label_inst_components(inst_gt)
+        self.sem_gt = _compact(sem_gt)
+        self.comps = (_compact(comp_map), comp_parents, comp_areas)
+        self.inst_areas = np.bincount(comp_parents, weights=comp_areas).astype(np.int64)
+        self.id_list_per_class = None
+        if num_classes is not None:
+            self.id_list_per_class = assign_sem_class_to_insts(inst_gt, sem_gt, num_classes)
+        self._tc_gt = None
+
+    @property
+    def inst_gt(self):
+        """np.ndarray: The relabelled (contiguous ids) instance map."""
+        comp_map, comp_parents, _ = self.comps
+        return comp_parents[comp_map].astype(np.int32)
+
+    @property
+    def tc_gt(self):
+        """np.ndarray: The three-class (background, nuclei, edge) map, it's
+        only made when illustrating results."""
+        if self._tc_gt is None:
+            self._tc_gt = _compact(get_tc_from_inst(self.inst_gt))
+        return self._tc_gt
+
+
+class GTCache(object):
+    """Ground truth cache of `pre_eval`.
+
+    The semantic maps & instance maps are loaded, relabelled and labelled by
+    connected components on the first evaluation, later evaluations only
+    process predictions. The maps are kept in RAM with the smallest integer
+    types.
+
+    Args:
+        num_classes (int | None): The number of classes to assign instance
+            classes, None means class assignments aren't needed.
+            Default: None
+        enabled (bool): Whether to keep the ground truth, if False, it's
+            loaded on every call. Default: True
+    """
+
+    def __init__(self, num_classes=None, enabled=True):
+        self.num_classes = num_classes
+        self.enabled = enabled
+        self.entries = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, index, data_info):
+        """Get the ground truth of `index`-th sample, load it when missing."""
+        if index in self.entries:
+            return self.entries[index]
+
+        sem_gt = mmcv.imread(data_info['sem_file_name'], flag='unchanged', backend='pillow')
+        inst_gt = re_instance(np.load(data_info['inst_file_name']))
+        entry = GTEntry(sem_gt, inst_gt, self.num_classes)
+        if self.enabled:
+            self.entries[index] = entry
+        return entry
+
+    def clear(self):
+        self.entries = {}
@@ -0,0 +1,160 @@
+import hashlib
+import os
+import os.path as osp
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import mmcv
+import numpy as np
+from PIL import Image
+
+
+def _read_shape(path):
+    """Read (h, w) of image from the file header."""
+    if path.endswith('.npy'):
+        return np.load(path, mmap_mode='r').shape[:2]
+    try:
+        with Image.open(path) as img:
+            w, h = img.size
+        return h, w
+    except Exception:
+        return cv2.imread(path, cv2.IMREAD_UNCHANGED).shape[:2]
+
+
+def _count_instances(path):
+    inst_map = np.load(path, mmap_mode='r')
+    return int(np.count_nonzero(np.unique(inst_map)))
+
+
+class DataManifest(object):
+    """Array backed data infos.
+
+    The records of samples (`data_id`, `height`, `width`, `inst_count`) are
+    kept in a structured numpy array (usually memory-mapped from manifest
+    file), and the data info dicts are made on access, so the dataset doesn't
+    hold per-sample dicts and the mapper can modify the returned dict freely.
+
+    Args:
+        records (np.ndarray): The structured array of records.
+        img_dir (str): Path to image directory.
+        ann_dir (str): Path to annotation directory.
+        img_suffix (str): Suffix of images.
+        sem_suffix (str): Suffix of semantic maps.
+        inst_suffix (str): Suffix of instance maps.
+    """
+
+    def __init__(self, records, img_dir, ann_dir, img_suffix, sem_suffix, inst_suffix):
+        self.records = records
+        self.img_dir = img_dir
+        self.ann_dir = ann_dir
+        self.img_suffix = img_suffix
+        self.sem_suffix = sem_suffix
+        self.inst_suffix = inst_suffix
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index):
+        data_id = str(self.records['data_id'][index])
+        return dict(
+            data_id=data_id,
+            file_name=osp.join(self.img_dir, data_id + self.img_suffix),
+            sem_file_name=osp.join(self.ann_dir, data_id + self.sem_suffix),
+            inst_file_name=osp.join(self.ann_dir, data_id + self.inst_suffix))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    @property
+    def data_ids(self):
+        return self.records['data_id']
+
+    @property
+    def img_shapes(self):
+        """np.ndarray: (h, w) of images, shape (N, 2)."""
+        return np.stack([self.records['height'], self.records['width']], axis=1)
+
+    @property
+    def inst_counts(self):
+        """np.ndarray: The number of instances of each sample."""
+        return self.records['inst_count']
+
+
+def build_manifest_records(data_ids, img_dir, ann_dir, img_suffix, inst_suffix, num_threads=8):
+    """Read image shapes & instance counts and make the records array."""
+
+    def _read_record(data_id):
+        h, w = _read_shape(osp.join(img_dir, data_id + img_suffix))
+        return h, w, _count_instances(osp.join(ann_dir, data_id + inst_suffix))
+
+    # file reading is io bound, so threads speed up network-mounted storage
+    with ThreadPoolExecutor(num_threads) as executor:
+        values = list(executor.map(_read_record, data_ids))
+
+    id_len = max([len(data_id) for data_id in data_ids] + [1])
+    records = np.zeros(
+        len(data_ids), dtype=[('data_id', f'U{id_len}'), ('height', 'i4'), ('width', 'i4'), ('inst_count', 'i4')])
+    records['data_id'] = data_ids
+    if len(values) > 0:
+        records['height'], records['width'], records['inst_count'] = zip(*values)
+    return records
+
+
+def load_manifest(img_dir, ann_dir, img_suffix, sem_suffix, inst_suffix, split=None, manifest=True):
+    """Load the data manifest of dataset, build it when no manifest file.
+
+    The manifest file (`.manifest_{hash}.npy` under `ann_dir` by default) is
+    rebuilt when the data ids of split file (or the images scanned from
+    `img_dir` when the split isn't specified) differ from the cached ones.
+
+    Args:
+        img_dir (str): Path to image directory.
+        ann_dir (str): Path to annotation directory.
+        img_suffix (str): Suffix of images.
+        sem_suffix (str): Suffix of semantic maps.
+        inst_suffix (str): Suffix of instance maps.
+        split (str | None): Split txt file. If split is specified, only
+            file with suffix in the splits will be loaded.
+        manifest (bool | str): Whether to cache the manifest, or the path of
+            manifest file. Default: True
+
+    Returns:
+        DataManifest: The data infos of all samples.
+    """
+    manifest_file = None
+    if isinstance(manifest, str):
+        manifest_file = manifest
+    elif manifest:
+        key = '|'.join(str(x) for x in [img_dir, img_suffix, sem_suffix, inst_suffix, split])
+        manifest_file = osp.join(ann_dir, f'.manifest_{hashlib.md5(key.encode()).hexdigest()[:8]}.npy')
+
+    # listing the ids is cheap, reading image shapes & instance counts isn't
+    if split is not None:
+        with open(split, 'r') as fp:
+            data_ids = [line.strip() for line in fp.readlines() if line.strip()]
+    else:
+        data_ids = [img_name[:-len(img_suffix)] for img_name in mmcv.scandir(img_dir, img_suffix, recursive=True)]
+
+    records = None
+    if manifest_file is not None and osp.exists(manifest_file):
+        records = np.load(manifest_file, mmap_mode='r')
+        # rebuild when images (or split) are added or removed
+        if set(records['data_id'].tolist()) != set(data_ids):
+            records = None
+
+    if records is None:
+        records = build_manifest_records(data_ids, img_dir, ann_dir, img_suffix, inst_suffix)
+
+        if manifest_file is not None:
+            # write to temporary file and rename, other processes won't read
+            # a partial manifest
+            tmp_file = f'{manifest_file}.{os.getpid()}.tmp.npy'
+            try:
+                np.save(tmp_file, records)
+                os.replace(tmp_file, manifest_file)
+            except OSError:
+                warnings.warn(f'Failed to save data manifest to {manifest_file}, the manifest is kept in memory.')
+
+    return DataManifest(records, img_dir, ann_dir, img_suffix, sem_suffix, inst_suffix)
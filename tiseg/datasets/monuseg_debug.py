@@ -3,14 +3,13 @@ import os
 import os.path as osp
 from collections import OrderedDict
 
-import mmcv
 import numpy as np
 from mmcv.utils import print_log
 from prettytable import PrettyTable
 from tiseg.utils import (pre_eval_all_semantic_metric, pre_eval_to_sem_metrics, pre_eval_bin_aji, pre_eval_bin_pq,
                          pre_eval_to_aji, pre_eval_to_pq, pre_eval_to_inst_dice, pre_eval_to_imw_pq,
                          pre_eval_to_imw_aji, pre_eval_to_imw_inst_dice, pre_eval_to_imw_sem_metrics,
-                         pre_eval_to_bin_aji, pre_eval_to_bin_pq)
+                         pre_eval_to_bin_aji, pre_eval_to_bin_pq, MetricAccumulator)
 from .builder import DATASETS
 from .utils import re_instance
 from .custom import CustomDataset
@@ -64,12 +63,9 @@ class MoNuSegDatasetDebug(CustomDataset):
 
         for pred, index in zip(preds, indices):
             # img related infos
-            sem_file_name = self.data_infos[index]['sem_file_name']
-            # semantic level label make
-            sem_gt = mmcv.imread(sem_file_name, flag='unchanged', backend='pillow')
-            # instance level label make
-            inst_file_name = self.data_infos[index]['inst_file_name']
-            inst_gt = re_instance(np.load(inst_file_name))
+            # semantic level & instance level (relabelled) ground truth
+            gt = self.gt_cache.get(index, self.data_infos[index])
+            sem_gt = gt.sem_gt
 
             data_id = osp.basename(self.data_infos[index]['sem_file_name']).replace(self.sem_suffix, '')
 
@@ -86,11 +82,10 @@ class MoNuSegDatasetDebug(CustomDataset):
 
             # make contiguous ids
             inst_pred = re_instance(inst_pred)
-            inst_gt = re_instance(inst_gt)
 
             # instance metric calculation
-            bin_aji_pre_eval_res = pre_eval_bin_aji(inst_pred, inst_gt)
-            bin_pq_pre_eval_res = pre_eval_bin_pq(inst_pred, inst_gt)
+            bin_aji_pre_eval_res = pre_eval_bin_aji(inst_pred, None, gt_comps=gt.comps)
+            bin_pq_pre_eval_res = pre_eval_bin_pq(inst_pred, None, gt_comps=gt.comps)
 
             single_loop_results = dict(
                 name=data_id,
@@ -115,15 +110,8 @@ class MoNuSegDatasetDebug(CustomDataset):
         """
 
         img_ret_metrics = {}
-        ret_metrics = {}
-
-        # list to dict
-        for result in results:
-            for key, value in result.items():
-                if key not in ret_metrics:
-                    ret_metrics[key] = [value]
-                else:
-                    ret_metrics[key].append(value)
+        # stacked per image results of each key
+        ret_metrics = MetricAccumulator.from_results(results).compute()
 
         # All dataset
         # name id
@@ -226,6 +214,9 @@ class MoNuSegDatasetDebug(CustomDataset):
         storage_results = {
             'mean_metrics': mean_metrics,
             'overall_metrics': overall_metrics,
+            # per image metrics (w/o average) for hard example sampling
+            'img_metrics': dict(name=name_list[:-1], **{key: value[:-1].tolist()
+                                                        for key, value in img_ret_metrics.items()}),
         }
 
         eval_results = {}
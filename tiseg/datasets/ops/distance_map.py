@@ -5,21 +5,10 @@ Modified from vqdang code at https://github.com/vqdang/hover_net/blob/tensorflow
 import numpy as np
 from skimage import measure
 from skimage.morphology import remove_small_objects
+from scipy.ndimage import find_objects
 from scipy.ndimage.morphology import distance_transform_cdt
 
 
-def get_bounding_box(img):
-    rows = np.any(img, axis=1)
-    cols = np.any(img, axis=0)
-    rmin, rmax = np.where(rows)[0][[0, -1]]
-    cmin, cmax = np.where(cols)[0][[0, -1]]
-    # due to python indexing, need to add 1 to max
-    # else accessing will be 1px in the box, not out
-    rmax += 1
-    cmax += 1
-    return [rmin, rmax, cmin, cmax]
-
-
 class DistanceLabelMake(object):
     """
     Input annotation must be of original shape.
@@ -40,17 +29,20 @@ class DistanceLabelMake(object):
     def _fix_inst(self, inst_gt):
         cur = 0
         new_inst_gt = np.zeros_like(inst_gt)
-        inst_id_list = list(np.unique(inst_gt))
-        for inst_id in inst_id_list:
-            if inst_id == 0:
+        # all instance-wise operations are restricted to instance bounding box.
+        inst_slices = find_objects(inst_gt)
+        for idx, inst_slice in enumerate(inst_slices):
+            if inst_slice is None:
                 continue
-            inst_map = inst_gt == inst_id
+            inst_map = inst_gt[inst_slice] == idx + 1
             inst_map = remove_small_objects(inst_map, 5)
             inst_map = np.array(inst_map, np.uint8)
             remapped_ids = measure.label(inst_map)
+            num_remapped = remapped_ids.max()
             remapped_ids[remapped_ids > 0] += cur
-            new_inst_gt[remapped_ids > 0] = remapped_ids[remapped_ids > 0]
-            cur += len(np.unique(remapped_ids[remapped_ids > 0]))
+            new_inst_box = new_inst_gt[inst_slice]
+            new_inst_box[remapped_ids > 0] = remapped_ids[remapped_ids > 0]
+            cur += num_remapped
 
         return new_inst_gt
 
@@ -65,12 +57,12 @@ class DistanceLabelMake(object):
 
         h, w = inst_gt.shape[:2]
 
-        inst_id_list = list(np.unique(inst_gt))
-        for inst_id in inst_id_list:
-            if inst_id == 0:
+        inst_slices = find_objects(inst_gt)
+        for idx, inst_slice in enumerate(inst_slices):
+            if inst_slice is None:
                 continue
-            inst_map = (inst_gt == inst_id).astype(np.uint8)
-            inst_box = get_bounding_box(inst_map)
+            inst_id = idx + 1
+            inst_box = [inst_slice[0].start, inst_slice[0].stop, inst_slice[1].start, inst_slice[1].stop]
 
             # expand the box by 2px
             inst_box[0] -= 2
@@ -83,7 +75,7 @@ class DistanceLabelMake(object):
             inst_box[1] = min(inst_box[1], h)
             inst_box[3] = min(inst_box[3], w)
 
-            inst_map = inst_map[inst_box[0]:inst_box[1], inst_box[2]:inst_box[3]]
+            inst_map = (inst_gt[inst_box[0]:inst_box[1], inst_box[2]:inst_box[3]] == inst_id).astype(np.uint8)
 
             if inst_map.shape[0] < 2 or inst_map.shape[1] < 2:
                 continue
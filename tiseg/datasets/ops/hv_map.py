@@ -1,18 +1,45 @@
 import numpy as np
-from scipy.ndimage import measurements
-
-
-def get_bounding_box(img):
-    """Get bounding box coordinate information."""
-    rows = np.any(img, axis=1)
-    cols = np.any(img, axis=0)
-    rmin, rmax = np.where(rows)[0][[0, -1]]
-    cmin, cmax = np.where(cols)[0][[0, -1]]
-    # due to python indexing, need to add 1 to max
-    # else accessing will be 1px in the box, not out
-    rmax += 1
-    cmax += 1
-    return [rmin, rmax, cmin, cmax]
+from numba import jit
+from scipy.ndimage import find_objects, measurements
+
+
+@jit(nopython=True)
+def fill_instance_hv(inst_map, com_y, com_x, x_map_box, y_map_box):
+    """Write normalized horizontal & vertical distances of one instance into
+    the box views of hv map."""
+    h, w = inst_map.shape[:2]
+    x_min = 0
+    x_max = 0
+    y_min = 0
+    y_max = 0
+    for i in range(h):
+        for j in range(w):
+            if inst_map[i, j] > 0:
+                x = j + 1 - com_x
+                y = i + 1 - com_y
+                x_min = min(x_min, x)
+                x_max = max(x_max, x)
+                y_min = min(y_min, y)
+                y_max = max(y_max, y)
+
+    for i in range(h):
+        for j in range(w):
+            if inst_map[i, j] > 0:
+                x = j + 1 - com_x
+                y = i + 1 - com_y
+                # normalize min into -1 scale & max into +1 scale
+                if x < 0:
+                    x_map_box[i, j] = np.float32(x) / np.float32(-x_min)
+                elif x > 0:
+                    x_map_box[i, j] = np.float32(x) / np.float32(x_max)
+                else:
+                    x_map_box[i, j] = 0
+                if y < 0:
+                    y_map_box[i, j] = np.float32(y) / np.float32(-y_min)
+                elif y > 0:
+                    y_map_box[i, j] = np.float32(y) / np.float32(y_max)
+                else:
+                    y_map_box[i, j] = 0
 
 
 def gen_instance_hv_map(inst_gt):
@@ -30,12 +57,13 @@ def gen_instance_hv_map(inst_gt):
 
     h, w = inst_gt.shape[:2]
 
-    inst_ids = list(np.unique(inst_gt))
-    for inst_id in inst_ids:
-        if inst_id == 0:
+    # one pass to collect bounding boxes of all instances
+    inst_slices = find_objects(inst_gt)
+    for idx, inst_slice in enumerate(inst_slices):
+        if inst_slice is None:
             continue
-        inst_map = np.array(inst_gt == inst_id, np.uint8)
-        inst_box = get_bounding_box(inst_map)
+        inst_id = idx + 1
+        inst_box = [inst_slice[0].start, inst_slice[0].stop, inst_slice[1].start, inst_slice[1].stop]
 
         # expand the box by 2px
         # Because we first pad the ann at line 207, the bboxes
@@ -50,7 +78,7 @@ def gen_instance_hv_map(inst_gt):
         inst_box[1] = min(inst_box[1], h)
         inst_box[3] = min(inst_box[3], w)
 
-        inst_map = inst_map[inst_box[0]:inst_box[1], inst_box[2]:inst_box[3]]
+        inst_map = inst_gt[inst_box[0]:inst_box[1], inst_box[2]:inst_box[3]] == inst_id
 
         if inst_map.shape[0] < 2 or inst_map.shape[1] < 2:
             continue
@@ -61,37 +89,9 @@ def gen_instance_hv_map(inst_gt):
         inst_com[0] = int(inst_com[0] + 0.5)
         inst_com[1] = int(inst_com[1] + 0.5)
 
-        inst_x_range = np.arange(1, inst_map.shape[1] + 1)
-        inst_y_range = np.arange(1, inst_map.shape[0] + 1)
-        # shifting center of pixels grid to instance center of mass
-        inst_x_range -= inst_com[1]
-        inst_y_range -= inst_com[0]
-
-        inst_x, inst_y = np.meshgrid(inst_x_range, inst_y_range)
-
-        # remove coord outside of instance
-        inst_x[inst_map == 0] = 0
-        inst_y[inst_map == 0] = 0
-        inst_x = inst_x.astype("float32")
-        inst_y = inst_y.astype("float32")
-
-        # normalize min into -1 scale
-        if np.min(inst_x) < 0:
-            inst_x[inst_x < 0] /= -np.amin(inst_x[inst_x < 0])
-        if np.min(inst_y) < 0:
-            inst_y[inst_y < 0] /= -np.amin(inst_y[inst_y < 0])
-        # normalize max into +1 scale
-        if np.max(inst_x) > 0:
-            inst_x[inst_x > 0] /= np.amax(inst_x[inst_x > 0])
-        if np.max(inst_y) > 0:
-            inst_y[inst_y > 0] /= np.amax(inst_y[inst_y > 0])
-
-        ####
         x_map_box = x_map[inst_box[0]:inst_box[1], inst_box[2]:inst_box[3]]
-        x_map_box[inst_map > 0] = inst_x[inst_map > 0]
-
         y_map_box = y_map[inst_box[0]:inst_box[1], inst_box[2]:inst_box[3]]
-        y_map_box[inst_map > 0] = inst_y[inst_map > 0]
+        fill_instance_hv(inst_map, inst_com[0], inst_com[1], x_map_box, y_map_box)
 
     hv_map = np.dstack([x_map, y_map])
     return hv_map
@@ -8,7 +8,7 @@ import numpy as np
 from mmcv.utils import print_log
 from prettytable import PrettyTable
 
-from tiseg.utils import (aggregated_jaccard_index, dice_similarity_coefficient, precision_recall)
+from tiseg.utils import (MetricAccumulator, aggregated_jaccard_index, dice_similarity_coefficient, precision_recall)
 from .builder import DATASETS
 from .custom import CustomDataset
 from .utils import re_instance
@@ -120,14 +120,8 @@ class OSCDDataset(CustomDataset):
             dict[str, float]: Default metrics.
         """
 
-        ret_metrics = {}
-        # list to dict
-        for result in results:
-            for key, value in result.items():
-                if key not in ret_metrics:
-                    ret_metrics[key] = [value]
-                else:
-                    ret_metrics[key].append(value)
+        # stacked per image results of each key
+        ret_metrics = MetricAccumulator.from_results(results).compute()
 
         inst_eval = ['Aji']
         sem_eval = ['IoU', 'Dice', 'Precision', 'Recall']
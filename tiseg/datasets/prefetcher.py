@@ -0,0 +1,162 @@
+import queue
+import threading
+import time
+
+import torch
+from mmcv.parallel import DataContainer
+
+_END = object()
+
+
+def _to_device(obj, device, tensors):
+    """Copy the tensors of batch (except cpu only `DataContainer`, e.g.
+    metas) to device through pinned memory, the copied tensors are appended
+    to `tensors`."""
+    if isinstance(obj, DataContainer):
+        if obj.cpu_only:
+            return obj
+        return DataContainer(
+            _to_device(obj.data, device, tensors),
+            stack=obj.stack,
+            padding_value=obj.padding_value,
+            cpu_only=False,
+            pad_dims=obj.pad_dims)
+    if isinstance(obj, torch.Tensor):
+        # `DataLoader(pin_memory=True)` doesn't pin the tensors in
+        # `DataContainer`, pin them here so the copy is really asynchronous.
+        if obj.device.type == 'cpu' and device.type == 'cuda' and not obj.is_pinned():
+            obj = obj.pin_memory()
+        tensor = obj.to(device, non_blocking=True)
+        tensors.append(tensor)
+        return tensor
+    if isinstance(obj, dict):
+        return {k: _to_device(v, device, tensors) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_to_device(v, device, tensors) for v in obj)
+    return obj
+
+
+class DevicePrefetcher(object):
+    """Wrap data loader to keep the next `num_prefetch` batches in flight.
+
+    A background thread takes batches from data loader and copies the
+    `data`/`label` tensors to cuda device on a side stream, so the loading
+    and host to device copies (from pinned staging memory) overlap with the current
+    step. On cpu, the thread only loads batches ahead. The batches are yielded
+    in the same order as data loader, and the other attributes (`dataset`,
+    `batch_sampler`, `sampler`, ...) are forwarded to data loader, so the
+    wrapper works with runners, `single_gpu_test` and `MMDataParallel` (the
+    scatter of device tensors is a no-op).
+
+    Queue depth metrics: `queue_depth` is the number of ready batches when the
+    last batch is taken, `metrics` summarizes the batches since the last
+    `reset_metrics()`.
+
+    Args:
+        data_loader (DataLoader): The data loader to wrap.
+        device (str | torch.device): The device to prefetch to.
+        num_prefetch (int): The number of batches in flight. Default: 2
+    """
+
+    def __init__(self, data_loader, device, num_prefetch=2):
+        assert num_prefetch > 0
+        self.data_loader = data_loader
+        self.device = torch.device(device)
+        if self.device.type == 'cuda' and self.device.index is None:
+            self.device = torch.device('cuda', torch.cuda.current_device())
+        self.num_prefetch = num_prefetch
+        self.queue_depth = 0
+        self.reset_metrics()
+
+    def __len__(self):
+        return len(self.data_loader)
+
+    def __getattr__(self, name):
+        # only called when the attribute is not found on the wrapper
+        if name == 'data_loader':
+            raise AttributeError(name)
+        return getattr(self.data_loader, name)
+
+    def reset_metrics(self):
+        self._num_batches = 0
+        self._total_depth = 0
+        self._num_empty = 0
+        self._wait_time = 0.
+
+    @property
+    def metrics(self):
+        """dict: The number of batches, mean queue depth, the number of times
+        the queue is empty (the step waits for data) and the total waiting
+        time (s)."""
+        return dict(
+            num_batches=self._num_batches,
+            mean_queue_depth=self._total_depth / max(self._num_batches, 1),
+            num_empty=self._num_empty,
+            wait_time=self._wait_time)
+
+    def _put(self, batch_queue, item, stop):
+        # stop waiting for a free slot when the consumer is gone
+        while not stop.is_set():
+            try:
+                batch_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _load(self, batch_queue, stream, stop):
+        try:
+            if stream is not None:
+                torch.cuda.set_device(self.device)
+            for batch in self.data_loader:
+                tensors, event = [], None
+                if stream is not None:
+                    with torch.cuda.stream(stream):
+                        batch = _to_device(batch, self.device, tensors)
+                        event = torch.cuda.Event()
+                        event.record(stream)
+                if not self._put(batch_queue, (batch, event, tensors), stop):
+                    return
+        except Exception as e:
+            self._put(batch_queue, e, stop)
+            return
+        self._put(batch_queue, _END, stop)
+
+    def __iter__(self):
+        stream = torch.cuda.Stream(self.device) if self.device.type == 'cuda' else None
+        batch_queue = queue.Queue(self.num_prefetch)
+        stop = threading.Event()
+        thread = threading.Thread(target=self._load, args=(batch_queue, stream, stop), daemon=True)
+        thread.start()
+
+        try:
+            while True:
+                depth = batch_queue.qsize()
+                start_time = time.perf_counter()
+                item = batch_queue.get()
+                wait_time = time.perf_counter() - start_time
+
+                if item is _END:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+
+                batch, event, tensors = item
+                if event is not None:
+                    current_stream = torch.cuda.current_stream(self.device)
+                    current_stream.wait_event(event)
+                    # the memory of prefetched tensors is used by current
+                    # stream from now on.
+                    for tensor in tensors:
+                        tensor.record_stream(current_stream)
+
+                self.queue_depth = depth
+                self._num_batches += 1
+                self._total_depth += depth
+                self._num_empty += int(depth == 0)
+                self._wait_time += wait_time
+
+                yield batch
+        finally:
+            stop.set()
+            thread.join()
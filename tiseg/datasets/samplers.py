@@ -0,0 +1,236 @@
+import math
+import os
+import os.path as osp
+import re
+import warnings
+
+import mmcv
+import numpy as np
+from mmcv.runner import get_dist_info
+from torch.utils.data import Sampler
+
+from .manifest import DataManifest
+
+
+def _inst_id(data_info, inst_suffix):
+    """The image id of data info (the name of instance map w/o suffix)."""
+    return osp.basename(data_info['inst_file_name']).replace(inst_suffix, '')
+
+
+def build_instance_count_index(dataset, index_file=None):
+    """Count the nuclei of each image from the instance maps (`_inst.npy`).
+
+    The counts of `DataManifest` are used directly. Otherwise, the counts are
+    cached in a json file (`{inst_id: count}`), only the images missing in
+    the index file are counted, so the index is built once and shared by the
+    following runs.
+
+    Args:
+        dataset (Dataset): The dataset whose data infos have
+            `inst_file_name`.
+        index_file (str | None): The path of index file. Default: None
+            (`inst_count_index.json` under `dataset.ann_dir`).
+
+    Returns:
+        np.ndarray: The number of instances of each sample in dataset.
+    """
+    # the counts are recorded by data manifest
+    if isinstance(dataset.data_infos, DataManifest):
+        return np.array(dataset.data_infos.inst_counts, dtype=np.float64)
+
+    if index_file is None:
+        index_file = osp.join(dataset.ann_dir, 'inst_count_index.json')
+
+    index = mmcv.load(index_file) if osp.exists(index_file) else {}
+    inst_ids = [_inst_id(data_info, dataset.inst_suffix) for data_info in dataset.data_infos]
+
+    missing = [(inst_id, data_info) for inst_id, data_info in zip(inst_ids, dataset.data_infos) if inst_id not in index]
+    if len(missing) > 0:
+        for inst_id, data_info in missing:
+            # only read the map (memory mapped) and count the ids
+            inst_map = np.load(data_info['inst_file_name'], mmap_mode='r')
+            ids = np.unique(inst_map)
+            index[inst_id] = int(np.count_nonzero(ids))
+        # only rank 0 saves the index, and writes to temporary file and
+        # renames, other processes won't read a partial index
+        rank, _ = get_dist_info()
+        if rank == 0:
+            tmp_file = f'{index_file}.{os.getpid()}.tmp.json'
+            try:
+                mmcv.dump(index, tmp_file)
+                os.replace(tmp_file, index_file)
+            except OSError:
+                warnings.warn(f'Failed to save instance count index to {index_file}, the index is kept in memory.')
+
+    return np.array([index[inst_id] for inst_id in inst_ids], dtype=np.float64)
+
+
+def _balanced_partition(costs, sizes):
+    """Split items into bins of given sizes with balanced total costs.
+
+    Greedy LPT: the most expensive item first goes to the cheapest bin which
+    is not full.
+
+    Returns:
+        list[list[int]]: The item indices (positions in `costs`) of each bin.
+    """
+    bins = [[] for _ in sizes]
+    loads = np.zeros(len(sizes))
+    for item in np.argsort(-costs, kind='stable'):
+        free = [i for i, size in enumerate(sizes) if len(bins[i]) < size]
+        target = min(free, key=lambda i: loads[i])
+        bins[target].append(item)
+        loads[target] += costs[item]
+    return bins
+
+
+class InstanceBalancedSampler(Sampler):
+    """Sampler which balances the expected loading cost across batches,
+    workers and ranks.
+
+    The cpu cost of label makers (`UNetLabelMake`, `DirectionLabelMake`,
+    `BoundLabelMake`, ...) grows with the number of nuclei, so the cost of a
+    sample is estimated as `num_instances + base_cost` by the instance count
+    index (see `build_instance_count_index`). The shuffled indices are split
+    to waves of `samples_per_gpu * num_workers * num_replicas` samples (one
+    batch of each worker on each rank), in each wave, the samples are
+    partitioned to ranks and then batches with balanced total costs, so the
+    batches loaded at the same time finish at nearly the same time.
+
+    The semantics are the same as `DistributedSampler`: each rank takes
+    `ceil(len(dataset) / num_replicas)` indices of the padded permutation,
+    and the permutation is determined by `seed` and epoch (`set_epoch`).
+
+    Hard example mode: when `hard_example_ratio > 0` and per-image metrics of
+    the last evaluation are given by `update_hard_examples`, the ratio of
+    samples of an epoch are drawn with the weights `1 - metric` (the images
+    without metric take the mean weight) instead of uniformly. The images are
+    matched by image ids (the patches `{img_id}_{i}` match `img_id`), so the
+    validation set should contain (whole) training images.
+
+    Args:
+        dataset (Dataset): The dataset to sample from.
+        samples_per_gpu (int): The batch size of data loader.
+        num_workers (int): The number of data loader workers.
+        num_replicas (int | None): The number of ranks. Default: None
+        rank (int | None): The rank of current process. Default: None
+        shuffle (bool): Whether to shuffle the indices. Default: True
+        seed (int): The random seed. Default: 0
+        base_cost (float | None): The cost of a sample without nuclei.
+            Default: None (the mean instance count).
+        index_file (str | None): The instance count index file.
+            Default: None
+        hard_example_ratio (float): The ratio of hard examples of an epoch.
+            Default: 0.
+        hard_example_metric (str): The per-image metric of hard examples
+            (the higher the better). Default: 'Aji'
+    """
+
+    def __init__(self,
+                 dataset,
+                 samples_per_gpu,
+                 num_workers,
+                 num_replicas=None,
+                 rank=None,
+                 shuffle=True,
+                 seed=0,
+                 base_cost=None,
+                 index_file=None,
+                 hard_example_ratio=0.,
+                 hard_example_metric='Aji'):
+        _rank, _num_replicas = get_dist_info()
+        self.num_replicas = _num_replicas if num_replicas is None else num_replicas
+        self.rank = _rank if rank is None else rank
+        assert 0 <= hard_example_ratio <= 1
+        if hard_example_ratio > 0 and not shuffle:
+            warnings.warn('hard_example_ratio is ignored, because hard examples are only drawn when shuffle is True.')
+
+        self.dataset = dataset
+        self.samples_per_gpu = samples_per_gpu
+        self.num_workers = max(num_workers, 1)
+        self.shuffle = shuffle
+        self.seed = seed if seed is not None else 0
+        self.epoch = 0
+        self.hard_example_ratio = hard_example_ratio
+        self.hard_example_metric = hard_example_metric
+        self.hard_example_weights = None
+
+        self.num_samples = int(math.ceil(len(dataset) / self.num_replicas))
+        self.total_size = self.num_samples * self.num_replicas
+
+        self.inst_counts = build_instance_count_index(dataset, index_file)
+        if base_cost is None:
+            base_cost = max(self.inst_counts.mean(), 1.) if len(self.inst_counts) > 0 else 1.
+        self.costs = self.inst_counts + base_cost
+
+    def __len__(self):
+        return self.num_samples
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def update_hard_examples(self, img_metrics):
+        """Update the sampling weights of hard examples.
+
+        Args:
+            img_metrics (dict[str, list]): The per-image metrics of the last
+                evaluation, `name` is the image ids.
+        """
+        if self.hard_example_ratio == 0 or img_metrics is None:
+            return
+
+        scores = dict(zip(img_metrics['name'], img_metrics[self.hard_example_metric]))
+        weights = []
+        for data_info in self.dataset.data_infos:
+            inst_id = _inst_id(data_info, self.dataset.inst_suffix)
+            # sliding window patches (`{img_id}_{i}`) take the metric of the
+            # whole image
+            score = scores.get(inst_id, scores.get(re.sub(r'_\d+$', '', inst_id), np.nan))
+            weights.append(1. - score)
+        weights = np.array(weights, dtype=np.float64)
+
+        valid = ~np.isnan(weights)
+        if not valid.any():
+            warnings.warn('No image of the evaluation matches the training set, hard example sampling is skipped.')
+            return
+        weights[~valid] = weights[valid].mean()
+        # keep a small chance for the solved images
+        weights = np.clip(weights, 0, None) + 1e-3
+        self.hard_example_weights = weights / weights.sum()
+
+    def _epoch_indices(self, rng):
+        num_images = len(self.dataset)
+        if not self.shuffle:
+            return np.arange(num_images)
+
+        indices = rng.permutation(num_images)
+        if self.hard_example_weights is not None:
+            num_hard = int(num_images * self.hard_example_ratio)
+            hard_indices = rng.choice(num_images, num_hard, replace=True, p=self.hard_example_weights)
+            indices = rng.permutation(np.concatenate([indices[:num_images - num_hard], hard_indices]))
+        return indices
+
+    def __iter__(self):
+        rng = np.random.default_rng(self.seed + self.epoch)
+        # advance epoch when `set_epoch` isn't called by runner
+        self.epoch += 1
+
+        indices = self._epoch_indices(rng)
+        # add extra samples to make it evenly divisible
+        padding = np.tile(indices, int(math.ceil(self.total_size / len(indices))))
+        indices = np.concatenate([indices, padding[:self.total_size - len(indices)]])
+
+        wave_size = self.samples_per_gpu * self.num_workers * self.num_replicas
+        rank_indices = []
+        for start in range(0, self.total_size, wave_size):
+            wave = indices[start:start + wave_size]
+            # balance ranks, then balance batches of current rank
+            rank_items = _balanced_partition(self.costs[wave], [len(wave) // self.num_replicas] * self.num_replicas)
+            items = np.array(rank_items[self.rank])
+            num_items = len(items)
+            batch_sizes = [min(self.samples_per_gpu, num_items - i) for i in range(0, num_items, self.samples_per_gpu)]
+            for batch in _balanced_partition(self.costs[wave[items]], batch_sizes):
+                rank_indices.extend(wave[items[batch]].tolist())
+
+        assert len(rank_indices) == self.num_samples
+        return iter(rank_indices)
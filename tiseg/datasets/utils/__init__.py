@@ -3,7 +3,7 @@ from .direction_calculation import (angle_to_vector, label_to_vector, vector_to_
 from .draw import colorize_seg_map, Drawer
 from .gradient_calculation import calculate_gradient
 from .instance_semantic import (convert_instance_to_semantic, re_instance, get_tc_from_inst, assign_sem_class_to_insts)
-from .postprocess import mudslide_watershed, align_foreground
+from ...utils.postprocess import mudslide_watershed, align_foreground
 
 __all__ = [
     'calculate_centerpoint', 'calculate_gradient', 'angle_to_vector', 'vector_to_label', 'label_to_vector',
@@ -5,12 +5,15 @@ from skimage import morphology
 def re_instance(instance_map):
     """convert sparse instance ids to continual instance ids for instance
     map."""
-    instance_ids = list(np.unique(instance_map))
-    instance_ids.remove(0) if 0 in instance_ids else None
-    new_instance_map = np.zeros_like(instance_map, dtype=np.int32)
+    # The inverse of np.unique is the rank of each pixel's instance id, so the
+    # relabelling is a single pass over the label map.
+    instance_ids, inverse = np.unique(instance_map, return_inverse=True)
+    new_instance_map = inverse.reshape(instance_map.shape).astype(np.int32) + 1
 
-    for id, instance_id in enumerate(instance_ids):
-        new_instance_map[instance_map == instance_id] = id + 1
+    zero_index = np.searchsorted(instance_ids, 0)
+    if zero_index < len(instance_ids) and instance_ids[zero_index] == 0:
+        new_instance_map[new_instance_map == zero_index + 1] = 0
+        new_instance_map[new_instance_map > zero_index + 1] -= 1
 
     return new_instance_map
 
@@ -57,34 +60,32 @@ def get_tc_from_inst(inst_seg):
     return tc_sem_seg
 
 
-def to_one_hot(mask, num_classes):
-    ret = np.zeros((num_classes, *mask.shape))
-    for i in range(num_classes):
-        ret[i, mask == i] = 1
-
-    return ret
-
-
 def assign_sem_class_to_insts(inst_seg, sem_seg, num_classes):
-    inst_id_list = list(np.unique(inst_seg))
-
+    inst_ids, inverse = np.unique(inst_seg, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    sem_seg = sem_seg.reshape(-1).astype(np.int64)
+
+    # (num_insts, num_classes) overlap table between instances and semantic
+    # classes, built by a single 2D bincount over (inst_id, sem_id) pairs.
+    valid = (sem_seg >= 0) & (sem_seg < num_classes)
+    tp_table = np.bincount(
+        inverse[valid] * num_classes + sem_seg[valid],
+        minlength=len(inst_ids) * num_classes).reshape(len(inst_ids), num_classes)
+    # Remove background class
+    fore_tp_table = tp_table[:, 1:]
+    belong_sem_ids = np.zeros(len(inst_ids), dtype=np.int64)
+    if fore_tp_table.shape[1] > 0:
+        belong_sem_ids = np.where(fore_tp_table.sum(axis=1) > 0, np.argmax(fore_tp_table, axis=1) + 1, 0)
+    belong_sem_ids[inst_ids == 0] = 0
+
+    inst_id_list = list(inst_ids)
+    belong_sem_id_list = list(belong_sem_ids)
     if 0 not in inst_id_list:
         inst_id_list.insert(0, 0)
+        belong_sem_id_list.insert(0, 0)
 
-    sem_seg_one_hot = to_one_hot(sem_seg, num_classes)
-
-    # Remove background class
     inst_id_list_per_class = {}
-    for inst_id in inst_id_list:
-        inst_mask = (inst_seg == inst_id).astype(np.uint8)
-
-        tp = np.sum(inst_mask * sem_seg_one_hot, axis=(-2, -1))
-
-        if np.sum(tp[1:]) > 0 and inst_id != 0:
-            belong_sem_id = np.argmax(tp[1:]) + 1
-        else:
-            belong_sem_id = 0
-
+    for inst_id, belong_sem_id in zip(inst_id_list, belong_sem_id_list):
         if belong_sem_id not in inst_id_list_per_class:
             inst_id_list_per_class[belong_sem_id] = [inst_id]
         else:
@@ -4,6 +4,7 @@ from mmcv.runner import BaseModule
 from torchvision import models
 
 from ..builder import BACKBONES
+from ..utils import checkpoint_forward
 
 MODEL_DICT = {
     'vgg16_bn': models.vgg16_bn,
@@ -26,11 +27,14 @@ class TorchVGG(BaseModule):
                  out_indices=(0, 1, 2, 3, 4, 5),
                  pretrained=True,
                  norm_cfg=dict(type='BN'),
-                 act_cfg=dict(type='ReLU')):
+                 act_cfg=dict(type='ReLU'),
+                 with_cp=False):
         super().__init__()
         self.model_name = model_name
         self.in_channels = in_channels
         self.out_indices = out_indices
+        # activation checkpointing of stages (save memory when training)
+        self.with_cp = with_cp
         if self.output_names is None:
             self.output_names = OUTPUT_NAMES[model_name]
 
@@ -65,7 +69,10 @@ class TorchVGG(BaseModule):
 
         outs = []
         for i, stage in enumerate(self.stages):
-            x = stage(x)
+            if self.with_cp and self.training:
+                x = checkpoint_forward(stage, x)
+            else:
+                x = stage(x)
             if i in self.out_indices:
                 outs.append(x)
         return outs
@@ -1,6 +1,7 @@
 import torch.nn as nn
 from mmcv.cnn import build_activation_layer
 
+from ..utils import checkpoint_forward
 from .unet_head import UNetHead, conv1x1, conv3x3
 
 
@@ -85,6 +86,8 @@ class DGM(nn.Module):
         num_angles (int): The number of angle types. Default: 8
         norm_cfg (dict): The normalize layer config. Default: dict(type='BN')
         act_cfg (dict): The activation layer config. Default: dict(type='ReLU')
+        with_cp (bool): Use activation checkpointing of branch features (RU)
+            to save memory when training. Default: False
     """
 
     def __init__(self,
@@ -96,13 +99,15 @@ class DGM(nn.Module):
                  act_cfg=dict(type='ReLU'),
                  noau=False,
                  use_regression=False,
-                 parallel=False):
+                 parallel=False,
+                 with_cp=False):
         super().__init__()
         self.in_dims = in_dims
         self.feed_dims = feed_dims
         self.num_classes = num_classes
         self.num_angles = num_angles
         self.parallel = parallel
+        self.with_cp = with_cp
 
         if self.parallel:
             self.tc_mask_feats = RU(self.feed_dims, self.feed_dims, norm_cfg, act_cfg)
@@ -132,18 +137,23 @@ class DGM(nn.Module):
         self.tc_mask_conv = nn.Conv2d(self.feed_dims, 3, kernel_size=1)
         self.mask_conv = nn.Conv2d(self.feed_dims, self.num_classes, kernel_size=1)
 
+    def _branch_forward(self, feats, x):
+        if self.with_cp and self.training:
+            return checkpoint_forward(feats, x)
+        return feats(x)
+
     def forward(self, x):
 
         if self.parallel:
-            dir_feature = self.dir_feats(x)
-            mask_feature = self.mask_feats(x)
-            point_feature = self.point_feats(x)
-            tc_mask_feature = self.tc_mask_feats(mask_feature)
+            dir_feature = self._branch_forward(self.dir_feats, x)
+            mask_feature = self._branch_forward(self.mask_feats, x)
+            point_feature = self._branch_forward(self.point_feats, x)
+            tc_mask_feature = self._branch_forward(self.tc_mask_feats, mask_feature)
         else:
-            tc_mask_feature = self.tc_mask_feats(x)
-            dir_feature = self.dir_feats(tc_mask_feature)
-            point_feature = self.point_feats(dir_feature)
-            mask_feature = self.mask_feats(x)
+            tc_mask_feature = self._branch_forward(self.tc_mask_feats, x)
+            dir_feature = self._branch_forward(self.dir_feats, tc_mask_feature)
+            point_feature = self._branch_forward(self.point_feats, dir_feature)
+            mask_feature = self._branch_forward(self.mask_feats, x)
 
         # point branch
         point_logit = self.point_conv(point_feature)
@@ -171,6 +181,7 @@ class MultiTaskCDHead(UNetHead):
                  noau=False,
                  use_regression=False,
                  parallel=False,
+                 dgm_with_cp=False,
                  **kwargs):
         super().__init__(num_classes=num_classes, **kwargs)
         self.num_classes = num_classes
@@ -185,4 +196,5 @@ class MultiTaskCDHead(UNetHead):
             act_cfg=self.act_cfg,
             noau=noau,
             use_regression=use_regression,
-            parallel=parallel)
+            parallel=parallel,
+            with_cp=dgm_with_cp)
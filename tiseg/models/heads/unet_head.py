@@ -3,6 +3,8 @@ import torch.nn as nn
 import torch.nn.functional as F
 from mmcv.cnn import ConvModule
 
+from ..utils import checkpoint_forward
+
 
 def conv1x1(in_dims, out_dims, norm_cfg=None, act_cfg=None):
     return ConvModule(in_dims, out_dims, 1, 1, 0, norm_cfg=norm_cfg, act_cfg=act_cfg)
@@ -57,6 +59,8 @@ class UNetHead(nn.Module):
             Default: [3, 3, 3, 3]
         stage_channels (list[int]): The feedforward channel number of each
             stage. Default: [16, 32, 64, 128]
+        with_cp (bool): Use activation checkpointing of decode stages to save
+            memory when training. Default: False
     """
 
     def __init__(self,
@@ -65,7 +69,8 @@ class UNetHead(nn.Module):
                  skip_in_dims=[64, 128, 256, 512, 512],
                  stage_dims=[16, 32, 64, 128, 256],
                  norm_cfg=dict(type='BN'),
-                 act_cfg=dict(type='ReLU')):
+                 act_cfg=dict(type='ReLU'),
+                 with_cp=False):
         super().__init__()
         self.num_classes = num_classes
         self.bottom_in_dim = bottom_in_dim
@@ -73,6 +78,7 @@ class UNetHead(nn.Module):
         self.stage_dims = stage_dims
         self.norm_cfg = norm_cfg
         self.act_cfg = act_cfg
+        self.with_cp = with_cp
 
         num_layers = len(self.skip_in_dims)
 
@@ -97,7 +103,10 @@ class UNetHead(nn.Module):
 
         decode_layers = self.decode_layers
         for skip, decode_stage in zip(skips, decode_layers):
-            x = decode_stage(x, skip)
+            if self.with_cp and self.training:
+                x = checkpoint_forward(decode_stage, x, skip)
+            else:
+                x = decode_stage(x, skip)
 
         out = x
         if self.num_classes is not None:
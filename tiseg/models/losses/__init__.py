@@ -4,15 +4,15 @@ from .iou import IoU, iou, miou, tiou
 from .cross_entropy_loss import (CrossEntropyLoss, binary_cross_entropy, cross_entropy, mask_cross_entropy,
                                  MultiClassBCELoss)
 from .dice_loss import (DiceLoss, GeneralizedDiceLoss, MultiClassDiceLoss, BatchMultiClassDiceLoss,
-                        BatchMultiClassSigmoidDiceLoss, WeightMulticlassDiceLoss)
-from .var_loss import VarianceLoss
+                        BatchMultiClassSigmoidDiceLoss, WeightMulticlassDiceLoss, CEDiceLoss)
+from .var_loss import VarianceLoss, instance_variance
 from .surface_loss import SurfaceLoss
 from .focal_loss import FocalLoss2d, RobustFocalLoss2d
 from .level_set_loss import LevelsetLoss
 from .ac_loss import ActiveContourLoss, LossVariance
 from .topological_loss import TopologicalLoss
 from .hover_loss import GradientMSELoss
-from .utils import reduce_loss, weight_reduce_loss, weighted_loss
+from .utils import reduce_loss, weight_reduce_loss, weighted_loss, fp32_loss
 
 __all__ = [
     'accuracy', 'Accuracy', 'cross_entropy', 'binary_cross_entropy', 'mask_cross_entropy', 'CrossEntropyLoss',
@@ -20,5 +20,5 @@ __all__ = [
     'Dice', 'dice', 'mdice', 'MultiClassDiceLoss', 'tdice', 'tiou', 'SurfaceLoss', 'BatchMultiClassDiceLoss',
     'FocalLoss2d', 'RobustFocalLoss2d', 'LevelsetLoss', 'ActiveContourLoss', 'TopologicalLoss',
     'BatchMultiClassSigmoidDiceLoss', 'MultiClassBCELoss', 'GradientMSELoss', 'LossVariance',
-    'WeightMulticlassDiceLoss', 'VarianceLoss'
+    'WeightMulticlassDiceLoss', 'VarianceLoss', 'instance_variance', 'CEDiceLoss', 'fp32_loss'
 ]
@@ -1,6 +1,8 @@
 import torch
 import torch.nn as nn
 
+from .var_loss import instance_variance
+
 
 class evolution_area(nn.Module):
     """calcaulate the area of evolution curve."""
@@ -48,15 +50,14 @@ class ActiveContourLoss(nn.Module):
         length = torch.mean((torch.sqrt(delta_pred + epsilon) - torch.sqrt(delta_target + epsilon))**2)
 
         # region term
-        c_in = torch.ones_like(pred)
-        c_out = torch.zeros_like(pred)
-
-        region_in = torch.mean(pred * (target - c_in)**2)  # equ.(12) in the paper, mean is used instead of sum.
-        region_out = torch.mean((1 - pred) * (target - c_out)**2)
+        region_in = torch.mean(pred * (target - 1)**2)  # equ.(12) in the paper, mean is used instead of sum.
+        region_out = torch.mean((1 - pred) * target**2)
         region = region_in + region_out * 1
         loss = self.len_weight * length + region
         if self.w_area:
-            loss += self.area_weight * torch.sum(pred)
+            # the area is averaged over channels, so the loss of multi-class
+            # pred is the mean of per class losses.
+            loss += self.area_weight * torch.sum(pred) / pred.shape[1]
 
         return loss
 
@@ -69,23 +70,4 @@ class LossVariance(nn.Module):
         super(LossVariance, self).__init__()
 
     def forward(self, input, target):
-
-        B = input.size(0)
-
-        loss = 0
-        for k in range(B):
-            unique_vals = target[k].unique()
-            unique_vals = unique_vals[unique_vals != 0]
-            # print(unique_vals)
-            sum_var = 0
-            for val in unique_vals:
-                # print(input[k].shape)
-                # print((target[k] == val).shape)
-                instance = input[k][:, target[k] == val]
-                # print(instance.shape)
-                if instance.size(1) > 1:
-                    sum_var += instance.var(dim=1).sum()
-
-            loss += sum_var / (len(unique_vals) + 1e-8)
-        loss /= B
-        return loss
+        return instance_variance(input, target)
@@ -16,8 +16,8 @@ def _convert_to_one_hot(tensor, bins, on_value=1, off_value=0):
     assert tensor.ndim == 3
     assert on_value != off_value
     tensor_one_hot = F.one_hot(tensor, bins)
-    tensor_one_hot[tensor_one_hot == 1] = on_value
-    tensor_one_hot[tensor_one_hot == 0] = off_value
+    if on_value != 1 or off_value != 0:
+        tensor_one_hot = tensor_one_hot * (on_value - off_value) + off_value
 
     return tensor_one_hot
 
@@ -174,6 +174,72 @@ class MultiClassDiceLoss(nn.Module):
         return loss
 
 
+class CEDiceLoss(nn.Module):
+    """Softmax cross entropy loss & multi-class dice loss in one pass.
+
+    Softmax is calculated once, and the per-class intersections & target
+    areas are reduced by `scatter_add_` of the target labels, so the one-hot
+    target is never built.
+
+    Args:
+        num_classes (int): The number of classes.
+        batch_dice (bool): If True, the dice of each class is calculated over
+            the whole batch and background is skipped (same as
+            `BatchMultiClassDiceLoss`), otherwise the dice is calculated per
+            sample including background (same as `MultiClassDiceLoss`).
+            Default: True
+    """
+
+    def __init__(self, num_classes, batch_dice=True):
+        super(CEDiceLoss, self).__init__()
+        self.num_classes = num_classes
+        self.batch_dice = batch_dice
+
+    def forward(self, logit, target, weight_map=None):
+        """Calculate loss.
+
+        Args:
+            logit (torch.Tensor): NxCxHxW logit.
+            target (torch.Tensor): NxHxW label.
+            weight_map (torch.Tensor, optional): Nx1xHxW pixel weight of both
+                cross entropy loss and dice loss. Default: None
+
+        Returns:
+            tuple[torch.Tensor]: The cross entropy loss & dice loss.
+        """
+        assert target.ndim == 3
+        smooth = 1e-4
+        N, C = logit.shape[:2]
+
+        log_prob = F.log_softmax(logit, dim=1)
+        ce_loss = F.nll_loss(log_prob, target, reduction='none')
+        if weight_map is not None:
+            ce_loss = ce_loss * weight_map[:, 0]
+        ce_loss = torch.mean(ce_loss)
+
+        prob = log_prob.exp()
+        flat_target = target.view(N, -1)
+        target_prob = prob.gather(1, target[:, None]).view(N, -1)
+        if weight_map is None:
+            pixel_weight = torch.ones_like(target_prob)
+            logit_area = prob.sum((-2, -1))
+        else:
+            pixel_weight = weight_map.reshape(N, -1).to(prob.dtype)
+            target_prob = target_prob * pixel_weight
+            logit_area = (prob * weight_map).sum((-2, -1))
+        intersection = prob.new_zeros((N, C)).scatter_add_(1, flat_target, target_prob)
+        target_area = prob.new_zeros((N, C)).scatter_add_(1, flat_target, pixel_weight)
+
+        if self.batch_dice:
+            dice_score = (2 * intersection.sum(0) + smooth) / (logit_area.sum(0) + target_area.sum(0) + smooth)
+            dice_loss = torch.sum(1 - dice_score[1:])
+        else:
+            dice_score = (2 * intersection + smooth) / (logit_area + target_area + smooth)
+            dice_loss = torch.sum(1 - dice_score.sum(0) / N)
+
+        return ce_loss, dice_loss
+
+
 class DiceLoss(nn.Module):
     """The Plain Dice Loss.
 
@@ -12,30 +12,31 @@ class region_levelset(nn.Module):
     def __init__(self):
         super(region_levelset, self).__init__()
 
-    def forward(self, mask_score, norm_img, class_weight):
+    def forward(self, mask_score, norm_img, class_weight, region_mask=None):
         '''
         mask_score: predcited mask scores tensor:(N,C,W,H)
         norm_img: normalizated images tensor:(N,C,W,H)
         class_weight: weight for different classes
+        region_mask: optional binary masks tensor:(N,C,W,H), the image of
+            k-th mask score channel is norm_img * region_mask[:, k]
         '''
-
-        mask_score_shape = mask_score.shape
-        norm_img_shape = norm_img.shape
-        level_set_loss = 0.0
-
-        for i in range(norm_img_shape[1]):
-
-            norm_img_ = torch.unsqueeze(norm_img[:, i], 1)
-            norm_img_ = norm_img_.expand(norm_img_shape[0], mask_score_shape[1], norm_img_shape[2], norm_img_shape[3])
-
-            ave_similarity = torch.sum(norm_img_ * mask_score, (2, 3)) / torch.sum(mask_score, (2, 3))
-            ave_similarity = ave_similarity.view(norm_img_shape[0], mask_score_shape[1], 1, 1)
-
-            region_level = norm_img_ - ave_similarity.expand(norm_img_shape[0], mask_score_shape[1], norm_img_shape[2],
-                                                             norm_img_shape[3])
-
-            region_level_loss = class_weight * region_level * region_level * mask_score
-            level_set_loss += torch.sum(region_level_loss)
+        # sum((img - ave)^2 * w * mask) is expanded into the moments
+        # sum(img^2 * w * mask) - 2 * ave * sum(img * w * mask) + ave^2 * sum(w * mask),
+        # which are reduced by batched matmul over (image channel, mask channel)
+        # pairs, so the (N, C_img, C_mask, H, W) tensor is never built.
+        weighted_mask = class_weight * mask_score
+        region_score = mask_score if region_mask is None else mask_score * region_mask
+        region_weighted_mask = weighted_mask if region_mask is None else weighted_mask * region_mask
+
+        img = norm_img.flatten(2)
+        ave_similarity = torch.einsum('nch,nkh->nck', img, region_score.flatten(2)) / torch.sum(
+            mask_score, (2, 3))[:, None]
+        first_moment = torch.einsum('nch,nkh->nck', img, region_weighted_mask.flatten(2))
+        second_moment = torch.einsum('nch,nkh->nck', img * img, region_weighted_mask.flatten(2))
+        zero_moment = torch.sum(weighted_mask, (2, 3))[:, None]
+
+        level_set_loss = torch.sum(second_moment - 2 * ave_similarity * first_moment +
+                                   ave_similarity * ave_similarity * zero_moment)
 
         return level_set_loss
 
@@ -82,12 +83,12 @@ class LevelsetLoss(nn.Module):
         self.length_weight = length_weight
         self.area_weight = area_weight
 
-    def forward(self, mask_logits, targets, class_weight):
+    def forward(self, mask_logits, targets, class_weight, region_mask=None):
 
         region_levelset_term = region_levelset()
         length_evolution_term = length_evolution()
 
-        region_levelset_loss = region_levelset_term(mask_logits, targets, class_weight)
+        region_levelset_loss = region_levelset_term(mask_logits, targets, class_weight, region_mask)
         length_regu = length_evolution_term(mask_logits, class_weight)
 
         loss_levelst = self.levelset_evo_weight * region_levelset_loss + self.length_weight * length_regu
@@ -1,6 +1,7 @@
 from typing import Iterable, List, Set
 
 import torch
+import torch.nn.functional as F
 import numpy as np
 from torch import einsum
 from torch import Tensor
@@ -59,6 +60,73 @@ def one_hot2dist(seg: np.ndarray) -> np.ndarray:
     return res
 
 
+def _row_distance(mask: Tensor) -> Tensor:
+    """Distance along the last dim to the nearest zero pixel (inf if the row
+    has no zero pixel)."""
+    W = mask.shape[-1]
+    index = torch.arange(W, device=mask.device, dtype=torch.float32).expand(mask.shape)
+    inf = torch.full_like(index, float('inf'))
+    # index of the nearest zero pixel on the left & right
+    left = torch.cummax(torch.where(mask, -inf, index), dim=-1).values
+    right = torch.flip(torch.cummin(torch.flip(torch.where(mask, inf, index), dims=(-1, )), dim=-1).values, dims=(-1, ))
+
+    return torch.minimum(index - left, right - index)
+
+
+def distance_transform(mask: Tensor, block_size: int = 32) -> Tensor:
+    """Exact euclidean distance transform of the last two dims, same as
+    `scipy.ndimage.distance_transform_edt` per map. Maps without zero pixel
+    get 0.
+
+    Cpu tensors are passed to scipy directly (no copy). On other devices, the
+    row distances g are found by cumulative max/min of zero pixel indices,
+    then the column pass takes min of (dy^2 + g(y + dy, x)^2) over all dy for
+    blocks of `block_size` output rows. The number of steps only depends on
+    the shape, so there is no host sync.
+
+    Args:
+        mask (Tensor): ...xHxW binary tensor.
+        block_size (int): The number of output rows of one column pass step,
+            which takes N x block_size x H x W memory. Default: 32
+    """
+    shape = mask.shape
+    H, W = shape[-2:]
+    mask = mask.reshape(-1, H, W) > 0
+    no_zero = mask.flatten(1).all(dim=1)
+
+    if mask.device.type == 'cpu':
+        dist = np.zeros(mask.shape, dtype=np.float32)
+        for i, (single_mask, skip) in enumerate(zip(mask.numpy(), no_zero.tolist())):
+            if not skip:
+                dist[i] = distance(single_mask)
+        return torch.from_numpy(dist).view(shape)
+
+    sq_row_dist = _row_distance(mask)**2
+    sq_row_dist = torch.where(no_zero[:, None, None], torch.zeros_like(sq_row_dist), sq_row_dist)
+
+    rows = torch.arange(H, device=mask.device, dtype=torch.float32)
+    sq_dist = torch.empty_like(sq_row_dist)
+    for start in range(0, H, block_size):
+        # (block_size, H) squared offsets from output rows to all rows
+        sq_offsets = (rows[start:start + block_size, None] - rows[None, :])**2
+        candidates = sq_row_dist[:, None] + sq_offsets[None, :, :, None]
+        sq_dist[:, start:start + block_size] = candidates.min(dim=2).values
+
+    return sq_dist.sqrt().view(shape)
+
+
+def torch_one_hot2dist(seg: Tensor) -> Tensor:
+    """Signed distance maps of BxCxHxW one-hot tensor, same as `one_hot2dist`
+    per sample but run on the tensor device."""
+    posmask = seg > 0
+    negmask = ~posmask
+    res = distance_transform(negmask) * negmask - (distance_transform(posmask) - 1) * posmask
+    # classes without pixels get zero distance map
+    res = res * posmask.flatten(-2).any(dim=-1)[..., None, None]
+
+    return res
+
+
 def simplex(t: Tensor, axis=1) -> bool:
     _sum = t.sum(axis).type(torch.float32)
     _ones = torch.ones_like(_sum, dtype=torch.float32)
@@ -86,15 +154,10 @@ class SurfaceLoss():
     # probs: bcwh, dist_maps: bcwh
     def __call__(self, probs: Tensor, class_maps: Tensor) -> Tensor:
 
-        class_maps = class2one_hot(class_maps, 3)
-        class_maps = class_maps.cpu().numpy()
-        dist_maps = np.zeros(class_maps.shape, dtype=np.float32)
-        for i in range(dist_maps.shape[0]):
-            dist_maps[i] = one_hot2dist(class_maps[i])
-        dist_maps = torch.tensor(dist_maps).cuda()
-
-        assert simplex(probs)
-        assert not one_hot(dist_maps)
+        # distance maps are calculated on the device of target without host
+        # round-trip.
+        class_maps = F.one_hot(class_maps.long(), 3).permute(0, 3, 1, 2)
+        dist_maps = torch_one_hot2dist(class_maps)
 
         pc = probs[:, self.idc, ...].type(torch.float32)
         dc = dist_maps[:, self.idc, ...].type(torch.float32)
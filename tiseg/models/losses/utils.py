@@ -122,6 +122,64 @@ def weighted_loss(loss_func):
     return wrapper
 
 
+def _autocast_device_type():
+    """Get the device type whose autocast is enabled (None if not)."""
+    # torch < 1.10 has neither `torch.autocast` nor cpu autocast
+    if not hasattr(torch, 'autocast') or not hasattr(torch, 'is_autocast_cpu_enabled'):
+        return None
+    for device_type in ('cuda', 'cpu'):
+        try:
+            enabled = torch.is_autocast_enabled(device_type)
+        except TypeError:
+            # torch < 2.4
+            enabled = torch.is_autocast_cpu_enabled() if device_type == 'cpu' else torch.is_autocast_enabled()
+        if enabled:
+            return device_type
+    return None
+
+
+def _to_fp32(obj):
+    if isinstance(obj, torch.Tensor):
+        return obj.float() if obj.is_floating_point() else obj
+    if isinstance(obj, dict):
+        return {k: _to_fp32(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_to_fp32(v) for v in obj)
+    return obj
+
+
+def fp32_loss(loss_func):
+    """Run loss function in fp32 under mixed precision training.
+
+    The floating point tensors in arguments are cast to fp32 and autocast is
+    disabled inside loss function, so the numerically sensitive ops (dice
+    denominators, mse, level set sums, ...) don't run in fp16/bf16. It does
+    nothing when the segmentor trains in fp32 (`train_precision`) or autocast
+    is not enabled.
+
+    :Example:
+
+    >>> class Segmentor(BaseSegmentor):
+    >>>     @fp32_loss
+    >>>     def _sem_loss(self, sem_logit, sem_gt):
+    >>>         ...
+    """
+
+    @functools.wraps(loss_func)
+    def wrapper(*args, **kwargs):
+        if len(args) > 0 and getattr(args[0], 'train_precision', None) == 'fp32':
+            return loss_func(*args, **kwargs)
+
+        device_type = _autocast_device_type()
+        if device_type is None:
+            return loss_func(*args, **kwargs)
+
+        with torch.autocast(device_type=device_type, enabled=False):
+            return loss_func(*_to_fp32(args), **_to_fp32(kwargs))
+
+    return wrapper
+
+
 def overlapping_caculation(pred,
                            target,
                            metric,
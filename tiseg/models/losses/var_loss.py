@@ -6,6 +6,43 @@ import torch.nn as nn
 import torch.nn.functional as F
 
 
+def instance_variance(input, target):
+    """Mean (over instances) of the per-instance variance summed over
+    channels, averaged over batch.
+
+    The (batch, instance) pairs are flattened into segment ids, so the mean &
+    variance of all instances are reduced by `index_add_` at once.
+
+    Args:
+        input (torch.Tensor): BxCxHxW feature map.
+        target (torch.Tensor): BxHxW instance map, 0 is background.
+    """
+    B, C = input.shape[:2]
+    target = target.long()
+    # unique (batch, instance) key of each foreground pixel
+    key = target + torch.arange(B, device=target.device).view(B, 1, 1) * (target.max() + 1)
+    fore = (target > 0).view(-1)
+    key = key.view(-1)[fore]
+    value = input.permute(0, 2, 3, 1).reshape(-1, C)[fore]
+
+    seg_keys, seg_ids = torch.unique(key, return_inverse=True)
+    num_segs = len(seg_keys)
+    seg_batch = seg_keys // (target.max() + 1)
+
+    count = torch.bincount(seg_ids, minlength=num_segs).to(value.dtype)
+    mean = value.new_zeros((num_segs, C)).index_add_(0, seg_ids, value) / count[:, None]
+    sq_dev = value.new_zeros((num_segs, C)).index_add_(0, seg_ids, (value - mean[seg_ids])**2)
+    # unbiased variance like `Tensor.var`, instance with single pixel is
+    # skipped.
+    valid = count > 1
+    seg_var = (sq_dev / (count[:, None] - 1).clamp(min=1)).sum(dim=1) * valid
+
+    sum_var = input.new_zeros(B).index_add_(0, seg_batch, seg_var)
+    num_insts = torch.bincount(seg_batch, minlength=B).to(input.dtype)
+
+    return (sum_var / (num_insts + 1e-8)).mean()
+
+
 class VarianceLoss(nn.Module):
     """ The instances in target should be labeled
     """
@@ -15,21 +52,4 @@ class VarianceLoss(nn.Module):
 
     def forward(self, logit, inst_gt):
         logit = F.softmax(logit, dim=1)
-        B = logit.shape[0]
-
-        loss = 0
-        for k in range(B):
-            inst_ids = inst_gt[k].unique()
-            inst_ids = inst_ids[inst_ids != 0]
-
-            sum_var = 0
-            for inst_id in inst_ids:
-                inst_map = inst_gt[k] == inst_id
-                inst_logit = logit[k][:, inst_map]
-                # The number of pixels included in instance must be larger than 1.
-                if torch.sum(inst_map) > 1:
-                    sum_var += inst_logit.var(dim=1).sum()
-
-            loss += sum_var / (len(inst_ids) + 1e-8)
-        loss /= B
-        return loss
+        return instance_variance(logit, inst_gt)
@@ -1,3 +1,4 @@
+import warnings
 from abc import ABCMeta, abstractmethod
 from collections import OrderedDict
 
@@ -6,21 +7,26 @@ import torch.nn.functional as F
 import torch.distributed as dist
 from mmcv.runner import BaseModule
 
-from tiseg.utils import resize
+from tiseg.utils import PRECISION_DTYPES, get_inference_precision, inference_autocast, resize
 from ..losses import mdice, tdice
 
 
-def _parse_losses(losses):
+def _parse_losses(losses, sync=True):
     """Parse the raw outputs (losses) of the network.
 
     Args:
         losses (dict): Raw output of the network, which usually contain
             losses and other necessary information.
+        sync (bool): Whether to convert log variables to python floats. The
+            log variables are stacked into one tensor, so there is only one
+            all-reduce (when distributed) and at most one host sync.
+            Default: True
 
     Returns:
         tuple[Tensor, dict]: (loss, log_vars), loss is the loss tensor
             which may be a weighted sum of all losses, log_vars contains
-            all the variables to be sent to the logger.
+            all the variables to be sent to the logger (float or 0-dim
+            tensor on device when `sync` is False).
     """
     log_vars = OrderedDict()
     extra_vars = OrderedDict()
@@ -37,12 +43,13 @@ def _parse_losses(losses):
     loss = sum(_value for _key, _value in log_vars.items() if 'loss' in _key)
 
     log_vars['loss'] = loss
-    for loss_name, loss_value in log_vars.items():
-        # reduce loss when distributed training
-        if dist.is_available() and dist.is_initialized():
-            loss_value = loss_value.data.clone()
-            dist.all_reduce(loss_value.div_(dist.get_world_size()))
-        log_vars[loss_name] = loss_value.item()
+    log_values = torch.stack([torch.as_tensor(value, device=loss.device).detach().float()
+                              for value in log_vars.values()])
+    # reduce loss when distributed training
+    if dist.is_available() and dist.is_initialized():
+        dist.all_reduce(log_values.div_(dist.get_world_size()))
+    log_values = log_values.tolist() if sync else log_values.unbind()
+    log_vars = OrderedDict(zip(log_vars.keys(), log_values))
 
     return loss, log_vars, extra_vars
 
@@ -55,11 +62,70 @@ class BaseSegmentor(BaseModule, metaclass=ABCMeta):
         Label: sem_gt, dir_gt, point_gt;
     """
 
+    # set by `DeferredLogVarsHook`: whether to keep log variables on device,
+    # whether the current iteration is logged and whether to calculate
+    # training metrics only on logged iterations.
+    deferred_logging = False
+    logging_iter = True
+    lazy_training_metric = False
+    # set by `AmpOptimizerHook`: the autocast precision of training forward
+    # ('fp32', 'bf16' or 'fp16'), the losses always run in fp32.
+    train_precision = 'fp32'
+
     @abstractmethod
     def calculate(self, img):
         """Calculate the semantic logit result."""
         pass
 
+    def parse_cfg(self):
+        """Parse the options of `train_cfg` & `test_cfg` into attributes.
+
+        Segmentors which keep options as attributes override it and call it in
+        `__init__`, so the segmentor built by `from_exported` has them too.
+        """
+        pass
+
+    @classmethod
+    def from_exported(cls, exported_calculate, num_classes, train_cfg, test_cfg, **kwargs):
+        """Build segmentor on an exported graph (see
+        `tiseg.apis.load_exported_calculate`) without building the network or
+        loading checkpoint, so the split/TTA inference and post-process of
+        segmentor run on the exported graph.
+
+        Args:
+            exported_calculate (callable): The exported `calculate`.
+            num_classes (int): The number of classes.
+            train_cfg (dict): The training config.
+            test_cfg (dict): The testing config.
+        """
+        model = cls.__new__(cls)
+        BaseModule.__init__(model)
+        model.train_cfg = train_cfg
+        model.test_cfg = test_cfg
+        model.num_classes = num_classes
+        model.parse_cfg()
+        model.exported_calculate = exported_calculate
+
+        return model.eval()
+
+    @property
+    def with_exported(self):
+        """Whether the segmentor runs on an exported graph."""
+        return getattr(self, 'exported_calculate', None) is not None
+
+    def run_calculate(self, img):
+        """Run `calculate` at inference, or the exported graph (fp32 inputs)
+        when the segmentor is built by `from_exported`."""
+        if self.with_exported:
+            return self.exported_calculate(img.float())
+
+        return self.calculate(img)
+
+    @property
+    def with_training_metric(self):
+        """Whether to calculate training metrics in this iteration."""
+        return self.logging_iter or not self.lazy_training_metric
+
     @abstractmethod
     def forward(self, **kwargs):
         """When training, the module is required to return loss dict. When
@@ -93,8 +159,9 @@ class BaseSegmentor(BaseModule, metaclass=ABCMeta):
                 DDP, it means the batch size on each GPU), which is used for
                 averaging the logs.
         """
-        losses = self(**data_batch)
-        loss, log_vars, extra_vars = _parse_losses(losses)
+        with inference_autocast(next(self.parameters()).device, self.train_precision):
+            losses = self(**data_batch)
+        loss, log_vars, extra_vars = _parse_losses(losses, sync=not self.deferred_logging)
 
         outputs = dict(loss=loss, log_vars=log_vars, extra_vars=extra_vars, num_samples=len(data_batch['metas']))
 
@@ -284,7 +351,7 @@ class BaseSegmentor(BaseModule, metaclass=ABCMeta):
                 c_end = j + window_size if j + window_size < W1 else W1
 
                 img_patch = img_canvas[:, :, i:r_end, j:c_end]
-                sem_patch = self.calculate(img_patch)
+                sem_patch = self.run_calculate(img_patch)
 
                 ind2_s = j + overlap_size // 2 if j > 0 else 0
                 ind2_e = (j + window_size - overlap_size // 2 if j + window_size < W1 else W1)
@@ -297,7 +364,7 @@ class BaseSegmentor(BaseModule, metaclass=ABCMeta):
     def whole_inference(self, img, meta, rescale):
         """Inference with full image."""
 
-        sem_logit = self.calculate(img)
+        sem_logit = self.run_calculate(img)
 
         return sem_logit
 
@@ -314,31 +381,118 @@ class BaseSegmentor(BaseModule, metaclass=ABCMeta):
         """
         assert self.test_cfg.mode in ['split', 'whole']
 
-        self.rotate_degrees = self.test_cfg.get('rotate_degrees', [0])
-        self.flip_directions = self.test_cfg.get('flip_directions', ['none'])
-        sem_logit_list = []
-        img_ = img
-        for rotate_degree in self.rotate_degrees:
-            for flip_direction in self.flip_directions:
-                img = self.tta_transform(img_, rotate_degree, flip_direction)
+        sem_logit = self.tta_inference(img, meta, rescale)
+        sem_logit = F.softmax(sem_logit, dim=2).mean(dim=0)
 
-                # inference patch or whole img
-                if self.test_cfg.mode == 'split':
-                    sem_logit = self.split_inference(img, meta, rescale)
-                else:
-                    sem_logit = self.whole_inference(img, meta, rescale)
+        if rescale:
+            sem_logit = resize(sem_logit, size=meta['ori_hw'], mode='bilinear', align_corners=False)
 
-                sem_logit = self.reverse_tta_transform(sem_logit, rotate_degree, flip_direction)
-                sem_logit = F.softmax(sem_logit, dim=1)
+        return sem_logit
 
-                sem_logit_list.append(sem_logit)
+    def tta_variants(self):
+        """All (rotate_degree, flip_direction) pairs of TTA."""
+        rotate_degrees = self.test_cfg.get('rotate_degrees', [0])
+        flip_directions = self.test_cfg.get('flip_directions', ['none'])
 
-        sem_logit = sum(sem_logit_list) / len(sem_logit_list)
+        return [(rotate_degree, flip_direction) for rotate_degree in rotate_degrees
+                for flip_direction in flip_directions]
 
-        if rescale:
-            sem_logit = resize(sem_logit, size=meta['ori_hw'], mode='bilinear', align_corners=False)
+    def tta_inference(self, img, meta, rescale):
+        """Batched TTA inference.
 
-        return sem_logit
+        Args:
+            img (Tensor): The input image of shape (N, 3, H, W).
+            meta (dict): Image info dict.
+            rescale (bool): Whether rescale back to original shape.
+
+        Returns:
+            Tensor | tuple[Tensor]: The reverse transformed outputs of each
+                head, which is stacked along the first dim by TTA variants
+                (V, N, C, H, W).
+        """
+        variant_outputs = [None] * len(self.tta_variants())
+        for idx, outputs in self.iter_tta_inference(img, meta, rescale):
+            variant_outputs[idx] = outputs
+
+        if not isinstance(variant_outputs[0], tuple):
+            return torch.stack(variant_outputs, dim=0)
+
+        return tuple(torch.stack(head_outputs, dim=0) for head_outputs in zip(*variant_outputs))
+
+    def iter_tta_inference(self, img, meta, rescale):
+        """Yield the reverse transformed outputs of each TTA variant.
+
+        All TTA variants with the same shape (rotation by 90 or 270 degrees
+        swaps height & width of non-square inputs) are stacked along batch dim
+        and inferred by one split/whole inference. `test_cfg.tta_batch_size`
+        limits the number of variants in one forward (Default: all variants).
+        `test_cfg.precision` ('fp32', 'bf16' or 'fp16') sets the compute
+        dtype of network & split canvases, the yielded outputs are always
+        fp32 for softmax & averaging (fp16 falls back to fp32 on cpu).
+        `test_cfg.channels_last` switches model and inputs to channels last
+        memory format.
+        When `test_cfg.max_tta_memory` (MB) is set, the first forward only
+        takes one variant to measure output memory of a variant, and later
+        forwards take as many variants as the budget allows (at least one, in
+        which case variants are inferred sequentially).
+
+        Args:
+            img (Tensor): The input image of shape (N, 3, H, W).
+            meta (dict): Image info dict.
+            rescale (bool): Whether rescale back to original shape.
+
+        Yields:
+            tuple[int, Tensor | tuple[Tensor]]: The variant index & outputs.
+        """
+        variants = self.tta_variants()
+        tta_batch_size = self.test_cfg.get('tta_batch_size', len(variants))
+        max_tta_memory = self.test_cfg.get('max_tta_memory', None)
+        batch_size = 1 if max_tta_memory is not None else tta_batch_size
+        precision = get_inference_precision(img.device, self.test_cfg.get('precision', 'fp32'))
+        if self.with_exported and precision != 'fp32':
+            warnings.warn(f'The exported graph runs in fp32, {precision} precision is ignored.')
+            precision = 'fp32'
+        channels_last = self.test_cfg.get('channels_last', False)
+        B, _, H, W = img.shape
+
+        if channels_last and not getattr(self, '_channels_last', False):
+            self.to(memory_format=torch.channels_last)
+            self._channels_last = True
+
+        # group variants by transformed shape
+        shape_groups = OrderedDict()
+        for idx, (rotate_degree, _) in enumerate(variants):
+            shape = (H, W) if (rotate_degree // 90) % 2 == 0 else (W, H)
+            shape_groups.setdefault(shape, []).append(idx)
+
+        for group in shape_groups.values():
+            i = 0
+            while i < len(group):
+                batch_idx = group[i:i + batch_size]
+                i += len(batch_idx)
+                batch_img = torch.cat([self.tta_transform(img, *variants[idx]) for idx in batch_idx], dim=0)
+                batch_img = batch_img.to(PRECISION_DTYPES[precision])
+                if channels_last:
+                    batch_img = batch_img.contiguous(memory_format=torch.channels_last)
+
+                # inference patch or whole img
+                with inference_autocast(img.device, precision):
+                    if self.test_cfg.mode == 'split':
+                        outputs = self.split_inference(batch_img, meta, rescale)
+                    else:
+                        outputs = self.whole_inference(batch_img, meta, rescale)
+                del batch_img
+
+                is_tuple = isinstance(outputs, tuple)
+                outputs = tuple(output.float() for output in outputs) if is_tuple else (outputs.float(), )
+                if max_tta_memory is not None:
+                    variant_memory = sum(output.numel() * output.element_size() for output in outputs) / len(batch_idx)
+                    batch_size = int(min(max(max_tta_memory * 2**20 // variant_memory, 1), tta_batch_size))
+
+                for j, idx in enumerate(batch_idx):
+                    variant_output = tuple(
+                        self.reverse_tta_transform(output[j * B:(j + 1) * B], *variants[idx]) for output in outputs)
+                    yield idx, variant_output if is_tuple else variant_output[0]
 
     @classmethod
     def tta_transform(self, img, rotate_degree, flip_direction):
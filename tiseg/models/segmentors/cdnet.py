@@ -10,7 +10,7 @@ from tiseg.utils import resize
 from ..backbones import TorchVGG16BN
 from ..heads.cd_head import CDHead
 from ..builder import SEGMENTORS
-from ..losses import BatchMultiClassDiceLoss, mdice, tdice
+from ..losses import BatchMultiClassDiceLoss, mdice, tdice, fp32_loss
 from ..utils import generate_direction_differential_map
 from .base import BaseSegmentor
 
@@ -24,10 +24,7 @@ class CDNet(BaseSegmentor):
         self.train_cfg = train_cfg
         self.test_cfg = test_cfg
         self.num_classes = num_classes
-        self.num_angles = 8
-
-        # argument
-        self.if_mudslide = self.test_cfg.get('if_mudslide', False)
+        self.parse_cfg()
 
         self.backbone = TorchVGG16BN(in_channels=3, pretrained=True, out_indices=[0, 1, 2, 3, 4, 5])
         self.head = CDHead(
@@ -40,6 +37,13 @@ class CDNet(BaseSegmentor):
             act_cfg=dict(type='ReLU'),
             norm_cfg=dict(type='BN'))
 
+    def parse_cfg(self):
+        """Parse the options of `train_cfg` & `test_cfg` into attributes."""
+        self.num_angles = 8
+
+        # argument
+        self.if_mudslide = self.test_cfg.get('if_mudslide', False)
+
     def calculate(self, img, rescale=False):
         img_feats = self.backbone(img)
         bottom_feat = img_feats[-1]
@@ -77,8 +81,10 @@ class CDNet(BaseSegmentor):
             loss.update(point_loss)
 
             # calculate training metric
-            training_metric_dict = self._training_metric(sem_logit, dir_logit, point_logit, sem_gt_wb, dir_gt, point_gt)
-            loss.update(training_metric_dict)
+            if self.with_training_metric:
+                training_metric_dict = self._training_metric(sem_logit, dir_logit, point_logit, sem_gt_wb, dir_gt,
+                                                             point_gt)
+                loss.update(training_metric_dict)
             return loss
         else:
             assert self.test_cfg is not None
@@ -250,7 +256,7 @@ class CDNet(BaseSegmentor):
                 c_end = j + window_size if j + window_size < W1 else W1
 
                 img_patch = img_canvas[:, :, i:r_end, j:c_end]
-                sem_patch, dir_patch, point_patch = self.calculate(img_patch)
+                sem_patch, dir_patch, point_patch = self.run_calculate(img_patch)
 
                 ind2_s = j + overlap_size // 2 if j > 0 else 0
                 ind2_e = (j + window_size - overlap_size // 2 if j + window_size < W1 else W1)
@@ -270,10 +276,11 @@ class CDNet(BaseSegmentor):
     def whole_inference(self, img, meta, rescale):
         """Inference with full image."""
 
-        sem_logit, dir_logit, point_logit = self.calculate(img)
+        sem_logit, dir_logit, point_logit = self.run_calculate(img)
 
         return sem_logit, dir_logit, point_logit
 
+    @fp32_loss
     def _sem_loss(self, sem_logit, sem_gt, weight_map=None):
         sem_loss = {}
         sem_ce_loss_calculator = nn.CrossEntropyLoss(reduction='none')
@@ -292,6 +299,7 @@ class CDNet(BaseSegmentor):
 
         return sem_loss
 
+    @fp32_loss
     def _dir_loss(self, dir_logit, dir_gt, weight_map=None):
         dir_loss = {}
         dir_ce_loss_calculator = nn.CrossEntropyLoss(reduction='none')
@@ -310,6 +318,7 @@ class CDNet(BaseSegmentor):
 
         return dir_loss
 
+    @fp32_loss
     def _point_loss(self, point_logit, point_gt):
         point_loss = {}
         point_mse_loss_calculator = nn.MSELoss()
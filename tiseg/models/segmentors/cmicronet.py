@@ -8,7 +8,7 @@ from scipy.ndimage import binary_fill_holes
 from mmcv.cnn import ConvModule
 
 from ..builder import SEGMENTORS
-from ..losses import BatchMultiClassDiceLoss
+from ..losses import BatchMultiClassDiceLoss, fp32_loss
 from .base import BaseSegmentor
 
 
@@ -167,8 +167,9 @@ class CMicroNet(BaseSegmentor):
             aux_loss_3 = self._aux_loss(aux_logit_3, sem_gt, idx=3)
             loss.update(aux_loss_3)
             # calculate training metric
-            training_metric_dict = self._training_metric(sem_logit, sem_gt)
-            loss.update(training_metric_dict)
+            if self.with_training_metric:
+                training_metric_dict = self._training_metric(sem_logit, sem_gt)
+                loss.update(training_metric_dict)
             return loss
         else:
             assert metas is not None
@@ -208,6 +209,7 @@ class CMicroNet(BaseSegmentor):
 
         return sem_pred, inst_pred
 
+    @fp32_loss
     def _sem_loss(self, sem_logit, sem_gt):
         """calculate mask branch loss."""
         sem_loss = {}
@@ -225,6 +227,7 @@ class CMicroNet(BaseSegmentor):
 
         return sem_loss
 
+    @fp32_loss
     def _aux_loss(self, sem_logit, sem_gt, idx):
         sem_loss = {}
         sem_ce_loss_calculator = nn.CrossEntropyLoss(reduction='none')
@@ -273,7 +276,7 @@ class CMicroNet(BaseSegmentor):
                 c_end = j + window_size if j + window_size < W1 else W1
 
                 img_patch = img_canvas[:, :, i:r_end, j:c_end]
-                sem_patch = self.calculate(img_patch)
+                sem_patch = self.run_calculate(img_patch)
 
                 ind2_s = j + overlap_size // 2 if j > 0 else 0
                 ind2_e = (j + window_size - overlap_size // 2 if j + window_size < W1 else W1)
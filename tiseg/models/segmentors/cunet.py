@@ -8,7 +8,7 @@ from scipy.ndimage import binary_fill_holes
 from ..backbones import TorchVGG16BN
 from ..builder import SEGMENTORS
 from ..heads import UNetHead
-from ..losses import BatchMultiClassDiceLoss
+from ..losses import BatchMultiClassDiceLoss, fp32_loss
 from .base import BaseSegmentor
 
 
@@ -51,8 +51,9 @@ class CUNet(BaseSegmentor):
             sem_loss = self._sem_loss(sem_logit, sem_gt_wb)
             loss.update(sem_loss)
             # calculate training metric
-            training_metric_dict = self._training_metric(sem_logit, sem_gt_wb)
-            loss.update(training_metric_dict)
+            if self.with_training_metric:
+                training_metric_dict = self._training_metric(sem_logit, sem_gt_wb)
+                loss.update(training_metric_dict)
             return loss
         else:
             assert metas is not None
@@ -92,6 +93,7 @@ class CUNet(BaseSegmentor):
 
         return sem_pred, inst_pred
 
+    @fp32_loss
     def _sem_loss(self, sem_logit, sem_gt):
         """calculate mask branch loss."""
         sem_loss = {}
@@ -141,7 +143,7 @@ class CUNet(BaseSegmentor):
                 c_end = j + window_size if j + window_size < W1 else W1
 
                 img_patch = img_canvas[:, :, i:r_end, j:c_end]
-                sem_patch = self.calculate(img_patch)
+                sem_patch = self.run_calculate(img_patch)
 
                 ind2_s = j + overlap_size // 2 if j > 0 else 0
                 ind2_e = (j + window_size - overlap_size // 2 if j + window_size < W1 else W1)
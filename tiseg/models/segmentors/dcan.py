@@ -13,7 +13,7 @@ from mmcv.cnn import ConvModule
 
 from tiseg.utils import resize
 from ..builder import SEGMENTORS
-from ..losses import BatchMultiClassDiceLoss
+from ..losses import BatchMultiClassDiceLoss, fp32_loss
 from .base import BaseSegmentor
 
 
@@ -173,8 +173,9 @@ class DCAN(BaseSegmentor):
             sem_loss = self._sem_loss(cell_logit, cont_logit, sem_gt, cont_gt)
             loss.update(sem_loss)
             # calculate training metric
-            training_metric_dict = self._training_metric(cell_logit, sem_gt)
-            loss.update(training_metric_dict)
+            if self.with_training_metric:
+                training_metric_dict = self._training_metric(cell_logit, sem_gt)
+                loss.update(training_metric_dict)
             return loss
         else:
             assert metas is not None
@@ -216,6 +217,7 @@ class DCAN(BaseSegmentor):
 
         return sem_pred, inst_pred
 
+    @fp32_loss
     def _sem_loss(self, cell_logit, cont_logit, sem_gt, cont_gt):
         """calculate mask branch loss."""
         sem_loss = {}
@@ -250,32 +252,9 @@ class DCAN(BaseSegmentor):
         """
         assert self.test_cfg.mode in ['split', 'whole']
 
-        self.rotate_degrees = self.test_cfg.get('rotate_degrees', [0])
-        self.flip_directions = self.test_cfg.get('flip_directions', ['none'])
-        cell_logit_list = []
-        cont_logit_list = []
-        img_ = img
-        for rotate_degree in self.rotate_degrees:
-            for flip_direction in self.flip_directions:
-                img = self.tta_transform(img_, rotate_degree, flip_direction)
-
-                # inference
-                if self.test_cfg.mode == 'split':
-                    cell_logit, cont_logit = self.split_inference(img, meta, rescale)
-                else:
-                    cell_logit, cont_logit = self.whole_inference(img, meta, rescale)
-
-                cell_logit = self.reverse_tta_transform(cell_logit, rotate_degree, flip_direction)
-                cont_logit = self.reverse_tta_transform(cont_logit, rotate_degree, flip_direction)
-
-                cell_logit = F.softmax(cell_logit, dim=1)
-                cont_logit = F.softmax(cont_logit, dim=1)
-
-                cell_logit_list.append(cell_logit)
-                cont_logit_list.append(cont_logit)
-
-        cell_logit = sum(cell_logit_list) / len(cell_logit_list)
-        cont_logit = sum(cont_logit_list) / len(cont_logit_list)
+        cell_logit, cont_logit = self.tta_inference(img, meta, rescale)
+        cell_logit = F.softmax(cell_logit, dim=2).mean(dim=0)
+        cont_logit = F.softmax(cont_logit, dim=2).mean(dim=0)
 
         if rescale:
             cell_logit = resize(cell_logit, size=meta['ori_hw'], mode='bilinear', align_corners=False)
@@ -316,7 +295,7 @@ class DCAN(BaseSegmentor):
                 c_end = j + window_size if j + window_size < W1 else W1
 
                 img_patch = img_canvas[:, :, i:r_end, j:c_end]
-                cell_patch, cont_patch = self.calculate(img_patch)
+                cell_patch, cont_patch = self.run_calculate(img_patch)
 
                 ind2_s = j + overlap_size // 2 if j > 0 else 0
                 ind2_e = (j + window_size - overlap_size // 2 if j + window_size < W1 else W1)
@@ -333,6 +312,6 @@ class DCAN(BaseSegmentor):
     def whole_inference(self, img, meta, rescale):
         """Inference with full image."""
 
-        cell_logit, cont_logit = self.calculate(img)
+        cell_logit, cont_logit = self.run_calculate(img)
 
         return cell_logit, cont_logit
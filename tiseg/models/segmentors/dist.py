@@ -8,11 +8,13 @@ import torch.nn.functional as F
 import numpy as np
 from skimage import morphology as morph
 from skimage import measure
+from skimage.morphology import local_minima
+from skimage.segmentation import watershed
 from mmcv.cnn import ConvModule
 
 from tiseg.utils import resize
 from ..builder import SEGMENTORS
-from ..losses import BatchMultiClassDiceLoss
+from ..losses import BatchMultiClassDiceLoss, fp32_loss
 from .base import BaseSegmentor
 
 
@@ -44,12 +46,12 @@ def H_reconstruction_erosion(prob_img, h):
     """
     Performs a H minimma reconstruction via an erosion method.
     """
+    # reconstruction with a zero shift gives the image back.
+    if h == 0:
+        return prob_img.astype(np.dtype('ubyte'))
 
-    def making_top_mask(x, lamb=h):
-        return min(255, x + lamb)
-
-    f = np.vectorize(making_top_mask)
-    shift_prob_img = f(prob_img)
+    # clipped shift on the whole image instead of per-pixel python call.
+    shift_prob_img = np.minimum(prob_img.astype(np.int32) + h, 255)
 
     seed = shift_prob_img
     mask = prob_img
@@ -62,13 +64,20 @@ def find_maxima(img, convertuint8=False, inverse=False, mask=None):
     Finds all local maxima from 2D image.
     """
     img = prepare_prob(img, convertuint8=convertuint8, inverse=inverse)
-    recons = H_reconstruction_erosion(img, 1)
-    if mask is None:
-        return recons - img
+    if img.dtype == np.uint8:
+        # For integer images, the H minima reconstruction with h = 1 minus the
+        # image is exactly the indicator of regional minima, which can be
+        # found directly without any reconstruction.
+        if img.min() == img.max():
+            res = np.full(img.shape, img.min() < 255, dtype=np.uint8)
+        else:
+            res = local_minima(img, connectivity=2, allow_borders=True).astype(np.uint8)
     else:
+        recons = H_reconstruction_erosion(img, 1)
         res = recons - img
+    if mask is not None:
         res[mask == 0] = 0
-        return res
+    return res
 
 
 def get_contours(img, radius=2):
@@ -102,12 +111,10 @@ def arrange_label(mat):
     """
     Arrange label image as to effectively put background to 0.
     """
-    val, counts = np.unique(mat, return_counts=True)
-    background_val = val[np.argmax(counts)]
+    # the most frequent label is taken as background. `measure.label` never
+    # returns negative labels, so no further arrangement is needed.
+    background_val = np.argmax(np.bincount(mat.reshape(-1)))
     mat = measure.label(mat, background=background_val)
-    if np.min(mat) < 0:
-        mat += np.min(mat)
-        mat = arrange_label(mat)
     return mat
 
 
@@ -115,13 +122,13 @@ def dynamic_watershed_alias(p_img, lamb, p_thresh=0.5):
     """
     Applies our dynamic watershed to 2D prob/dist image.
     """
-    b_img = (p_img > p_thresh) + 0
+    b_img = (p_img > p_thresh).astype(np.uint8)
     Probs_inv = prepare_prob(p_img)
 
     Hrecons = H_reconstruction_erosion(Probs_inv, lamb)
     markers_Probs_inv = find_maxima(Hrecons, mask=b_img)
     markers_Probs_inv = measure.label(markers_Probs_inv)
-    ws_labels = morph.watershed(Hrecons, markers_Probs_inv, mask=b_img)
+    ws_labels = watershed(Hrecons, markers_Probs_inv, mask=b_img)
     arranged_label = arrange_label(ws_labels)
     wsl = generate_wsl(arranged_label)
     arranged_label[wsl > 0] = 0
@@ -273,16 +280,14 @@ class DIST(BaseSegmentor):
             return ret_list
 
     def postprocess(self, sem_pred, dist_logit):
-        dist_logit = np.copy(dist_logit)
-        dist_logit[dist_logit > 255] = 255
-        dist_logit[dist_logit < 0] = 0
-        dist_logit = dist_logit.astype('int32')
+        dist_logit = np.clip(dist_logit, 0, 255).astype(np.uint8)
         # lamb is p1 and p_thresh is p2 in the paper, DIST param
         inst_pred = dynamic_watershed_alias(dist_logit, 0.0, 0.5)
         # sem_pred = (inst_pred > 0).astype(np.uint8)
 
         return sem_pred, inst_pred
 
+    @fp32_loss
     def _sem_loss(self, sem_logit, sem_label):
         """calculate mask branch loss."""
         sem_loss = {}
@@ -300,6 +305,7 @@ class DIST(BaseSegmentor):
 
         return sem_loss
 
+    @fp32_loss
     def _dist_loss(self, dist_logit, dist_label):
         """calculate mask branch loss."""
         mask_loss = {}
@@ -347,7 +353,7 @@ class DIST(BaseSegmentor):
                 c_end = j + window_size if j + window_size < W1 else W1
 
                 img_patch = img_canvas[:, :, i:r_end, j:c_end]
-                sem_patch, dist_patch = self.calculate(img_patch)
+                sem_patch, dist_patch = self.run_calculate(img_patch)
 
                 ind2_s = j + overlap_size // 2 if j > 0 else 0
                 ind2_e = (j + window_size - overlap_size // 2 if j + window_size < W1 else W1)
@@ -363,7 +369,7 @@ class DIST(BaseSegmentor):
     def whole_inference(self, img, meta, rescale):
         """Inference with full image."""
 
-        sem_logit, dist_logit = self.calculate(img)
+        sem_logit, dist_logit = self.run_calculate(img)
 
         return sem_logit, dist_logit
 
@@ -380,30 +386,9 @@ class DIST(BaseSegmentor):
         """
         assert self.test_cfg.mode in ['split', 'whole']
 
-        self.rotate_degrees = self.test_cfg.get('rotate_degrees', [0])
-        self.flip_directions = self.test_cfg.get('flip_directions', ['none'])
-        sem_logit_list = []
-        dist_logit_list = []
-        img_ = img
-        for rotate_degree in self.rotate_degrees:
-            for flip_direction in self.flip_directions:
-                img = self.tta_transform(img_, rotate_degree, flip_direction)
-
-                # inference patch or whole img
-                if self.test_cfg.mode == 'split':
-                    sem_logit, dist_logit = self.split_inference(img, meta, rescale)
-                else:
-                    sem_logit, dist_logit = self.whole_inference(img, meta, rescale)
-
-                sem_logit = self.reverse_tta_transform(sem_logit, rotate_degree, flip_direction)
-                dist_logit = self.reverse_tta_transform(dist_logit, rotate_degree, flip_direction)
-                sem_logit = F.softmax(sem_logit, dim=1)
-
-                sem_logit_list.append(sem_logit)
-                dist_logit_list.append(dist_logit)
-
-        sem_logit = sum(sem_logit_list) / len(sem_logit_list)
-        dist_logit = sum(dist_logit_list) / len(dist_logit_list)
+        sem_logit, dist_logit = self.tta_inference(img, meta, rescale)
+        sem_logit = F.softmax(sem_logit, dim=2).mean(dim=0)
+        dist_logit = dist_logit.mean(dim=0)
 
         if rescale:
             sem_logit = resize(sem_logit, size=meta['ori_hw'], mode='bilinear', align_corners=False)
@@ -13,7 +13,7 @@ from skimage.morphology import remove_small_objects
 from scipy.ndimage import binary_fill_holes
 
 from ..builder import SEGMENTORS
-from ..losses import BatchMultiClassDiceLoss
+from ..losses import BatchMultiClassDiceLoss, fp32_loss
 from .base import BaseSegmentor
 
 
@@ -171,8 +171,9 @@ class FullNet(BaseSegmentor):
             sem_loss = self._sem_loss(sem_logit, sem_label)
             loss.update(sem_loss)
             # calculate training metric
-            training_metric_dict = self._training_metric(sem_logit, sem_label)
-            loss.update(training_metric_dict)
+            if self.with_training_metric:
+                training_metric_dict = self._training_metric(sem_logit, sem_label)
+                loss.update(training_metric_dict)
             return loss
         else:
             assert metas is not None
@@ -212,6 +213,7 @@ class FullNet(BaseSegmentor):
 
         return sem_pred, inst_pred
 
+    @fp32_loss
     def _sem_loss(self, sem_logit, sem_gt):
         """calculate mask branch loss."""
         sem_loss = {}
@@ -260,7 +262,7 @@ class FullNet(BaseSegmentor):
                 c_end = j + window_size if j + window_size < W1 else W1
 
                 img_patch = img_canvas[:, :, i:r_end, j:c_end]
-                sem_patch = self.calculate(img_patch)
+                sem_patch = self.run_calculate(img_patch)
 
                 ind2_s = j + overlap_size // 2 if j > 0 else 0
                 ind2_e = (j + window_size - overlap_size // 2 if j + window_size < W1 else W1)
@@ -4,6 +4,7 @@ Modified from vqdang code at https://github.com/vqdang/hover_net/blob/conic/mode
 
 import math
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 import cv2
 import numpy as np
@@ -20,7 +21,80 @@ from skimage.segmentation import watershed
 from tiseg.utils import resize
 from .base import BaseSegmentor
 from ..builder import SEGMENTORS
-from ..losses import GradientMSELoss, BatchMultiClassDiceLoss, mdice, tdice
+from ..losses import GradientMSELoss, BatchMultiClassDiceLoss, mdice, tdice, fp32_loss
+
+
+def blob_marker_watershed(blb, marker, dist, obj_size):
+    """Marker refinement & marker controlled watershed of one blob group.
+
+    Args:
+        blb (np.ndarray): Foreground mask of the blob group crop.
+        marker (np.ndarray): Raw marker map of the blob group crop.
+        dist (np.ndarray): Flooding image of the blob group crop.
+        obj_size (int): Minimal marker area.
+
+    Returns:
+        tuple: local watershed labels & raveled index of the first pixel of
+            each local marker (before small marker removal).
+    """
+    marker = binary_fill_holes(marker).astype("uint8")
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
+    marker = cv2.morphologyEx(marker, cv2.MORPH_OPEN, kernel)
+    marker = measurements.label(marker)[0]
+    _, first_index = np.unique(marker, return_index=True)
+    # same as `remove_small_objects` on label map (ids are kept).
+    marker_areas = np.bincount(marker.reshape(-1))
+    too_small = marker_areas < obj_size
+    too_small[0] = False
+    marker[too_small[marker]] = 0
+
+    proced_pred = watershed(dist, markers=marker, mask=blb)
+
+    return proced_pred, first_index[1:]
+
+
+def split_blob_groups(blb, num_chunks, margin=4):
+    """Split foreground into chunks of independent blob groups.
+
+    A blob group is a 8-connected component of the foreground whose holes are
+    filled, so the hole filling, morphology opening, marker labeling and
+    watershed of each group never interact with other groups. Groups are
+    packed into `num_chunks` chunks with similar area in raster order.
+
+    Returns:
+        list[tuple]: expanded bounding box slice & group mask of each chunk.
+    """
+    h, w = blb.shape[:2]
+    # fill holes by one labeling pass of background (4-connectivity).
+    bg_labels, _ = measurements.label(blb == 0)
+    border_bg_ids = np.unique(np.concatenate([bg_labels[0], bg_labels[-1], bg_labels[:, 0], bg_labels[:, -1]]))
+    is_border_bg = np.zeros(bg_labels.max() + 1, dtype=bool)
+    is_border_bg[border_bg_ids] = True
+    is_border_bg[0] = False
+    filled_blb = ~is_border_bg[bg_labels]
+
+    group_labels, num_groups = measurements.label(filled_blb, structure=np.ones((3, 3)))
+    if num_groups == 0:
+        return []
+    group_slices = measurements.find_objects(group_labels)
+
+    group_areas = np.bincount(group_labels.reshape(-1))[1:]
+    area_before = np.cumsum(group_areas) - group_areas
+    group_chunk_ids = area_before * num_chunks // np.sum(group_areas)
+
+    chunks = []
+    for chunk_id in np.unique(group_chunk_ids):
+        chunk_group_ids = np.nonzero(group_chunk_ids == chunk_id)[0]
+        r_s = max(min(group_slices[i][0].start for i in chunk_group_ids) - margin, 0)
+        r_e = min(max(group_slices[i][0].stop for i in chunk_group_ids) + margin, h)
+        c_s = max(min(group_slices[i][1].start for i in chunk_group_ids) - margin, 0)
+        c_e = min(max(group_slices[i][1].stop for i in chunk_group_ids) + margin, w)
+        chunk_slice = (slice(r_s, r_e), slice(c_s, c_e))
+        in_chunk = np.zeros(num_groups + 1, dtype=bool)
+        in_chunk[chunk_group_ids + 1] = True
+        chunks.append((chunk_slice, in_chunk[group_labels[chunk_slice]]))
+
+    return chunks
 
 
 class ResNetExt(ResNet):
@@ -146,7 +220,7 @@ class UpSample2x(nn.Module):
         # permute is the same as transpose
         # view is the same as reshape
         x = x.unsqueeze(-1)  # bchwx1
-        mat = self.unpool_mat.unsqueeze(0)  # 1xshxsw
+        mat = self.unpool_mat.unsqueeze(0).to(x.dtype)  # 1xshxsw
         ret = torch.tensordot(x, mat, dims=1)  # bxcxhxwxshxsw
         ret = ret.permute(0, 1, 2, 4, 3, 5)
         ret = ret.reshape((-1, input_shape[1], input_shape[2] * 2, input_shape[3] * 2))
@@ -261,8 +335,9 @@ class HoverNet(BaseSegmentor):
             loss.update(fore_loss)
 
             # calculate training metric
-            training_metric_dict = self._training_metric(sem_logit, fore_logit, sem_gt, fore_gt)
-            loss.update(training_metric_dict)
+            if self.with_training_metric:
+                training_metric_dict = self._training_metric(sem_logit, fore_logit, sem_gt, fore_gt)
+                loss.update(training_metric_dict)
             return loss
         else:
             assert metas is not None
@@ -275,12 +350,17 @@ class HoverNet(BaseSegmentor):
             hv_pred = hv_logit.permute(0, 2, 3, 1).cpu().numpy()[0]
             fore_logit = fore_logit.cpu().numpy()[0][1]
             # unravel batch dim
-            inst_pred = self.hover_post_proc(fore_logit, hv_pred, scale_factor=self.test_cfg.get('scale_factor', 1))
+            inst_pred = self.hover_post_proc(
+                fore_logit,
+                hv_pred,
+                scale_factor=self.test_cfg.get('scale_factor', 1),
+                num_workers=self.test_cfg.get('postprocess_workers', 1),
+                executor=self.test_cfg.get('postprocess_executor', 'thread'))
             ret_list = []
             ret_list.append({'sem_pred': sem_pred, 'inst_pred': inst_pred})
             return ret_list
 
-    def hover_post_proc(self, fore_map, hv_map, fx=1, scale_factor=1):
+    def hover_post_proc(self, fore_map, hv_map, fx=1, scale_factor=1, num_workers=1, executor='thread'):
         raw_h, raw_w = hv_map.shape[:2]
 
         fore_map = cv2.resize(fore_map, (0, 0), fx=scale_factor, fy=scale_factor)
@@ -352,18 +432,51 @@ class HoverNet(BaseSegmentor):
 
         marker = blb - overall
         marker[marker < 0] = 0
-        marker = binary_fill_holes(marker).astype("uint8")
-        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
-        marker = cv2.morphologyEx(marker, cv2.MORPH_OPEN, kernel)
-        marker = measurements.label(marker)[0]
-        marker = remove_small_objects(marker, min_size=obj_size)
 
-        proced_pred = watershed(dist, markers=marker, mask=blb)
+        if num_workers <= 1:
+            proced_pred, _ = blob_marker_watershed(blb, marker, dist, obj_size)
+        else:
+            proced_pred = self._parallel_marker_watershed(blb, marker, dist, obj_size, num_workers, executor)
 
         proced_pred = cv2.resize(proced_pred, (raw_w, raw_h), interpolation=cv2.INTER_NEAREST)
 
         return proced_pred
 
+    @staticmethod
+    def _parallel_marker_watershed(blb, marker, dist, obj_size, num_workers, executor='thread'):
+        """Run the marker & watershed step for chunks of blob groups in a
+        worker pool, and then reassemble one label map which is identical to
+        the whole image result."""
+        chunks = split_blob_groups(blb, num_workers * 2)
+        tasks = []
+        for chunk_slice, chunk_mask in chunks:
+            tasks.append((blb[chunk_slice] * chunk_mask, marker[chunk_slice] * chunk_mask, dist[chunk_slice], obj_size))
+
+        pool_type = ProcessPoolExecutor if executor == 'process' else ThreadPoolExecutor
+        with pool_type(max_workers=num_workers) as pool:
+            results = list(pool.map(blob_marker_watershed, *zip(*tasks)))
+
+        # make marker ids follow the raster order of whole image, which is the
+        # same as labeling markers on the whole image.
+        first_pixels = [np.zeros((0, ), dtype=np.int64)]
+        for (chunk_slice, _), (chunk_pred, first_index) in zip(chunks, results):
+            rows, cols = np.unravel_index(first_index, chunk_pred.shape)
+            first_pixels.append((rows + chunk_slice[0].start) * blb.shape[1] + cols + chunk_slice[1].start)
+        first_pixels = np.concatenate(first_pixels)
+        global_ids = np.empty(len(first_pixels), dtype=np.int32)
+        global_ids[np.argsort(first_pixels)] = np.arange(1, len(first_pixels) + 1)
+
+        proced_pred = np.zeros(blb.shape, dtype=np.int32)
+        offset = 0
+        for (chunk_slice, _), (chunk_pred, first_index) in zip(chunks, results):
+            id_mapping = np.zeros(len(first_index) + 1, dtype=np.int32)
+            id_mapping[1:] = global_ids[offset:offset + len(first_index)]
+            offset += len(first_index)
+            chunk_fore = chunk_pred > 0
+            proced_pred[chunk_slice][chunk_fore] = id_mapping[chunk_pred[chunk_fore]]
+
+        return proced_pred
+
     def inference(self, img, meta, rescale):
         """Inference with split/whole style.
 
@@ -377,36 +490,11 @@ class HoverNet(BaseSegmentor):
         """
         assert self.test_cfg.mode in ['split', 'whole']
 
-        self.rotate_degrees = self.test_cfg.get('rotate_degrees', [0])
-        self.flip_directions = self.test_cfg.get('flip_directions', ['none'])
-        sem_logit_list = []
-        hv_logit_list = []
-        fore_logit_list = []
-        img_ = img
-        for rotate_degree in self.rotate_degrees:
-            for flip_direction in self.flip_directions:
-                img = self.tta_transform(img_, rotate_degree, flip_direction)
-
-                # inference
-                if self.test_cfg.mode == 'split':
-                    sem_logit, hv_logit, fore_logit = self.split_inference(img, meta, rescale)
-                else:
-                    sem_logit, hv_logit, fore_logit = self.whole_inference(img, meta, rescale)
-
-                sem_logit = self.reverse_tta_transform(sem_logit, rotate_degree, flip_direction)
-                hv_logit = self.reverse_tta_transform(hv_logit, rotate_degree, flip_direction)
-                fore_logit = self.reverse_tta_transform(fore_logit, rotate_degree, flip_direction)
-
-                sem_logit = F.softmax(sem_logit, dim=1)
-                fore_logit = F.softmax(fore_logit, dim=1)
-
-                sem_logit_list.append(sem_logit)
-                hv_logit_list.append(hv_logit)
-                fore_logit_list.append(fore_logit)
-
-        sem_logit = sum(sem_logit_list) / len(sem_logit_list)
-        hv_logit = hv_logit_list[0]
-        fore_logit = sum(fore_logit_list) / len(fore_logit_list)
+        sem_logit, hv_logit, fore_logit = self.tta_inference(img, meta, rescale)
+        sem_logit = F.softmax(sem_logit, dim=2).mean(dim=0)
+        # hv map can't be averaged across TTA variants
+        hv_logit = hv_logit[0]
+        fore_logit = F.softmax(fore_logit, dim=2).mean(dim=0)
 
         if rescale:
             sem_logit = resize(sem_logit, size=meta['ori_hw'], mode='bilinear', align_corners=False)
@@ -449,7 +537,7 @@ class HoverNet(BaseSegmentor):
                 c_end = j + window_size if j + window_size < W1 else W1
 
                 img_patch = img_canvas[:, :, i:r_end, j:c_end]
-                sem_patch, hv_patch, fore_patch = self.calculate(img_patch)
+                sem_patch, hv_patch, fore_patch = self.run_calculate(img_patch)
 
                 ind2_s = j + overlap_size // 2 if j > 0 else 0
                 ind2_e = (j + window_size - overlap_size // 2 if j + window_size < W1 else W1)
@@ -469,10 +557,11 @@ class HoverNet(BaseSegmentor):
     def whole_inference(self, img, meta, rescale):
         """Inference with full image."""
 
-        sem_logit, hv_logit, fore_logit = self.calculate(img)
+        sem_logit, hv_logit, fore_logit = self.run_calculate(img)
 
         return sem_logit, hv_logit, fore_logit
 
+    @fp32_loss
     def _sem_loss(self, sem_logit, sem_gt, weight_map=None):
         sem_loss = {}
         sem_ce_loss_calculator = nn.CrossEntropyLoss(reduction='none')
@@ -491,6 +580,7 @@ class HoverNet(BaseSegmentor):
 
         return sem_loss
 
+    @fp32_loss
     def _hv_loss(self, hv_logit, hv_gt, fore_gt):
         hv_loss = {}
         hv_mse_loss_calculator = nn.MSELoss()
@@ -505,6 +595,7 @@ class HoverNet(BaseSegmentor):
 
         return hv_loss
 
+    @fp32_loss
     def _fore_loss(self, fore_logit, fore_gt):
         fore_loss = {}
         fore_ce_loss_calculator = nn.CrossEntropyLoss(reduction='none')
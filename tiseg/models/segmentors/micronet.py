@@ -8,7 +8,7 @@ from scipy.ndimage import binary_fill_holes
 from mmcv.cnn import ConvModule
 
 from ..builder import SEGMENTORS
-from ..losses import BatchMultiClassDiceLoss
+from ..losses import BatchMultiClassDiceLoss, fp32_loss
 from .base import BaseSegmentor
 
 
@@ -166,8 +166,9 @@ class MicroNet(BaseSegmentor):
             aux_loss_3 = self._aux_loss(aux_logit_3, sem_gt, weight_map, idx=3)
             loss.update(aux_loss_3)
             # calculate training metric
-            training_metric_dict = self._training_metric(sem_logit, sem_gt)
-            loss.update(training_metric_dict)
+            if self.with_training_metric:
+                training_metric_dict = self._training_metric(sem_logit, sem_gt)
+                loss.update(training_metric_dict)
             return loss
         else:
             assert metas is not None
@@ -206,6 +207,7 @@ class MicroNet(BaseSegmentor):
 
         return sem_pred, inst_pred
 
+    @fp32_loss
     def _sem_loss(self, sem_logit, sem_gt, weight_map):
         """calculate mask branch loss."""
         sem_loss = {}
@@ -223,6 +225,7 @@ class MicroNet(BaseSegmentor):
 
         return sem_loss
 
+    @fp32_loss
     def _aux_loss(self, sem_logit, sem_gt, weight_map, idx):
         sem_loss = {}
         sem_ce_loss_calculator = nn.CrossEntropyLoss(reduction='none')
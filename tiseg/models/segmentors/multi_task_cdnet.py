@@ -10,8 +10,9 @@ from tiseg.utils import resize
 from ..backbones import TorchVGG16BN
 from ..heads import MultiTaskCDHead, MultiTaskCDHeadTwobranch
 from ..builder import SEGMENTORS
-from ..losses import LossVariance, MultiClassBCELoss, BatchMultiClassSigmoidDiceLoss, MultiClassDiceLoss, TopologicalLoss, RobustFocalLoss2d, LevelsetLoss, ActiveContourLoss, mdice, tdice
-from ..utils import generate_direction_differential_map, align_foreground
+from ..losses import LossVariance, MultiClassBCELoss, BatchMultiClassSigmoidDiceLoss, CEDiceLoss, TopologicalLoss, RobustFocalLoss2d, LevelsetLoss, ActiveContourLoss, mdice, tdice, fp32_loss
+from ..utils import (generate_direction_differential_map, align_foreground, torch_remove_small_objects,
+                     torch_fill_holes, torch_label, torch_align_foreground)
 from ...datasets.utils import (angle_to_vector, vector_to_label)
 from .base import BaseSegmentor
 
@@ -88,34 +89,15 @@ class MultiTaskCDNet(BaseSegmentor):
         self.train_cfg = train_cfg
         self.test_cfg = test_cfg
         self.num_classes = num_classes
+        self.parse_cfg()
 
-        # argument
-        self.if_ddm = self.test_cfg.get('if_ddm', False)
-        self.if_mudslide = self.test_cfg.get('if_mudslide', False)
-
-        # model
-        self.num_angles = self.train_cfg.get('num_angles', 8)
-        self.use_regression = self.train_cfg.get('use_regression', False)
-        self.noau = self.train_cfg.get('noau', False)
-        self.parallel = self.train_cfg.get('parallel', False)
-        self.use_twobranch = self.train_cfg.get('use_twobranch', False)
-        self.use_distance = self.train_cfg.get('use_distance', False)
-
-        # (semantic loss)
-        self.use_sigmoid = self.train_cfg.get('use_sigmoid', False)
-        self.use_ac = self.train_cfg.get('use_ac', False)
-        self.ac_len_weight = self.train_cfg.get('ac_len_weight', 0)
-        self.use_focal = self.train_cfg.get('use_focal', False)
-        self.use_level = self.train_cfg.get('use_level', False)
-        self.use_variance = self.train_cfg.get('use_variance', False)
-
-        # (direction loss)
-        self.use_tploss = self.train_cfg.get('use_tploss', False)
-        self.tploss_weight = self.train_cfg.get('tploss_weight', False)
-        self.tploss_dice = self.train_cfg.get('tploss_dice', False)
-        self.dir_weight_map = self.train_cfg.get('dir_weight_map', False)
+        # (softmax ce & dice losses of heads)
+        self.tc_ce_dice_loss = CEDiceLoss(num_classes=3, batch_dice=False)
+        self.sem_ce_dice_loss = CEDiceLoss(num_classes=self.num_classes)
+        self.dir_ce_dice_loss = CEDiceLoss(num_classes=self.num_angles + 1)
 
-        self.backbone = TorchVGG16BN(in_channels=3, pretrained=True, out_indices=[0, 1, 2, 3, 4, 5])
+        self.backbone = TorchVGG16BN(
+            in_channels=3, pretrained=True, out_indices=[0, 1, 2, 3, 4, 5], with_cp='backbone' in self.with_cp)
 
         if self.use_twobranch:
             self.head = MultiTaskCDHeadTwobranch(
@@ -129,6 +111,7 @@ class MultiTaskCDNet(BaseSegmentor):
                 norm_cfg=dict(type='BN'),
                 noau=self.noau,
                 use_regression=self.use_regression,
+                with_cp='head' in self.with_cp,
             )
         else:
             self.head = MultiTaskCDHead(
@@ -142,7 +125,44 @@ class MultiTaskCDNet(BaseSegmentor):
                 norm_cfg=dict(type='BN'),
                 noau=self.noau,
                 use_regression=self.use_regression,
-                parallel=self.parallel)
+                parallel=self.parallel,
+                with_cp='head' in self.with_cp,
+                dgm_with_cp='dgm' in self.with_cp)
+
+    def parse_cfg(self):
+        """Parse the options of `train_cfg` & `test_cfg` into attributes."""
+        # argument
+        self.if_ddm = self.test_cfg.get('if_ddm', False)
+        self.if_mudslide = self.test_cfg.get('if_mudslide', False)
+        self.device_postprocess = self.test_cfg.get('device_postprocess', False)
+
+        # model
+        self.num_angles = self.train_cfg.get('num_angles', 8)
+        self.use_regression = self.train_cfg.get('use_regression', False)
+        self.noau = self.train_cfg.get('noau', False)
+        self.parallel = self.train_cfg.get('parallel', False)
+        self.use_twobranch = self.train_cfg.get('use_twobranch', False)
+        self.use_distance = self.train_cfg.get('use_distance', False)
+        # activation checkpointing: True (all) or parts of ('backbone', 'head', 'dgm')
+        with_cp = self.train_cfg.get('with_cp', False)
+        if isinstance(with_cp, bool):
+            with_cp = ('backbone', 'head', 'dgm') if with_cp else ()
+        assert set(with_cp) <= {'backbone', 'head', 'dgm'}, f'Unsupported checkpointing parts: {with_cp}'
+        self.with_cp = tuple(with_cp)
+
+        # (semantic loss)
+        self.use_sigmoid = self.train_cfg.get('use_sigmoid', False)
+        self.use_ac = self.train_cfg.get('use_ac', False)
+        self.ac_len_weight = self.train_cfg.get('ac_len_weight', 0)
+        self.use_focal = self.train_cfg.get('use_focal', False)
+        self.use_level = self.train_cfg.get('use_level', False)
+        self.use_variance = self.train_cfg.get('use_variance', False)
+
+        # (direction loss)
+        self.use_tploss = self.train_cfg.get('use_tploss', False)
+        self.tploss_weight = self.train_cfg.get('tploss_weight', False)
+        self.tploss_dice = self.train_cfg.get('tploss_dice', False)
+        self.dir_weight_map = self.train_cfg.get('dir_weight_map', False)
 
     def calculate(self, img, rescale=False):
         img_feats = self.backbone(img)
@@ -199,8 +219,10 @@ class MultiTaskCDNet(BaseSegmentor):
             loss.update(point_loss)
 
             # calculate training metric
-            training_metric_dict = self._training_metric(sem_logit, dir_logit, point_logit, sem_gt, dir_gt, point_gt)
-            loss.update(training_metric_dict)
+            if self.with_training_metric:
+                training_metric_dict = self._training_metric(sem_logit, dir_logit, point_logit, sem_gt, dir_gt,
+                                                             point_gt)
+                loss.update(training_metric_dict)
 
             return loss
         else:
@@ -209,9 +231,14 @@ class MultiTaskCDNet(BaseSegmentor):
             tc_logit, sem_logit, dir_map = self.inference(data['img'], metas[0], True)
             tc_pred = tc_logit.argmax(dim=1)
             sem_pred = sem_logit.argmax(dim=1)
-            tc_pred = tc_pred.to('cpu').numpy()[0]
-            sem_pred = sem_pred.to('cpu').numpy()[0]
-            sem_pred, inst_pred = self.postprocess(tc_pred, sem_pred)
+            if self.device_postprocess:
+                sem_pred, inst_pred = self.torch_postprocess(tc_pred, sem_pred)
+                sem_pred = sem_pred.to('cpu').numpy()[0]
+                inst_pred = inst_pred.to('cpu').numpy()[0]
+            else:
+                tc_pred = tc_pred.to('cpu').numpy()[0]
+                sem_pred = sem_pred.to('cpu').numpy()[0]
+                sem_pred, inst_pred = self.postprocess(tc_pred, sem_pred)
             # unravel batch dim
             ret_list = []
             ret_list.append({'sem_pred': sem_pred, 'inst_pred': inst_pred})
@@ -242,6 +269,28 @@ class MultiTaskCDNet(BaseSegmentor):
 
         return sem_pred, inst_pred
 
+    def torch_postprocess(self, tc_pred, sem_pred):
+        """The same post-process as `postprocess` on NxHxW prediction
+        tensors, which stays on the inference device."""
+        sem_canvas = torch.zeros_like(sem_pred)
+        for sem_id in torch.unique(sem_pred).tolist():
+            # 0 is background semantic class.
+            if sem_id == 0:
+                continue
+            sem_id_mask = sem_pred == sem_id
+            # fill instance holes
+            sem_id_mask = torch_remove_small_objects(sem_id_mask, 5)
+            sem_id_mask = torch_fill_holes(sem_id_mask)
+            sem_canvas[sem_id_mask] = sem_id
+
+        # instance process & dilation
+        bin_pred = tc_pred == 1
+
+        inst_pred = torch_label(bin_pred, connectivity=1)
+        inst_pred = torch_align_foreground(inst_pred, sem_canvas > 0, 20)
+
+        return sem_pred, inst_pred
+
     def inference(self, img, meta, rescale):
         """Inference with split/whole style.
 
@@ -255,41 +304,19 @@ class MultiTaskCDNet(BaseSegmentor):
         """
         assert self.test_cfg.mode in ['split', 'whole']
 
-        self.rotate_degrees = self.test_cfg.get('rotate_degrees', [0])
-        self.flip_directions = self.test_cfg.get('flip_directions', ['none'])
-        tc_logit_list = []
-        sem_logit_list = []
-        dir_logit_list = []
-        point_logit_list = []
-        img_ = img
-        for rotate_degree in self.rotate_degrees:
-            for flip_direction in self.flip_directions:
-                img = self.tta_transform(img_, rotate_degree, flip_direction)
-
-                # inference
-                if self.test_cfg.mode == 'split':
-                    tc_logit, sem_logit, dir_logit, point_logit = self.split_inference(img, meta, rescale)
-                else:
-                    tc_logit, sem_logit, dir_logit, point_logit = self.whole_inference(img, meta, rescale)
-
-                tc_logit = self.reverse_tta_transform(tc_logit, rotate_degree, flip_direction)
-                sem_logit = self.reverse_tta_transform(sem_logit, rotate_degree, flip_direction)
-                dir_logit = self.reverse_tta_transform(dir_logit, rotate_degree, flip_direction)
-                point_logit = self.reverse_tta_transform(point_logit, rotate_degree, flip_direction)
-
-                tc_logit = F.softmax(tc_logit, dim=1)
-                sem_logit = F.softmax(sem_logit, dim=1)
-                if not self.use_regression:
-                    dir_logit = F.softmax(dir_logit, dim=1)
-
-                tc_logit_list.append(tc_logit)
-                sem_logit_list.append(sem_logit)
-                dir_logit_list.append(dir_logit)
-                point_logit_list.append(point_logit)
-
-        tc_logit = sum(tc_logit_list) / len(tc_logit_list)
-        sem_logit = sum(sem_logit_list) / len(sem_logit_list)
-        point_logit = sum(point_logit_list) / len(point_logit_list)
+        if self.test_cfg.get('max_tta_memory', None) is not None:
+            return self.streaming_inference(img, meta, rescale)
+
+        tc_logit, sem_logit, dir_logit, point_logit = self.tta_inference(img, meta, rescale)
+        tc_logit = F.softmax(tc_logit, dim=2)
+        sem_logit = F.softmax(sem_logit, dim=2)
+        if not self.use_regression:
+            dir_logit = F.softmax(dir_logit, dim=2)
+        dir_logit_list = list(dir_logit)
+
+        tc_logit = tc_logit.mean(dim=0)
+        sem_logit = sem_logit.mean(dim=0)
+        point_logit = point_logit.mean(dim=0)
 
         if rescale:
             tc_logit = resize(tc_logit, size=meta['ori_hw'], mode='bilinear', align_corners=False)
@@ -299,26 +326,7 @@ class MultiTaskCDNet(BaseSegmentor):
         dd_map_list = []
         dir_map_list = []
         for dir_logit in dir_logit_list:
-            if rescale:
-                dir_logit = resize(dir_logit, size=meta['ori_hw'], mode='bilinear', align_corners=False)
-            if self.use_regression:
-                dir_logit[dir_logit < 0] = 0
-                dir_logit[dir_logit > 2 * np.pi] = 2 * np.pi
-                background = (torch.argmax(tc_logit, dim=1)[0] == 0).cpu().numpy()
-                angle_map = dir_logit * 180 / np.pi
-                angle_map = angle_map[0, 0].cpu().numpy()  # [H, W]
-                angle_map[angle_map > 180] -= 360
-                angle_map[background] = 0
-                vector_map = angle_to_vector(angle_map, self.num_angles)
-                dir_map = vector_to_label(vector_map, self.num_angles)
-                dir_map[background] = -1
-                dir_map = dir_map + 1
-                dir_map = torch.from_numpy(dir_map[None, :, :]).cuda()
-                dd_map = generate_direction_differential_map(dir_map, self.num_angles + 1)
-            else:
-                dir_logit[:, 0] = dir_logit[:, 0] * tc_logit[:, 0]
-                dir_map = torch.argmax(dir_logit, dim=1)
-                dd_map = generate_direction_differential_map(dir_map, self.num_angles + 1)
+            dir_map, dd_map = self._direction_differential(dir_logit, tc_logit, meta, rescale)
             dir_map_list.append(dir_map)
             dd_map_list.append(dd_map)
 
@@ -329,6 +337,124 @@ class MultiTaskCDNet(BaseSegmentor):
 
         return tc_logit, sem_logit, dir_map_list[0]
 
+    def streaming_inference(self, img, meta, rescale):
+        """TTA inference which keeps running sums of each head, so each TTA
+        variant is released right after it is accumulated and the peak memory
+        doesn't grow with the number of channels of TTA variants.
+
+        The direction map of each variant is gated by the averaged three
+        classes probability like `inference`, which is only known after all
+        variants are inferred. The compact direction state of each variant
+        (the angle map of regression, or the background probability with the
+        max & argmax of the other direction classes, 9 bytes per pixel) is
+        kept when the states of all variants fit in `max_tta_memory`.
+        Otherwise the variants are inferred again to gate direction maps, so
+        the memory stays bounded at the cost of a second forward pass.
+        """
+        variants = self.tta_variants()
+        H, W = meta['ori_hw'] if rescale else img.shape[-2:]
+        state_bytes = img.shape[0] * H * W * (4 if self.use_regression else 9)
+        keep_states = len(variants) * state_bytes <= self.test_cfg.max_tta_memory * 2**20
+
+        num_variants = 0
+        dir_states = {}
+        for idx, (tc_logit, sem_logit, dir_logit, point_logit) in self.iter_tta_inference(img, meta, rescale):
+            tc_logit = F.softmax(tc_logit, dim=1)
+            sem_logit = F.softmax(sem_logit, dim=1)
+            if keep_states:
+                dir_states[idx] = self._direction_state(dir_logit, meta, rescale)
+            del dir_logit
+
+            if num_variants == 0:
+                tc_sum, sem_sum, point_sum = tc_logit, sem_logit, point_logit
+            else:
+                tc_sum = tc_sum + tc_logit
+                sem_sum = sem_sum + sem_logit
+                point_sum = point_sum + point_logit
+            num_variants += 1
+
+        tc_logit = tc_sum / num_variants
+        sem_logit = sem_sum / num_variants
+        point_logit = point_sum / num_variants
+
+        if rescale:
+            tc_logit = resize(tc_logit, size=meta['ori_hw'], mode='bilinear', align_corners=False)
+            sem_logit = resize(sem_logit, size=meta['ori_hw'], mode='bilinear', align_corners=False)
+            point_logit = resize(point_logit, size=meta['ori_hw'], mode='bilinear', align_corners=False)
+
+        if keep_states:
+            dir_state_iter = ((idx, dir_states.pop(idx)) for idx in sorted(dir_states))
+        else:
+            dir_state_iter = ((idx, self._direction_state(outputs[2], meta, rescale))
+                              for idx, outputs in self.iter_tta_inference(img, meta, rescale))
+
+        dd_sum = 0
+        for idx, dir_state in dir_state_iter:
+            dir_map, dd_map = self._gated_direction_differential(dir_state, tc_logit, meta)
+            dd_sum = dd_sum + dd_map
+            if idx == 0:
+                first_dir_map = dir_map
+            del dir_state, dd_map
+        dd_map = dd_sum / num_variants
+
+        if self.if_ddm:
+            tc_logit = self._ddm_enhencement(tc_logit, dd_map, point_logit)
+
+        return tc_logit, sem_logit, first_dir_map
+
+    def _direction_state(self, dir_logit, meta, rescale):
+        """The compact direction state of one TTA variant to be gated by the
+        averaged three classes probability."""
+        if not self.use_regression:
+            dir_logit = F.softmax(dir_logit, dim=1)
+        if rescale:
+            dir_logit = resize(dir_logit, size=meta['ori_hw'], mode='bilinear', align_corners=False)
+        if self.use_regression:
+            return dir_logit
+
+        rest_max, rest_arg = dir_logit[:, 1:].max(dim=1)
+        return dir_logit[:, 0], rest_max, (rest_arg + 1).to(torch.uint8)
+
+    def _gated_direction_differential(self, dir_state, tc_logit, meta):
+        """Calculate direction map & direction differential map of one TTA
+        variant from its compact direction state."""
+        if self.use_regression:
+            return self._direction_differential(dir_state, tc_logit, meta, False)
+
+        # same as argmax of gated direction probability (the first maximal
+        # index wins ties)
+        back_prob, rest_max, rest_arg = dir_state
+        dir_map = torch.where(back_prob * tc_logit[:, 0] >= rest_max, torch.zeros_like(rest_arg), rest_arg).long()
+        dd_map = generate_direction_differential_map(dir_map, self.num_angles + 1)
+
+        return dir_map, dd_map
+
+    def _direction_differential(self, dir_logit, tc_logit, meta, rescale):
+        """Calculate direction map & direction differential map of one TTA
+        variant."""
+        if rescale:
+            dir_logit = resize(dir_logit, size=meta['ori_hw'], mode='bilinear', align_corners=False)
+        if self.use_regression:
+            dir_logit[dir_logit < 0] = 0
+            dir_logit[dir_logit > 2 * np.pi] = 2 * np.pi
+            background = (torch.argmax(tc_logit, dim=1)[0] == 0).cpu().numpy()
+            angle_map = dir_logit * 180 / np.pi
+            angle_map = angle_map[0, 0].cpu().numpy()  # [H, W]
+            angle_map[angle_map > 180] -= 360
+            angle_map[background] = 0
+            vector_map = angle_to_vector(angle_map, self.num_angles)
+            dir_map = vector_to_label(vector_map, self.num_angles)
+            dir_map[background] = -1
+            dir_map = dir_map + 1
+            dir_map = torch.from_numpy(dir_map[None, :, :]).to(tc_logit.device)
+            dd_map = generate_direction_differential_map(dir_map, self.num_angles + 1)
+        else:
+            dir_logit[:, 0] = dir_logit[:, 0] * tc_logit[:, 0]
+            dir_map = torch.argmax(dir_logit, dim=1)
+            dd_map = generate_direction_differential_map(dir_map, self.num_angles + 1)
+
+        return dir_map, dd_map
+
     def split_inference(self, img, meta, rescale):
         """using half-and-half strategy to slide inference."""
         window_size = self.test_cfg.crop_size[0]
@@ -364,7 +490,7 @@ class MultiTaskCDNet(BaseSegmentor):
                 c_end = j + window_size if j + window_size < W1 else W1
 
                 img_patch = img_canvas[:, :, i:r_end, j:c_end]
-                tc_sem_patch, sem_patch, dir_patch, point_patch = self.calculate(img_patch)
+                tc_sem_patch, sem_patch, dir_patch, point_patch = self.run_calculate(img_patch)
 
                 ind2_s = j + overlap_size // 2 if j > 0 else 0
                 ind2_e = (j + window_size - overlap_size // 2 if j + window_size < W1 else W1)
@@ -387,20 +513,15 @@ class MultiTaskCDNet(BaseSegmentor):
     def whole_inference(self, img, meta, rescale):
         """Inference with full image."""
 
-        tc_logit, sem_logit, dir_logit, point_logit = self.calculate(img)
+        tc_logit, sem_logit, dir_logit, point_logit = self.run_calculate(img)
 
         return tc_logit, sem_logit, dir_logit, point_logit
 
+    @fp32_loss
     def _tc_loss(self, tc_logit, tc_gt, weight_map=None):
         mask_loss = {}
-        mask_ce_loss_calculator = nn.CrossEntropyLoss(reduction='none')
-        mask_dice_loss_calculator = MultiClassDiceLoss(num_classes=3)
         # Assign weight map for each pixel position
-        mask_ce_loss = mask_ce_loss_calculator(tc_logit, tc_gt)
-        if weight_map is not None:
-            mask_ce_loss *= weight_map[:, 0]
-        mask_ce_loss = torch.mean(mask_ce_loss)
-        mask_dice_loss = mask_dice_loss_calculator(tc_logit, tc_gt)
+        mask_ce_loss, mask_dice_loss = self.tc_ce_dice_loss(tc_logit, tc_gt, weight_map)
         # loss weight
         alpha = 3
         beta = 1
@@ -409,6 +530,7 @@ class MultiTaskCDNet(BaseSegmentor):
 
         return mask_loss
 
+    @fp32_loss
     def _sem_loss(self, img, sem_logit, sem_gt, inst_gt=None):
         """calculate semantic mask branch loss."""
         mask_loss = {}
@@ -423,12 +545,10 @@ class MultiTaskCDNet(BaseSegmentor):
             if self.use_ac:
                 ac_w_area = self.train_cfg.get('ac_w_area')
                 ac_loss_calculator = ActiveContourLoss(w_area=ac_w_area, len_weight=self.ac_len_weight)
-                ac_loss_collect = []
-                for i in range(1, self.num_classes):
-                    sem_logit_cls = sem_logit[:, i:i + 1].sigmoid()
-                    sem_gt_cls = (sem_gt == i)[:, None].float()
-                    ac_loss_collect.append(ac_loss_calculator(sem_logit_cls, sem_gt_cls))
-                mask_loss['mask_ac_loss'] = gamma * (sum(ac_loss_collect) / len(ac_loss_collect))
+                # all foreground classes at once, equal to the mean of per class losses.
+                sem_gt_cls = self._foreground_one_hot(sem_gt).float()
+                ac_loss = ac_loss_calculator(sem_logit[:, 1:].sigmoid(), sem_gt_cls)
+                mask_loss['mask_ac_loss'] = gamma * ac_loss
             else:
                 mask_bce_loss_calculator = MultiClassBCELoss(num_classes=self.num_classes)
                 mask_dice_loss_calculator = BatchMultiClassSigmoidDiceLoss(num_classes=self.num_classes)
@@ -445,10 +565,7 @@ class MultiTaskCDNet(BaseSegmentor):
                 mask_loss['mask_focal_loss'] = alpha * mask_focal_loss
                 mask_loss['mask_dice_loss'] = beta * mask_dice_loss
             else:
-                mask_ce_loss_calculator = nn.CrossEntropyLoss(reduction='none')
-                mask_dice_loss_calculator = BatchMultiClassDiceLoss(num_classes=self.num_classes)
-                mask_ce_loss = torch.mean(mask_ce_loss_calculator(sem_logit, sem_gt))
-                mask_dice_loss = mask_dice_loss_calculator(sem_logit, sem_gt)
+                mask_ce_loss, mask_dice_loss = self.sem_ce_dice_loss(sem_logit, sem_gt)
                 mask_loss['mask_ce_loss'] = alpha * mask_ce_loss
                 mask_loss['mask_dice_loss'] = beta * mask_dice_loss
 
@@ -456,12 +573,10 @@ class MultiTaskCDNet(BaseSegmentor):
             if self.use_ac:
                 ac_w_area = self.train_cfg.get('ac_w_area')
                 ac_loss_calculator = ActiveContourLoss(w_area=ac_w_area, len_weight=self.ac_len_weight)
-                ac_loss_collect = []
-                for i in range(1, self.num_classes):
-                    sem_logit_cls = sem_logit[:, i:i + 1]
-                    sem_gt_cls = (sem_gt == i)[:, None].float()
-                    ac_loss_collect.append(ac_loss_calculator(sem_logit_cls, sem_gt_cls))
-                mask_loss['mask_ac_loss'] = 4 * gamma * sum(ac_loss_collect) / len(ac_loss_collect)
+                # all foreground classes at once, equal to the mean of per class losses.
+                sem_gt_cls = self._foreground_one_hot(sem_gt).float()
+                ac_loss = ac_loss_calculator(sem_logit[:, 1:], sem_gt_cls)
+                mask_loss['mask_ac_loss'] = 4 * gamma * ac_loss
             if self.use_variance:
                 vvv = gamma / 3
                 variance_loss_calculator = LossVariance()
@@ -469,22 +584,22 @@ class MultiTaskCDNet(BaseSegmentor):
                 mask_loss['mask_variance_loss'] = vvv * variance_loss
 
         if self.use_level:
-            # calculate deep level set loss for each semantic class.
-            loss_collect = []
-            weights = [1 for i in range(1, self.num_classes)]
-            for i in range(1, self.num_classes):
-                sem_logit_cls = sem_logit[:, i:i + 1].sigmoid()
-                bg_sem_logit_cls = -sem_logit[:, i:i + 1].sigmoid()
-                overall_sem_logits = torch.cat([sem_logit_cls, bg_sem_logit_cls], dim=1)
-                sem_gt_cls = (sem_gt == i)[:, None]
-                overall_sem_logits = overall_sem_logits * sem_gt_cls
-                img_region = sem_gt_cls * img
-                level_loss_calculator = LevelsetLoss()
-                loss_collect.append(level_loss_calculator(sem_logit_cls, img_region, weights[i]))
-            mask_loss['mask_level_loss'] = sum(loss_collect) / len(loss_collect)
+            # calculate deep level set loss for all semantic classes at once,
+            # the image region of each class is selected by its gt mask.
+            sem_gt_cls = self._foreground_one_hot(sem_gt)
+            level_loss_calculator = LevelsetLoss()
+            level_loss = level_loss_calculator(sem_logit[:, 1:].sigmoid(), img, 1, sem_gt_cls)
+            mask_loss['mask_level_loss'] = level_loss / (self.num_classes - 1)
 
         return mask_loss
 
+    def _foreground_one_hot(self, sem_gt):
+        """NxHxW semantic gt to Nx(num_classes - 1)xHxW binary masks of
+        foreground classes."""
+        fore_classes = torch.arange(1, self.num_classes, device=sem_gt.device)
+        return sem_gt[:, None] == fore_classes[None, :, None, None]
+
+    @fp32_loss
     def _dir_loss(self, dir_logit, dir_gt, tc_logit=None, tc_gt=None, weight_map=None):
         dir_loss = {}
         if self.use_regression:
@@ -493,14 +608,8 @@ class MultiTaskCDNet(BaseSegmentor):
             dir_degree_mse_loss = torch.mean(dir_degree_mse_loss)
             dir_loss['dir_degree_mse_loss'] = dir_degree_mse_loss
         else:
-            dir_ce_loss_calculator = nn.CrossEntropyLoss(reduction='none')
-            dir_dice_loss_calculator = BatchMultiClassDiceLoss(num_classes=self.num_angles + 1)
             # Assign weight map for each pixel position
-            dir_ce_loss = dir_ce_loss_calculator(dir_logit, dir_gt)
-            if weight_map is not None:
-                dir_ce_loss *= weight_map[:, 0]
-            dir_ce_loss = torch.mean(dir_ce_loss)
-            dir_dice_loss = dir_dice_loss_calculator(dir_logit, dir_gt, weight_map)
+            dir_ce_loss, dir_dice_loss = self.dir_ce_dice_loss(dir_logit, dir_gt, weight_map)
             # loss weight
             alpha = 1
             beta = 1
@@ -518,6 +627,7 @@ class MultiTaskCDNet(BaseSegmentor):
 
         return dir_loss
 
+    @fp32_loss
     def _point_loss(self, point_logit, point_gt):
         point_loss = {}
         point_mse_loss_calculator = nn.MSELoss()
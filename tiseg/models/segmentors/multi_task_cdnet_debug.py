@@ -10,7 +10,7 @@ from tiseg.utils import resize
 from ..backbones import TorchVGG16BN
 from ..heads import MultiTaskCDHead, MultiTaskCDHeadTwobranch
 from ..builder import SEGMENTORS
-from ..losses import LossVariance, MultiClassBCELoss, BatchMultiClassSigmoidDiceLoss, MultiClassDiceLoss, TopologicalLoss, RobustFocalLoss2d, LevelsetLoss, ActiveContourLoss, mdice, tdice
+from ..losses import LossVariance, MultiClassBCELoss, BatchMultiClassSigmoidDiceLoss, MultiClassDiceLoss, TopologicalLoss, RobustFocalLoss2d, LevelsetLoss, ActiveContourLoss, mdice, tdice, fp32_loss
 from ..utils import generate_direction_differential_map, align_foreground
 from ...datasets.utils import (angle_to_vector, vector_to_label)
 from .base import BaseSegmentor
@@ -88,32 +88,7 @@ class MultiTaskCDNetDebug(BaseSegmentor):
         self.train_cfg = train_cfg
         self.test_cfg = test_cfg
         self.num_classes = num_classes
-
-        # argument
-        self.if_ddm = self.test_cfg.get('if_ddm', False)
-        self.if_mudslide = self.test_cfg.get('if_mudslide', False)
-
-        # model
-        self.num_angles = self.train_cfg.get('num_angles', 8)
-        self.use_regression = self.train_cfg.get('use_regression', False)
-        self.noau = self.train_cfg.get('noau', False)
-        self.parallel = self.train_cfg.get('parallel', False)
-        self.use_twobranch = self.train_cfg.get('use_twobranch', False)
-        self.use_distance = self.train_cfg.get('use_distance', False)
-
-        # (semantic loss)
-        self.use_sigmoid = self.train_cfg.get('use_sigmoid', False)
-        self.use_ac = self.train_cfg.get('use_ac', False)
-        self.ac_len_weight = self.train_cfg.get('ac_len_weight', 0)
-        self.use_focal = self.train_cfg.get('use_focal', False)
-        self.use_level = self.train_cfg.get('use_level', False)
-        self.use_variance = self.train_cfg.get('use_variance', False)
-
-        # (direction loss)
-        self.use_tploss = self.train_cfg.get('use_tploss', False)
-        self.tploss_weight = self.train_cfg.get('tploss_weight', False)
-        self.tploss_dice = self.train_cfg.get('tploss_dice', False)
-        self.dir_weight_map = self.train_cfg.get('dir_weight_map', False)
+        self.parse_cfg()
 
         self.backbone = TorchVGG16BN(in_channels=3, pretrained=True, out_indices=[0, 1, 2, 3, 4, 5])
 
@@ -144,6 +119,34 @@ class MultiTaskCDNetDebug(BaseSegmentor):
                 use_regression=self.use_regression,
                 parallel=self.parallel)
 
+    def parse_cfg(self):
+        """Parse the options of `train_cfg` & `test_cfg` into attributes."""
+        # argument
+        self.if_ddm = self.test_cfg.get('if_ddm', False)
+        self.if_mudslide = self.test_cfg.get('if_mudslide', False)
+
+        # model
+        self.num_angles = self.train_cfg.get('num_angles', 8)
+        self.use_regression = self.train_cfg.get('use_regression', False)
+        self.noau = self.train_cfg.get('noau', False)
+        self.parallel = self.train_cfg.get('parallel', False)
+        self.use_twobranch = self.train_cfg.get('use_twobranch', False)
+        self.use_distance = self.train_cfg.get('use_distance', False)
+
+        # (semantic loss)
+        self.use_sigmoid = self.train_cfg.get('use_sigmoid', False)
+        self.use_ac = self.train_cfg.get('use_ac', False)
+        self.ac_len_weight = self.train_cfg.get('ac_len_weight', 0)
+        self.use_focal = self.train_cfg.get('use_focal', False)
+        self.use_level = self.train_cfg.get('use_level', False)
+        self.use_variance = self.train_cfg.get('use_variance', False)
+
+        # (direction loss)
+        self.use_tploss = self.train_cfg.get('use_tploss', False)
+        self.tploss_weight = self.train_cfg.get('tploss_weight', False)
+        self.tploss_dice = self.train_cfg.get('tploss_dice', False)
+        self.dir_weight_map = self.train_cfg.get('dir_weight_map', False)
+
     def calculate(self, img, rescale=False):
         img_feats = self.backbone(img)
         bottom_feat = img_feats[-1]
@@ -225,8 +228,10 @@ class MultiTaskCDNetDebug(BaseSegmentor):
             loss.update(point_loss)
 
             # calculate training metric
-            training_metric_dict = self._training_metric(sem_logit, dir_logit, point_logit, sem_gt, dir_gt, point_gt)
-            loss.update(training_metric_dict)
+            if self.with_training_metric:
+                training_metric_dict = self._training_metric(sem_logit, dir_logit, point_logit, sem_gt, dir_gt,
+                                                             point_gt)
+                loss.update(training_metric_dict)
 
             return loss
         else:
@@ -344,7 +349,7 @@ class MultiTaskCDNetDebug(BaseSegmentor):
                 dir_map = vector_to_label(vector_map, self.num_angles)
                 dir_map[background] = -1
                 dir_map = dir_map + 1
-                dir_map = torch.from_numpy(dir_map[None, :, :]).cuda()
+                dir_map = torch.from_numpy(dir_map[None, :, :]).to(tc_logit.device)
                 dd_map = generate_direction_differential_map(dir_map, self.num_angles + 1)
             else:
                 dir_logit[:, 0] = dir_logit[:, 0] * tc_logit[:, 0]
@@ -395,7 +400,7 @@ class MultiTaskCDNetDebug(BaseSegmentor):
                 c_end = j + window_size if j + window_size < W1 else W1
 
                 img_patch = img_canvas[:, :, i:r_end, j:c_end]
-                tc_sem_patch, sem_patch, dir_patch, point_patch = self.calculate(img_patch)
+                tc_sem_patch, sem_patch, dir_patch, point_patch = self.run_calculate(img_patch)
 
                 ind2_s = j + overlap_size // 2 if j > 0 else 0
                 ind2_e = (j + window_size - overlap_size // 2 if j + window_size < W1 else W1)
@@ -418,10 +423,11 @@ class MultiTaskCDNetDebug(BaseSegmentor):
     def whole_inference(self, img, meta, rescale):
         """Inference with full image."""
 
-        tc_logit, sem_logit, dir_logit, point_logit = self.calculate(img)
+        tc_logit, sem_logit, dir_logit, point_logit = self.run_calculate(img)
 
         return tc_logit, sem_logit, dir_logit, point_logit
 
+    @fp32_loss
     def _tc_loss(self, tc_logit, tc_gt, weight_map=None):
         mask_loss = {}
         mask_ce_loss_calculator = nn.CrossEntropyLoss(reduction='none')
@@ -440,6 +446,7 @@ class MultiTaskCDNetDebug(BaseSegmentor):
 
         return mask_loss
 
+    @fp32_loss
     def _sem_loss(self, img, sem_logit, sem_gt, inst_gt=None):
         """calculate semantic mask branch loss."""
         mask_loss = {}
@@ -516,6 +523,7 @@ class MultiTaskCDNetDebug(BaseSegmentor):
 
         return mask_loss
 
+    @fp32_loss
     def _dir_loss(self, dir_logit, dir_gt, tc_logit=None, tc_gt=None, weight_map=None):
         dir_loss = {}
         if self.use_regression:
@@ -551,6 +559,7 @@ class MultiTaskCDNetDebug(BaseSegmentor):
 
         return dir_loss
 
+    @fp32_loss
     def _point_loss(self, point_logit, point_gt):
         point_loss = {}
         point_mse_loss_calculator = nn.MSELoss()
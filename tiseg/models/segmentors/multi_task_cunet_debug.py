@@ -10,7 +10,7 @@ from tiseg.utils import resize
 from ..backbones import TorchVGG16BN
 from ..builder import SEGMENTORS
 from ..heads import MultiTaskUNetHead
-from ..losses import MultiClassDiceLoss, BatchMultiClassDiceLoss, mdice, tdice
+from ..losses import MultiClassDiceLoss, BatchMultiClassDiceLoss, mdice, tdice, fp32_loss
 from ..utils import align_foreground
 from .base import BaseSegmentor
 
@@ -63,8 +63,9 @@ class MultiTaskCUNetDebug(BaseSegmentor):
             tc_loss = self._tc_loss(tc_logit, tc_gt)
             loss.update(tc_loss)
             # calculate training metric
-            training_metric_dict = self._training_metric(sem_logit, sem_gt)
-            loss.update(training_metric_dict)
+            if self.with_training_metric:
+                training_metric_dict = self._training_metric(sem_logit, sem_gt)
+                loss.update(training_metric_dict)
             return loss
         else:
             sem_gt_wb = label['sem_gt_w_bound']
@@ -192,7 +193,7 @@ class MultiTaskCUNetDebug(BaseSegmentor):
                 c_end = j + window_size if j + window_size < W1 else W1
 
                 img_patch = img_canvas[:, :, i:r_end, j:c_end]
-                tc_patch, sem_patch = self.calculate(img_patch)
+                tc_patch, sem_patch = self.run_calculate(img_patch)
 
                 ind2_s = j + overlap_size // 2 if j > 0 else 0
                 ind2_e = (j + window_size - overlap_size // 2 if j + window_size < W1 else W1)
@@ -209,10 +210,11 @@ class MultiTaskCUNetDebug(BaseSegmentor):
     def whole_inference(self, img, meta, rescale):
         """Inference with full image."""
 
-        tc_logit, sem_logit = self.calculate(img)
+        tc_logit, sem_logit = self.run_calculate(img)
 
         return tc_logit, sem_logit
 
+    @fp32_loss
     def _sem_loss(self, sem_logit, sem_gt):
         """calculate semantic mask branch loss."""
         sem_loss = {}
@@ -230,6 +232,7 @@ class MultiTaskCUNetDebug(BaseSegmentor):
 
         return sem_loss
 
+    @fp32_loss
     def _tc_loss(self, tc_logit, tc_gt):
         """calculate three-class mask branch loss."""
         tc_loss = {}
@@ -10,7 +10,7 @@ from tiseg.utils import resize
 from ..backbones import TorchVGG16BN
 from ..builder import SEGMENTORS
 from ..heads import MultiTaskUNetHead
-from ..losses import MultiClassDiceLoss, BatchMultiClassDiceLoss
+from ..losses import MultiClassDiceLoss, BatchMultiClassDiceLoss, fp32_loss
 from ..utils import align_foreground
 from .base import BaseSegmentor
 
@@ -62,8 +62,9 @@ class MultiTaskUNet(BaseSegmentor):
             inner_loss = self._inner_loss(inner_logit, inner_gt, weight_map)
             loss.update(inner_loss)
             # calculate training metric
-            training_metric_dict = self._training_metric(sem_logit, sem_gt)
-            loss.update(training_metric_dict)
+            if self.with_training_metric:
+                training_metric_dict = self._training_metric(sem_logit, sem_gt)
+                loss.update(training_metric_dict)
             return loss
         else:
             assert metas is not None
@@ -185,7 +186,7 @@ class MultiTaskUNet(BaseSegmentor):
                 c_end = j + window_size if j + window_size < W1 else W1
 
                 img_patch = img_canvas[:, :, i:r_end, j:c_end]
-                tc_patch, sem_patch = self.calculate(img_patch)
+                tc_patch, sem_patch = self.run_calculate(img_patch)
 
                 ind2_s = j + overlap_size // 2 if j > 0 else 0
                 ind2_e = (j + window_size - overlap_size // 2 if j + window_size < W1 else W1)
@@ -202,10 +203,11 @@ class MultiTaskUNet(BaseSegmentor):
     def whole_inference(self, img, meta, rescale):
         """Inference with full image."""
 
-        inner_logit, sem_logit = self.calculate(img)
+        inner_logit, sem_logit = self.run_calculate(img)
 
         return inner_logit, sem_logit
 
+    @fp32_loss
     def _sem_loss(self, sem_logit, sem_gt, weight_map):
         """calculate mask branch loss."""
         sem_loss = {}
@@ -223,6 +225,7 @@ class MultiTaskUNet(BaseSegmentor):
 
         return sem_loss
 
+    @fp32_loss
     def _inner_loss(self, inner_logit, inner_gt, weight_map):
         """calculate three-class mask branch loss."""
         inner_loss = {}
@@ -8,7 +8,7 @@ from scipy.ndimage import binary_fill_holes
 from ..backbones import TorchVGG16BN
 from ..builder import SEGMENTORS
 from ..heads import UNetHead
-from ..losses import BatchMultiClassDiceLoss
+from ..losses import BatchMultiClassDiceLoss, fp32_loss
 from .base import BaseSegmentor
 
 
@@ -52,8 +52,9 @@ class UNet(BaseSegmentor):
             sem_loss = self._sem_loss(sem_logit, sem_gt_wb, weight_map)
             loss.update(sem_loss)
             # calculate training metric
-            training_metric_dict = self._training_metric(sem_logit, sem_gt_wb)
-            loss.update(training_metric_dict)
+            if self.with_training_metric:
+                training_metric_dict = self._training_metric(sem_logit, sem_gt_wb)
+                loss.update(training_metric_dict)
             return loss
         else:
             assert metas is not None
@@ -92,6 +93,7 @@ class UNet(BaseSegmentor):
 
         return sem_pred, inst_pred
 
+    @fp32_loss
     def _sem_loss(self, sem_logit, sem_gt, weight_map):
         """calculate mask branch loss."""
         sem_loss = {}
@@ -1,5 +1,12 @@
 from .direct_diff_map import generate_direction_differential_map
 from .syncbn2bn import revert_sync_batchnorm
-from .postprocess import align_foreground, mudslide_watershed
+from ...utils.postprocess import align_foreground, mudslide_watershed
+from .fuse import fuse_conv_bn_pair, fuse_for_inference
+from .checkpoint import checkpoint_forward
+from .torch_postprocess import (torch_label, torch_remove_small_objects, torch_fill_holes, torch_align_foreground)
 
-__all__ = ['revert_sync_batchnorm', 'generate_direction_differential_map', 'align_foreground', 'mudslide_watershed']
+__all__ = [
+    'revert_sync_batchnorm', 'generate_direction_differential_map', 'align_foreground', 'mudslide_watershed',
+    'torch_label', 'torch_remove_small_objects', 'torch_fill_holes', 'torch_align_foreground',
+    'fuse_conv_bn_pair', 'fuse_for_inference', 'checkpoint_forward'
+]
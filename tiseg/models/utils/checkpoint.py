@@ -0,0 +1,29 @@
+import inspect
+
+import torch
+import torch.utils.checkpoint as cp
+
+# non-reentrant checkpoint (torch>=1.11) supports inputs without gradient,
+# e.g. the image fed to the first backbone stage.
+_NON_REENTRANT = 'use_reentrant' in inspect.signature(cp.checkpoint).parameters
+
+
+def checkpoint_forward(module, *args):
+    """Run module with activation checkpointing, i.e. drop the intermediate
+    activations of module in forward and recompute them in backward.
+
+    Checkpointing is skipped when gradient is not needed (e.g. evaluation).
+
+    Args:
+        module (nn.Module): The module (or callable) to run.
+        *args (torch.Tensor): The inputs of module.
+    """
+    if not torch.is_grad_enabled():
+        return module(*args)
+    if _NON_REENTRANT:
+        return cp.checkpoint(module, *args, use_reentrant=False)
+    # reentrant checkpoint drops the gradients of parameters when none of
+    # inputs requires gradient.
+    if not any(isinstance(arg, torch.Tensor) and arg.requires_grad for arg in args):
+        return module(*args)
+    return cp.checkpoint(module, *args)
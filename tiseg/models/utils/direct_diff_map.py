@@ -1,4 +1,5 @@
 import torch
+import torch.nn.functional as F
 
 label_to_vector_mapping = {
     4: [[-1, -1], [-1, 1], [1, 1], [1, -1]],
@@ -46,110 +47,110 @@ label_to_vector_mapping = {
 }
 
 
-def label_to_vector(dir_map, num_classes=8):
+_vector_lut_cache = {}
+_dissimilarity_table_cache = {}
 
-    if not isinstance(dir_map, torch.Tensor):
-        dir_map = torch.tensor(dir_map[None, ...])
 
-    assert isinstance(dir_map, torch.Tensor)
+def _vector_lut(num_classes, device):
+    """(num_classes + 1)x2 lookup table of direction vectors, the last row is
+    the zero vector for labels out of range."""
+    key = (num_classes, str(device))
+    if key not in _vector_lut_cache:
+        lut = torch.zeros((num_classes + 1, 2), dtype=torch.long)
+        lut[:num_classes] = torch.tensor(label_to_vector_mapping[num_classes])
+        _vector_lut_cache[key] = lut.to(device)
+    return _vector_lut_cache[key]
 
-    mapping = label_to_vector_mapping[num_classes]
-    offset_h = torch.zeros_like(dir_map)
-    offset_w = torch.zeros_like(dir_map)
 
-    for idx, (hdir, wdir) in enumerate(mapping):
-        mask = dir_map == idx
-        offset_h[mask] = hdir
-        offset_w[mask] = wdir
+def _lut_index(dir_map, num_classes):
+    """Map direction labels to lookup table rows."""
+    dir_map = dir_map.long()
+    out_range = (dir_map < 0) | (dir_map >= num_classes)
+    return torch.where(out_range, torch.full_like(dir_map, num_classes), dir_map)
 
-    # vertical, horizontal direction concat
-    vector_map = torch.stack([offset_h, offset_w], dim=-1)
-    # NHWC -> NCHW
-    vector_map = vector_map.permute(0, 3, 1, 2).to(dir_map.device)
 
-    return vector_map, dir_map
+def _dissimilarity_table(num_classes, device):
+    """(num_classes + 1)x(num_classes + 1) table of `1 - round(cos_sim)` for
+    each pair of direction labels."""
+    key = (num_classes, str(device))
+    if key not in _dissimilarity_table_cache:
+        vectors = _vector_lut(num_classes, 'cpu').float()
+        cos_sim = _cosine_similarity(vectors[:, None], vectors[None, :], dim=-1)
+        _dissimilarity_table_cache[key] = (1 - torch.round(cos_sim)).to(device)
+    return _dissimilarity_table_cache[key]
+
 
+def _cosine_similarity(a, b, dim):
+    numerator = (a * b).sum(dim)
+    denominator = (torch.sqrt((a**2).sum(dim)) * torch.sqrt((b**2).sum(dim)) + 0.000001)
+    return numerator / denominator
 
-def circshift(matrix, shift_vertical, shift_horizontal):
-    """Cyclic shift of matrix.
 
-    direction:
-    1. Upper left;
-    2. Upper right;
-    3. Lower left;
-    4. Lower right;
+def _neighbours(feature_map):
+    """Yield 8-neighbours (cyclic border) of each pixel as shifted views of a
+    padded feature map.
 
     Args:
-        matrix (torch.Tensor): The matrix to cyclic shift.
-        direction (int): The direction selection argument.
-        shift_vertical (int): The shift distance of vertical direction.
-        shift_horizontal (int): The shift distance of horizontal direction.
+        feature_map (torch.Tensor): NxCxHxW tensor.
     """
-    # upper left
-    moved_matrix = torch.roll(matrix, shifts=(shift_vertical, shift_horizontal), dims=(-2, -1))
+    H, W = feature_map.shape[-2:]
+    padded = F.pad(feature_map.float(), (1, 1, 1, 1), mode='circular').to(feature_map.dtype)
+    for dy in range(3):
+        for dx in range(3):
+            if dy == 1 and dx == 1:
+                continue
+            yield padded[:, :, dy:dy + H, dx:dx + W]
+
+
+def label_to_vector(dir_map, num_classes=8):
 
-    return moved_matrix
+    if not isinstance(dir_map, torch.Tensor):
+        dir_map = torch.tensor(dir_map[None, ...])
+
+    assert isinstance(dir_map, torch.Tensor)
+
+    lut = _vector_lut(num_classes, dir_map.device).to(dir_map.dtype)
+    # NHWC -> NCHW
+    vector_map = lut[_lut_index(dir_map, num_classes)].permute(0, 3, 1, 2)
+
+    return vector_map, dir_map
 
 
 # TODO: regularize variable name and add doc string
 def generate_direction_differential_map(dir_map, direction_classes=9, background=None, use_reg=False):
     # label_to_vector requires NxHxW (torch.Tensor) or HxW (numpy.ndarry)
     if use_reg:
-        vector_map = torch.from_numpy(dir_map).cuda()
+        # numpy inputs stay on cpu, tensor inputs stay on their own device.
+        vector_map = torch.as_tensor(dir_map)
         vector_map = vector_map.permute(2, 0, 1)[None, ...]
-        background = torch.from_numpy(background).cuda()[None, ...]
+        background = torch.as_tensor(background, device=vector_map.device)[None, ...]
     else:
-        vector_map, dir_map = label_to_vector(dir_map, direction_classes)
+        if not isinstance(dir_map, torch.Tensor):
+            dir_map = torch.tensor(dir_map[None, ...])
         background = dir_map == 0
-    # Only support batch size == 1
-    # Nx2xHxW (2: vertical and horizontal)
-    vector_anchor = vector_map.float()
 
-    N, _, H, W = vector_anchor.shape
-    # Cosine Similarity Map
-    cos_sim_map = torch.zeros((N, H, W), dtype=torch.float32, device=vector_map.device)
-
-    feature_list = []
     # Only support 8 direction now
-    if direction_classes - 1 == 8:
-        # Lower
-        lower = circshift(vector_anchor, 1, 0)
-        # Lower Right
-        lower_right = circshift(vector_anchor, 1, 1)
-        # Right
-        right = circshift(vector_anchor, 0, 1)
-        # Upper Right
-        upper_right = circshift(vector_anchor, -1, 1)
-        # Upper
-        upper = circshift(vector_anchor, -1, 0)
-        # Upper Left
-        upper_left = circshift(vector_anchor, -1, -1)
-        # Left
-        left = circshift(vector_anchor, 0, -1)
-        # Lower Left
-        lower_left = circshift(vector_anchor, 1, -1)
-
-        feature_list.append(lower)
-        feature_list.append(lower_right)
-        feature_list.append(right)
-        feature_list.append(upper_right)
-        feature_list.append(upper)
-        feature_list.append(upper_left)
-        feature_list.append(left)
-        feature_list.append(lower_left)
-
-    cos_sim_map_single_direction = torch.zeros((N, direction_classes - 1, H, W),
-                                               dtype=torch.float32,
-                                               device=vector_map.device)
-    for k, feature_item in enumerate(feature_list):
-        numerator = (
-            vector_anchor[:, 0, :, :] * feature_item[:, 0, :, :] + vector_anchor[:, 1, :, :] * feature_item[:, 1, :, :])
-        denominator = (
-            torch.sqrt(pow(vector_anchor[:, 0, :, :], 2) + pow(vector_anchor[:, 1, :, :], 2)) *
-            torch.sqrt(pow(feature_item[:, 0, :, :], 2) + pow(feature_item[:, 1, :, :], 2)) + 0.000001)
-        cos_sim_map_single_direction[:, k, :, :] = numerator / denominator
-
-    cos_sim_map, cos_sim_indices = torch.min(cos_sim_map_single_direction, dim=1)
+    if direction_classes - 1 != 8:
+        N, H, W = background.shape
+        cos_sim_map = torch.zeros((N, H, W), dtype=torch.float32, device=background.device)
+    elif use_reg:
+        # Nx2xHxW (2: vertical and horizontal)
+        vector_anchor = vector_map.float()
+        cos_sim_map = None
+        for neighbour in _neighbours(vector_anchor):
+            cos_sim = _cosine_similarity(vector_anchor, neighbour, dim=1)
+            cos_sim_map = cos_sim if cos_sim_map is None else torch.minimum(cos_sim_map, cos_sim)
+    else:
+        # discrete directions: look up the dissimilarity of each label pair
+        table = _dissimilarity_table(direction_classes, dir_map.device).view(-1)
+        anchor = _lut_index(dir_map, direction_classes)
+        pair_base = anchor * (direction_classes + 1)
+        dissimilarity = None
+        for neighbour in _neighbours(anchor[:, None]):
+            pair_dissimilarity = table[pair_base + neighbour[:, 0]]
+            dissimilarity = pair_dissimilarity if dissimilarity is None else torch.maximum(
+                dissimilarity, pair_dissimilarity)
+        cos_sim_map = 1 - dissimilarity
 
     cos_sim_map[background] = 1
 
@@ -0,0 +1,95 @@
+import torch
+import torch.nn as nn
+from mmcv.cnn import ConvModule
+from torchvision.models.resnet import BasicBlock, Bottleneck, ResNet
+
+_BN_TYPES = (nn.modules.batchnorm._BatchNorm, nn.SyncBatchNorm)
+_RESNET_TYPES = (ResNet, BasicBlock, Bottleneck)
+
+
+def fuse_conv_bn_pair(conv, bn):
+    """Fold inference mode BN into the preceding conv (or transposed conv).
+
+    Args:
+        conv (nn.Conv2d | nn.ConvTranspose2d): The conv to be fused.
+        bn (nn.BatchNorm2d): The BN right after the conv.
+
+    Returns:
+        bool: Whether the BN is folded into the conv.
+    """
+    if bn.running_mean is None or bn.running_var is None:
+        return False
+    if isinstance(conv, nn.ConvTranspose2d):
+        # the weight of transposed conv is (in, out // groups, k, k)
+        if conv.groups != 1:
+            return False
+        shape = (1, -1, 1, 1)
+    elif isinstance(conv, nn.Conv2d):
+        shape = (-1, 1, 1, 1)
+    else:
+        return False
+
+    with torch.no_grad():
+        factor = bn.running_var.add(bn.eps).rsqrt()
+        if bn.weight is not None:
+            factor = factor * bn.weight
+        bias = conv.bias if conv.bias is not None else torch.zeros_like(bn.running_mean)
+        bias = (bias - bn.running_mean) * factor
+        if bn.bias is not None:
+            bias = bias + bn.bias
+        conv.weight = nn.Parameter(conv.weight * factor.reshape(shape))
+        conv.bias = nn.Parameter(bias)
+
+    return True
+
+
+def _fuse_children(module):
+    """Fold the BNs of direct children of module."""
+    # ConvModule with conv -> norm -> act order
+    if isinstance(module, ConvModule):
+        if module.with_norm and module.order.index('conv') + 1 == module.order.index('norm') and isinstance(
+                module.norm, _BN_TYPES):
+            if fuse_conv_bn_pair(module.conv, module.norm):
+                setattr(module, module.norm_name, nn.Identity())
+        return
+
+    # torchvision resnet & its blocks: convN -> bnN
+    if isinstance(module, _RESNET_TYPES):
+        for idx in range(1, 4):
+            conv = getattr(module, f'conv{idx}', None)
+            bn = getattr(module, f'bn{idx}', None)
+            if isinstance(conv, nn.Conv2d) and isinstance(bn, _BN_TYPES) and fuse_conv_bn_pair(conv, bn):
+                setattr(module, f'bn{idx}', nn.Identity())
+        return
+
+    # plain sequential: adjacent conv -> bn. Sequential with customized
+    # forward may not run the children in order, so leave it alone.
+    if isinstance(module, nn.Sequential) and type(module).forward is nn.Sequential.forward:
+        names = list(module._modules.keys())
+        for prev_name, name in zip(names[:-1], names[1:]):
+            prev, cur = module._modules[prev_name], module._modules[name]
+            if isinstance(prev, (nn.Conv2d, nn.ConvTranspose2d)) and isinstance(cur, _BN_TYPES):
+                if fuse_conv_bn_pair(prev, cur):
+                    module._modules[name] = nn.Identity()
+
+
+def fuse_for_inference(model):
+    """Fold BN layers into the preceding conv layers for inference.
+
+    Only the pairs where the BN directly consumes the conv output are folded:
+    `ConvModule` (conv -> norm -> act), torchvision resnet blocks (convN ->
+    bnN) and adjacent (conv -> bn) in plain `nn.Sequential`. Pre-activation
+    BNs (e.g. BN -> ReLU -> Conv of HoVer-Net `DenseBlock`) and BNs after
+    activation (e.g. FullNet `ConvLayer`) are kept.
+
+    Args:
+        model (nn.Module): The model in eval mode.
+
+    Returns:
+        nn.Module: The fused model (modified in place).
+    """
+    assert not model.training, 'BN can only be folded in eval mode.'
+    for module in list(model.modules()):
+        _fuse_children(module)
+
+    return model
@@ -0,0 +1,133 @@
+"""Torch version of common post-process ops, which run on the inference
+device and support batch input (NxHxW)."""
+
+import torch
+import torch.nn.functional as F
+
+
+def neighbour_max(x, connectivity=1):
+    """Max value of the 3x3 neighbourhood (include itself) of each pixel.
+
+    Args:
+        x (torch.Tensor): NxHxW integer tensor.
+        connectivity (int): 1 for 4-neighbourhood, 2 for 8-neighbourhood.
+    """
+    padded = F.pad(x[:, None], (1, 1, 1, 1))[:, 0]
+    H, W = x.shape[-2:]
+    out = x.clone()
+    for dy in (-1, 0, 1):
+        for dx in (-1, 0, 1):
+            if (dy == 0 and dx == 0) or (connectivity == 1 and dy != 0 and dx != 0):
+                continue
+            out = torch.maximum(out, padded[:, 1 + dy:1 + dy + H, 1 + dx:1 + dx + W])
+
+    return out
+
+
+def torch_label(mask, connectivity=1):
+    """Connected components labeling by iterative label propagation.
+
+    The label ids are the same as `skimage.measure.label` (raster order of the
+    first pixel of each component) for each sample.
+
+    Args:
+        mask (torch.Tensor): NxHxW binary tensor.
+        connectivity (int): 1 for 4-connectivity, 2 for 8-connectivity.
+
+    Returns:
+        torch.Tensor: NxHxW int64 label map.
+    """
+    mask = mask > 0
+    N, H, W = mask.shape
+    num_pixels = H * W
+    # each pixel starts with (num_pixels - raster index), so the max value of
+    # a component comes from its first pixel in raster order.
+    init_value = num_pixels - torch.arange(num_pixels, device=mask.device).view(1, H, W)
+    label = torch.where(mask, init_value, torch.zeros_like(init_value))
+
+    def pointer(value):
+        # the raster index of the pixel which the value comes from
+        return (num_pixels - value).clamp(max=num_pixels - 1)
+
+    label = label.view(N, -1)
+    fore = mask.view(N, -1)
+    batch_offset = torch.arange(N, device=mask.device)[:, None] * num_pixels
+    while True:
+        neighbour_label = neighbour_max(label.view(N, H, W), connectivity).view(N, -1) * fore
+        changed = neighbour_label > label
+        if not torch.any(changed):
+            break
+        # hooking: pass the larger neighbour value to the root pixel which
+        # the current value points to, so the whole tree is updated at once.
+        new_label = torch.maximum(label, neighbour_label).view(-1)
+        root_label = label.clone().view(-1)
+        root_label[(pointer(label) + batch_offset)[changed]] = neighbour_label[changed]
+        label = torch.maximum(new_label, root_label).view(N, -1)
+        # pointer jumping until every pixel points to its root.
+        while True:
+            jumped = torch.gather(label, 1, pointer(label)) * fore
+            if torch.equal(jumped, label):
+                break
+            label = jumped
+    label = label.view(N, H, W)
+
+    inst_label = torch.zeros_like(label)
+    for i in range(N):
+        fore = label[i] > 0
+        ids, inverse = torch.unique(label[i][fore], return_inverse=True)
+        # larger value means earlier first pixel.
+        inst_label[i][fore] = len(ids) - inverse
+
+    return inst_label
+
+
+def torch_remove_small_objects(mask, min_size=64, connectivity=1):
+    """Remove connected components smaller than `min_size` (NxHxW)."""
+    mask = mask > 0
+    label = torch_label(mask, connectivity)
+    keep = mask.clone()
+    for i in range(mask.shape[0]):
+        area = torch.bincount(label[i].view(-1))
+        keep[i] = (area >= min_size)[label[i]] & mask[i]
+
+    return keep
+
+
+def torch_fill_holes(mask):
+    """Fill background components (4-connectivity) which don't touch image
+    border (NxHxW)."""
+    mask = mask > 0
+    bg_label = torch_label(~mask, connectivity=1)
+    filled = mask.clone()
+    for i in range(mask.shape[0]):
+        border_ids = torch.cat([bg_label[i, 0], bg_label[i, -1], bg_label[i, :, 0], bg_label[i, :, -1]])
+        is_border_bg = torch.zeros(int(bg_label[i].max()) + 1, dtype=torch.bool, device=mask.device)
+        is_border_bg[border_ids] = True
+        # 0 is the label of foreground pixels
+        is_border_bg[0] = False
+        filled[i] = ~is_border_bg[bg_label[i]]
+
+    return filled
+
+
+def torch_align_foreground(pred, foreground, time):
+    """Grow instances into foreground by masked max-pool dilation.
+
+    Same growing range as `align_foreground`, but a pixel reached by several
+    instances in the same step takes the largest instance id.
+
+    Args:
+        pred (torch.Tensor): NxHxW instance map.
+        foreground (torch.Tensor): NxHxW binary foreground map.
+        time (int): The maximum number of growing steps + 1.
+    """
+    pred = pred.clone()
+    foreground = foreground > 0
+    for _ in range(time - 1):
+        grown = neighbour_max(pred, connectivity=2)
+        new_pixels = (pred == 0) & foreground & (grown > 0)
+        if not torch.any(new_pixels):
+            break
+        pred[new_pixels] = grown[new_pixels]
+
+    return pred
@@ -1,16 +1,24 @@
+from .metric_accumulator import MetricAccumulator, stack_pre_eval_results
 from .sem_metrics import (pre_eval_all_semantic_metric, pre_eval_to_sem_metrics, dice_similarity_coefficient,
                           precision_recall, pre_eval_to_imw_sem_metrics)
 from .inst_metrics import (pre_eval_bin_aji, pre_eval_aji, pre_eval_bin_pq, pre_eval_pq, pre_eval_to_bin_aji,
                            pre_eval_to_imw_aji, pre_eval_to_aji, pre_eval_to_bin_pq, pre_eval_to_pq,
                            binary_aggregated_jaccard_index, aggregated_jaccard_index, binary_panoptic_quality,
                            panoptic_quality, pre_eval_to_imw_pq, binary_inst_dice, pre_eval_to_imw_inst_dice,
-                           pre_eval_to_inst_dice)
+                           pre_eval_to_inst_dice, label_inst_components)
 from .hooks.training_curve import TrainingCurveHook
+from .hooks.deferred_log_vars import DeferredLogVarsHook
+from .hooks.cumulative_optimizer import CumulativeOptimizerHook
+from .hooks.amp_optimizer import AmpOptimizerHook, build_grad_scaler
+from .hooks.prefetch_metrics import PrefetchMetricsHook
+from .hooks.hard_example import HardExampleHook
 from .hooks.eval_hook import DistEvalHook, EvalHook
 from .misc import (add_prefix, blend_image, image_addition, pillow_save, tensor2maps)
 from .interpolate import Upsample, resize
 from .radam import RAdam
 from .custom_runner import CustomRunner
+from .device import (PRECISION_DTYPES, CPUDataParallel, get_device, get_inference_precision, inference_autocast,
+                     wrap_inference_model)
 
 # base utils
 __all__ = ['collect_env', 'add_prefix', 'tensor2maps', 'pillow_save', 'blend_image', 'image_addition']
@@ -22,17 +30,26 @@ __all__ += [
     'pre_eval_to_bin_aji', 'pre_eval_to_imw_aji', 'pre_eval_to_aji', 'pre_eval_to_bin_pq', 'pre_eval_to_pq',
     'binary_aggregated_jaccard_index', 'aggregated_jaccard_index', 'binary_panoptic_quality', 'panoptic_quality',
     'pre_eval_to_imw_pq', 'binary_inst_dice', 'pre_eval_to_imw_sem_metrics', 'pre_eval_to_imw_inst_dice',
-    'pre_eval_to_inst_dice'
+    'pre_eval_to_inst_dice', 'label_inst_components', 'MetricAccumulator', 'stack_pre_eval_results'
 ]
 
 # ops utils
 __all__ += ['resize', 'Upsample']
 
 # hook utils
-__all__ += ['TrainingCurveHook']
+__all__ += [
+    'TrainingCurveHook', 'DeferredLogVarsHook', 'CumulativeOptimizerHook', 'AmpOptimizerHook', 'build_grad_scaler',
+    'PrefetchMetricsHook', 'HardExampleHook'
+]
 
 # optimizer utils
 __all__ += ['RAdam']
 
 # runner utils
 __all__ += ['CustomRunner']
+
+# device utils
+__all__ += [
+    'PRECISION_DTYPES', 'CPUDataParallel', 'get_device', 'get_inference_precision', 'inference_autocast',
+    'wrap_inference_model'
+]
@@ -0,0 +1,138 @@
+import warnings
+from contextlib import contextmanager
+
+import torch
+import torch.nn as nn
+from mmcv.parallel import DataContainer, MMDataParallel
+
+
+def get_device(device=None):
+    """Get inference device.
+
+    Args:
+        device (str | torch.device, optional): 'cpu', 'cuda', 'cuda:1', etc.
+            None or 'auto' means cuda when it is available, otherwise cpu.
+            Default: None
+
+    Returns:
+        torch.device: The inference device.
+    """
+    if device is None or device == 'auto':
+        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+
+    return torch.device(device)
+
+
+class CPUDataParallel(nn.Module):
+    """Unwrap `DataContainer` inputs like `MMDataParallel` on cpu, but never
+    touch cuda (`MMDataParallel` can't be built with empty `device_ids` on a
+    machine with gpus).
+
+    Args:
+        module (nn.Module): Module to be encapsulated.
+    """
+
+    def __init__(self, module):
+        super(CPUDataParallel, self).__init__()
+        self.module = module
+        self.device_ids = []
+
+    def forward(self, *inputs, **kwargs):
+        return self.module(*unwrap_data_container(inputs), **unwrap_data_container(kwargs))
+
+    def train_step(self, *inputs, **kwargs):
+        return self.module.train_step(*unwrap_data_container(inputs), **unwrap_data_container(kwargs))
+
+
+def unwrap_data_container(obj):
+    """Merge the per-gpu chunks of collated `DataContainer` into one batch."""
+    if isinstance(obj, DataContainer):
+        if len(obj.data) == 1:
+            return obj.data[0]
+        if obj.stack:
+            return torch.cat(obj.data, dim=0)
+        return [item for chunk in obj.data for item in chunk]
+    if isinstance(obj, dict):
+        return {k: unwrap_data_container(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(unwrap_data_container(v) for v in obj)
+    return obj
+
+
+def wrap_inference_model(model, device=None, num_threads=None, channels_last=False):
+    """Move model to inference device and wrap it for dataloader inputs.
+
+    Args:
+        model (nn.Module): The segmentor.
+        device (str | torch.device, optional): The inference device, see
+            `get_device`. Default: None
+        num_threads (int, optional): The number of intra-op threads for cpu
+            inference. Default: None (torch default)
+        channels_last (bool): Whether to use channels last memory format,
+            which is usually faster for convolution on cpu. Default: False
+
+    Returns:
+        nn.Module: The wrapped model.
+    """
+    device = get_device(device)
+
+    if device.type == 'cpu' and num_threads is not None:
+        torch.set_num_threads(num_threads)
+
+    model = model.to(device)
+    if channels_last:
+        model = model.to(memory_format=torch.channels_last)
+
+    if device.type == 'cuda':
+        device_id = device.index if device.index is not None else torch.cuda.current_device()
+        return MMDataParallel(model, device_ids=[device_id])
+
+    return CPUDataParallel(model)
+
+
+PRECISION_DTYPES = {'fp32': torch.float32, 'bf16': torch.bfloat16, 'fp16': torch.float16}
+
+
+def get_inference_precision(device, precision='fp32'):
+    """Check inference precision on the device before inputs are cast.
+
+    Autocast needs `torch.autocast` (torch >= 1.10). fp16 is downgraded to
+    fp32 on cpu, where fp16 autocast is unsupported (and disabled by torch) on
+    most versions, which would leave fp16 inputs against fp32 weights.
+
+    Args:
+        device (str | torch.device): The inference device.
+        precision (str): 'fp32', 'bf16' or 'fp16'. Default: 'fp32'
+
+    Returns:
+        str: The precision to run.
+    """
+    assert precision in PRECISION_DTYPES, f'Unsupported precision: {precision}'
+    if precision == 'fp32':
+        return precision
+    if not hasattr(torch, 'autocast'):
+        raise RuntimeError(f'{precision} precision needs torch.autocast (torch >= 1.10), '
+                           f'but torch {torch.__version__} is installed. Please use fp32 precision.')
+    if precision == 'fp16' and torch.device(device).type == 'cpu':
+        warnings.warn('fp16 precision is not supported on cpu, fp32 precision is used instead.')
+        return 'fp32'
+    return precision
+
+
+@contextmanager
+def inference_autocast(device, precision='fp32'):
+    """Autocast context of inference (or mixed precision training) precision.
+
+    Args:
+        device (str | torch.device): The inference device.
+        precision (str): 'fp32', 'bf16' or 'fp16'. Default: 'fp32'
+    """
+    assert precision in PRECISION_DTYPES, f'Unsupported precision: {precision}'
+    if precision == 'fp32':
+        yield
+    elif not hasattr(torch, 'autocast'):
+        raise RuntimeError(f'{precision} precision needs torch.autocast (torch >= 1.10), '
+                           f'but torch {torch.__version__} is installed.')
+    else:
+        with torch.autocast(device_type=torch.device(device).type, dtype=PRECISION_DTYPES[precision]):
+            yield
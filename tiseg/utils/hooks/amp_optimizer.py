@@ -0,0 +1,86 @@
+import torch
+from mmcv.parallel import is_module_wrapper
+from mmcv.runner import HOOKS
+
+from ..device import PRECISION_DTYPES
+from .cumulative_optimizer import CumulativeOptimizerHook
+
+
+def build_grad_scaler(device, precision='fp16', loss_scale='dynamic'):
+    """Build loss scaler of mixed precision training. Only fp16 needs loss
+    scaling, the scaler of bf16 (or fp32) is disabled and works as identity.
+
+    Args:
+        device (str | torch.device): The training device.
+        precision (str): 'fp32', 'bf16' or 'fp16'. Default: 'fp16'
+        loss_scale (float | str | dict): Static loss scale (float), 'dynamic'
+            or the arguments of `GradScaler` (dict). Default: 'dynamic'
+    """
+    if loss_scale == 'dynamic':
+        scaler_args = {}
+    elif isinstance(loss_scale, dict):
+        scaler_args = loss_scale
+    else:
+        # static loss scale never grows or backs off
+        scaler_args = dict(init_scale=float(loss_scale), growth_factor=1, backoff_factor=1)
+
+    device_type = torch.device(device).type
+    enabled = precision == 'fp16'
+    if hasattr(torch.amp, 'GradScaler'):
+        return torch.amp.GradScaler(device_type, enabled=enabled, **scaler_args)
+    return torch.cuda.amp.GradScaler(enabled=enabled and device_type == 'cuda', **scaler_args)
+
+
+@HOOKS.register_module()
+class AmpOptimizerHook(CumulativeOptimizerHook):
+    """Optimizer hook of automatic mixed precision training.
+
+    The segmentor runs `train_step` under autocast of `precision` (losses run
+    in fp32), and the fp16 losses are scaled by `GradScaler` before backward.
+    Gradient accumulation (`cumulative_iters`) is supported too.
+
+    Args:
+        precision (str): 'bf16' or 'fp16'. Default: 'fp16'
+        loss_scale (float | str | dict): The loss scale of fp16, see
+            `build_grad_scaler`. Default: 'dynamic'
+        cumulative_iters (int): The number of gradient cumulative iters.
+            Default: 1
+        grad_clip (dict, optional): The arguments of `clip_grad_norm_`.
+    """
+
+    def __init__(self, precision='fp16', loss_scale='dynamic', **kwargs):
+        super(AmpOptimizerHook, self).__init__(**kwargs)
+        assert precision in PRECISION_DTYPES and precision != 'fp32', f'Unsupported precision: {precision}'
+        self.precision = precision
+        self.loss_scale = loss_scale
+        self.loss_scaler = None
+
+    def before_run(self, runner):
+        model = runner.model.module if is_module_wrapper(runner.model) else runner.model
+        model.train_precision = self.precision
+
+        device = next(model.parameters()).device
+        self.loss_scaler = build_grad_scaler(device, self.precision, self.loss_scale)
+        # resume loss scale
+        if runner.meta is not None and 'loss_scaler' in runner.meta.get('amp', {}):
+            self.loss_scaler.load_state_dict(runner.meta['amp']['loss_scaler'])
+
+    def after_train_iter(self, runner):
+        loss = self.scale_loss(runner, runner.outputs['loss'])
+        self.loss_scaler.scale(loss).backward()
+
+        if self.is_step_iter(runner):
+            # unscale gradients before clipping
+            self.loss_scaler.unscale_(runner.optimizer)
+            if self.grad_clip is not None:
+                grad_norm = self.clip_grads(runner.model.parameters())
+                if grad_norm is not None:
+                    runner.log_buffer.update({'grad_norm': float(grad_norm)}, runner.outputs['num_samples'])
+
+            # skip the step when gradients overflow & update loss scale
+            self.loss_scaler.step(runner.optimizer)
+            self.loss_scaler.update()
+            if runner.meta is not None:
+                runner.meta.setdefault('amp', {})['loss_scaler'] = self.loss_scaler.state_dict()
+
+            runner.optimizer.zero_grad()
@@ -0,0 +1,51 @@
+from mmcv.runner import HOOKS, GradientCumulativeOptimizerHook
+
+
+@HOOKS.register_module()
+class CumulativeOptimizerHook(GradientCumulativeOptimizerHook):
+    """`GradientCumulativeOptimizerHook` which keeps the loss factor right
+    after resuming.
+
+    The boundary of divisible iterations of mmcv is relative to the resume
+    iteration but compared with the absolute iteration, so the loss is
+    divided by zero (`remainder_iters`) when training resumes past the
+    halfway point. The boundary is absolute here, and the loss isn't divided
+    at all when `cumulative_iters` is 1.
+
+    Args:
+        cumulative_iters (int): The number of gradient cumulative iters.
+            Default: 1
+        grad_clip (dict, optional): The arguments of `clip_grad_norm_`.
+    """
+
+    def _init(self, runner):
+        super(CumulativeOptimizerHook, self)._init(runner)
+        # absolute iteration of the end of divisible iterations
+        self.divisible_iters += runner.iter
+
+    def scale_loss(self, runner, loss):
+        """Divide the loss of current iteration by the number of iterations
+        accumulated into the same optimizer step."""
+        if not self.initialized:
+            self._init(runner)
+
+        if self.cumulative_iters == 1:
+            return loss
+        if runner.iter < self.divisible_iters:
+            return loss / self.cumulative_iters
+        return loss / self.remainder_iters
+
+    def is_step_iter(self, runner):
+        """Whether the optimizer steps in current iteration."""
+        return self.every_n_iters(runner, self.cumulative_iters) or self.is_last_iter(runner)
+
+    def after_train_iter(self, runner):
+        self.scale_loss(runner, runner.outputs['loss']).backward()
+
+        if self.is_step_iter(runner):
+            if self.grad_clip is not None:
+                grad_norm = self.clip_grads(runner.model.parameters())
+                if grad_norm is not None:
+                    runner.log_buffer.update({'grad_norm': float(grad_norm)}, runner.outputs['num_samples'])
+            runner.optimizer.step()
+            runner.optimizer.zero_grad()
@@ -0,0 +1,81 @@
+import torch
+from mmcv.parallel import is_module_wrapper
+from mmcv.runner import HOOKS, Hook
+
+
+@HOOKS.register_module()
+class DeferredLogVarsHook(Hook):
+    """Keep training log variables on device and sync them to host only on
+    the iterations which logger hooks log.
+
+    The log variables of each iteration are kept as 0-dim tensors in the log
+    buffer, and all the buffered tensors are converted to floats by one host
+    sync right before logger hooks average them. This hook must have higher
+    priority than logger hooks.
+
+    Args:
+        interval (int): The logging interval, same as `log_config.interval`.
+            Default: 10
+        by_epoch (bool): Whether logger hooks count inner iterations of epoch.
+            Default: True
+        lazy_training_metric (bool): Whether to calculate training metrics
+            (tdice, mdice, ...) only on the logged iterations. Default: False
+    """
+
+    def __init__(self, interval=10, by_epoch=True, lazy_training_metric=False):
+        self.interval = interval
+        self.by_epoch = by_epoch
+        self.lazy_training_metric = lazy_training_metric
+        self._history_lens = {}
+        self._num_iters = 0
+
+    @staticmethod
+    def _segmentor(runner):
+        model = runner.model
+        return model.module if is_module_wrapper(model) else model
+
+    def _is_logging_iter(self, runner):
+        if self.by_epoch and self.every_n_inner_iters(runner, self.interval):
+            return True
+        if not self.by_epoch and self.every_n_iters(runner, self.interval):
+            return True
+        # logger hooks may log the last iterations of epoch.
+        return self.end_of_epoch(runner)
+
+    def before_run(self, runner):
+        segmentor = self._segmentor(runner)
+        segmentor.deferred_logging = True
+        segmentor.lazy_training_metric = self.lazy_training_metric
+
+    def before_train_epoch(self, runner):
+        # logger hooks clear the log buffer before each epoch
+        self._history_lens = {}
+        self._num_iters = 0
+
+    def before_train_iter(self, runner):
+        self._segmentor(runner).logging_iter = self._is_logging_iter(runner)
+
+    def after_train_iter(self, runner):
+        self._num_iters += 1
+        if not self._is_logging_iter(runner):
+            return
+
+        log_buffer = runner.log_buffer
+        tensor_places = []
+        for key, values in log_buffer.val_history.items():
+            start = self._history_lens.get(key, 0)
+            # the variables only calculated on logged iterations (lazy
+            # training metrics) are averaged over these iterations only.
+            if 0 < len(values) - start < self._num_iters:
+                del values[:start]
+                del log_buffer.n_history[key][:start]
+                start = 0
+            tensor_places += [(key, idx) for idx in range(start, len(values)) if isinstance(values[idx], torch.Tensor)]
+
+        if len(tensor_places) > 0:
+            tensor_values = torch.stack([log_buffer.val_history[key][idx] for key, idx in tensor_places]).tolist()
+            for (key, idx), value in zip(tensor_places, tensor_values):
+                log_buffer.val_history[key][idx] = value
+
+        self._history_lens = {key: len(values) for key, values in log_buffer.val_history.items()}
+        self._num_iters = 0
@@ -26,6 +26,9 @@ class EvalHook(_EvalHook):
         else:
             self.custom_intervals = []
             self.custom_milestones = []
+        # per image metrics of the last evaluation (see `HardExampleHook`)
+        self.img_metrics = None
+        self.num_evals = 0
 
     def _should_evaluate(self, runner):
         """Judge whether to perform evaluation.
@@ -75,7 +78,8 @@ class EvalHook(_EvalHook):
             runner (:obj:`mmcv.Runner`): The underlined training runner.
             results (list): Output results.
         """
-        eval_res, _ = self.dataloader.dataset.evaluate(results, logger=runner.logger, **self.eval_kwargs)
+        eval_res, storage_res = self.dataloader.dataset.evaluate(results, logger=runner.logger, **self.eval_kwargs)
+        self.img_metrics = storage_res.get('img_metrics', None)
         for name, val in eval_res.items():
             runner.log_buffer.output[name] = val
         runner.log_buffer.ready = True
@@ -101,6 +105,7 @@ class EvalHook(_EvalHook):
         key_score = self.evaluate(runner, results)
         if self.save_best:
             self._save_ckpt(runner, key_score)
+        self.num_evals += 1
 
 
 class DistEvalHook(_DistEvalHook):
@@ -123,6 +128,9 @@ class DistEvalHook(_DistEvalHook):
         else:
             self.custom_intervals = []
             self.custom_milestones = []
+        # per image metrics of the last evaluation (see `HardExampleHook`)
+        self.img_metrics = None
+        self.num_evals = 0
 
     def _should_evaluate(self, runner):
         """Judge whether to perform evaluation.
@@ -172,7 +180,8 @@ class DistEvalHook(_DistEvalHook):
             runner (:obj:`mmcv.Runner`): The underlined training runner.
             results (list): Output results.
         """
-        eval_res, _ = self.dataloader.dataset.evaluate(results, logger=runner.logger, **self.eval_kwargs)
+        eval_res, storage_res = self.dataloader.dataset.evaluate(results, logger=runner.logger, **self.eval_kwargs)
+        self.img_metrics = storage_res.get('img_metrics', None)
         for name, val in eval_res.items():
             runner.log_buffer.output[name] = val
         runner.log_buffer.ready = True
@@ -214,3 +223,6 @@ class DistEvalHook(_DistEvalHook):
 
             if self.save_best:
                 self._save_ckpt(runner, key_score)
+
+        # the other ranks have no metrics, but count the evaluation too
+        self.num_evals += 1
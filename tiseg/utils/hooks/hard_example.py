@@ -0,0 +1,48 @@
+import torch.distributed as dist
+from mmcv.runner import HOOKS, Hook, get_dist_info
+
+
+@HOOKS.register_module()
+class HardExampleHook(Hook):
+    """Feed the per-image metrics of the last evaluation to samplers for hard
+    example oversampling (see `InstanceBalancedSampler`).
+
+    It must be registered after the eval hook with the same priority, so it
+    runs right after each evaluation. In distributed training, the metrics of
+    rank 0 are broadcast to the other ranks. The new weights take effect from
+    the next epoch of data loader.
+
+    Args:
+        eval_hook (EvalHook | DistEvalHook): The eval hook of training.
+        samplers (list[InstanceBalancedSampler]): The samplers of training
+            data loaders.
+    """
+
+    def __init__(self, eval_hook, samplers):
+        self.eval_hook = eval_hook
+        self.samplers = samplers
+        self.num_evals = 0
+
+    def _update(self, runner):
+        if self.eval_hook.num_evals == self.num_evals:
+            return
+        self.num_evals = self.eval_hook.num_evals
+
+        img_metrics = self.eval_hook.img_metrics
+        _, world_size = get_dist_info()
+        if world_size > 1:
+            objects = [img_metrics]
+            dist.broadcast_object_list(objects, src=0)
+            img_metrics = objects[0]
+
+        if img_metrics is None:
+            runner.logger.warning('The dataset evaluation has no per-image metrics for hard example sampling.')
+            return
+        for sampler in self.samplers:
+            sampler.update_hard_examples(img_metrics)
+
+    def after_train_iter(self, runner):
+        self._update(runner)
+
+    def after_train_epoch(self, runner):
+        self._update(runner)
@@ -0,0 +1,18 @@
+from mmcv.runner import HOOKS, Hook
+
+
+@HOOKS.register_module()
+class PrefetchMetricsHook(Hook):
+    """Log the queue depth of `DevicePrefetcher` (the number of batches ready
+    when a step starts) of training data loader.
+
+    The value is averaged by logger hooks, a mean queue depth close to zero
+    means the training is bound by data loading.
+    """
+
+    def after_train_iter(self, runner):
+        data_loader = runner.data_loader
+        # IterBasedRunner wraps data loader by `IterLoader`
+        data_loader = getattr(data_loader, '_dataloader', data_loader)
+        if hasattr(data_loader, 'queue_depth'):
+            runner.log_buffer.update({'queue_depth': data_loader.queue_depth})
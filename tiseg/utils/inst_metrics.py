@@ -4,67 +4,55 @@ import numpy as np
 from skimage import measure
 from scipy.optimize import linear_sum_assignment
 
-from .misc import get_bounding_box
+from .metric_accumulator import stack_pre_eval_results
 
 
-def pre_eval_bin_aji(inst_pred, inst_gt):
-    # make instance id contiguous
-    inst_pred = measure.label(inst_pred.copy())
-    inst_gt = measure.label(inst_gt.copy())
+def label_inst_components(inst_map):
+    """Label connected components of each instance.
 
-    pred_id_list = list(np.unique(inst_pred))
-    gt_id_list = list(np.unique(inst_gt))
+    Disconnected parts of one instance are split into different components,
+    which is the same as calling `measure.label` on any subset of instances.
+    The results of ground truth can be cached and passed to `pre_eval_*` by
+    `gt_comps` (and the instance areas to `pre_eval_aji` by `gt_inst_areas`).
 
-    if 0 not in pred_id_list:
-        pred_id_list.insert(0, 0)
+    Returns:
+        tuple: component map, instance id of each component and area of each
+            component. Index 0 of the latter two is the background.
+    """
+    comp_map = measure.label(inst_map)
+    num_comps = comp_map.max()
+    comp_parents = np.zeros(num_comps + 1, dtype=np.int64)
+    comp_parents[comp_map.reshape(-1)] = inst_map.reshape(-1)
+    comp_areas = np.bincount(comp_map.reshape(-1), minlength=num_comps + 1)
 
-    if 0 not in gt_id_list:
-        gt_id_list.insert(0, 0)
+    return comp_map, comp_parents, comp_areas
 
-    # Remove background class
-    pred_masks = []
-    for p in pred_id_list:
-        p_mask = (inst_pred == p).astype(np.uint8)
-        pred_masks.append(p_mask)
 
-    gt_masks = []
-    for g in gt_id_list:
-        g_mask = (inst_gt == g).astype(np.uint8)
-        gt_masks.append(g_mask)
+def _pairwise_overlap(comp_pred, comp_gt):
+    """Collect all overlapping (gt, pred) component pairs in one pass.
+
+    Returns:
+        tuple: gt component ids, pred component ids and intersection areas of
+            overlapping pairs, sorted by gt id first and pred id second.
+    """
+    comp_pred = comp_pred.reshape(-1).astype(np.int64)
+    comp_gt = comp_gt.reshape(-1).astype(np.int64)
+    overlap = (comp_pred > 0) & (comp_gt > 0)
+    num_pred_comps = comp_pred.max() + 1
+    pair_codes, pair_inters = np.unique(comp_gt[overlap] * num_pred_comps + comp_pred[overlap], return_counts=True)
+
+    return pair_codes // num_pred_comps, pair_codes % num_pred_comps, pair_inters
 
+
+def _aji_from_overlap(gt_areas, pred_areas, gt_idx, pred_idx, inters):
+    """Calculate overall intersection & overall union of AJI from the overlap
+    table between gt instances and pred instances."""
     # prefill with value
-    pairwise_intersection = np.zeros([len(gt_id_list) - 1, len(pred_id_list) - 1], dtype=np.float64)
-    pairwise_union = np.zeros([len(gt_id_list) - 1, len(pred_id_list) - 1], dtype=np.float64)
+    pairwise_intersection = np.zeros([len(gt_areas), len(pred_areas)], dtype=np.float64)
+    pairwise_union = np.zeros([len(gt_areas), len(pred_areas)], dtype=np.float64)
 
-    # caching pairwise
-    for gt_id in gt_id_list:  # 0-th is background
-        if gt_id == 0:
-            continue
-        g_mask = gt_masks[gt_id]
-        rmin1, rmax1, cmin1, cmax1 = get_bounding_box(g_mask)
-        g_mask_crop = g_mask[rmin1:rmax1, cmin1:cmax1]
-        g_mask_crop = g_mask_crop.astype("int")
-        p_mask_crop = inst_pred[rmin1:rmax1, cmin1:cmax1]
-        pred_target_overlap = p_mask_crop[g_mask_crop > 0]
-        pred_target_overlap_id = list(np.unique(pred_target_overlap))
-        for pred_id in pred_target_overlap_id:
-            if pred_id == 0:  # ignore
-                continue  # overlaping background
-            p_mask = pred_masks[pred_id]
-
-            # crop region to speed up computation
-            rmin2, rmax2, cmin2, cmax2 = get_bounding_box(p_mask)
-            rmin = min(rmin1, rmin2)
-            rmax = max(rmax1, rmax2)
-            cmin = min(cmin1, cmin2)
-            cmax = max(cmax1, cmax2)
-            g_mask_union_crop = (g_mask[rmin:rmax, cmin:cmax] > 0).astype(np.uint8)
-            p_mask_union_crop = (p_mask[rmin:rmax, cmin:cmax] > 0).astype(np.uint8)
-            total = (g_mask_union_crop + p_mask_union_crop).sum()
-            intersect = (g_mask_union_crop * p_mask_union_crop).sum()
-            # print(total, intersect)
-            pairwise_intersection[gt_id - 1, pred_id - 1] = intersect
-            pairwise_union[gt_id - 1, pred_id - 1] = total - intersect
+    pairwise_intersection[gt_idx, pred_idx] = inters
+    pairwise_union[gt_idx, pred_idx] = gt_areas[gt_idx] + pred_areas[pred_idx] - inters
 
     pairwise_iou = pairwise_intersection / (pairwise_union + 1.0e-6)
     # pair of pred that give highest iou for each target, dont care
@@ -79,25 +67,120 @@ def pre_eval_bin_aji(inst_pred, inst_gt):
     overall_inter = (pairwise_intersection[paired_gt, paired_pred]).sum()
     overall_union = (pairwise_union[paired_gt, paired_pred]).sum()
 
-    paired_gt = list(paired_gt + 1)  # index to instance ID
-    paired_pred = list(paired_pred + 1)
     # It seems that only unpaired Predictions need to be added into union.
-    unpaired_gt = np.array([idx for idx in gt_id_list if (idx not in paired_gt) and (idx != 0)])
-    for gt_id in unpaired_gt:
-        overall_union += gt_masks[gt_id].sum()
-    unpaired_pred = np.array([idx for idx in pred_id_list if (idx not in paired_pred) and (idx != 0)])
-    for pred_id in unpaired_pred:
-        overall_union += pred_masks[pred_id].sum()
+    unpaired_gt = np.ones(len(gt_areas), dtype=bool)
+    unpaired_gt[paired_gt] = False
+    overall_union += gt_areas[unpaired_gt].sum()
+    unpaired_pred = np.ones(len(pred_areas), dtype=bool)
+    unpaired_pred[paired_pred] = False
+    overall_union += pred_areas[unpaired_pred].sum()
 
     return overall_inter, overall_union
 
 
-def pre_eval_aji(inst_pred, inst_gt, pred_id_list_per_class, gt_id_list_per_class, num_classes, reduce_zero_label=True):
+def _pq_from_overlap(gt_areas, pred_areas, gt_idx, pred_idx, inters, match_iou=0.5):
+    """Calculate tp, fp, fn & paired iou of PQ from the overlap table between
+    gt instances and pred instances."""
+    # prefill with value
+    pairwise_iou = np.zeros([len(gt_areas), len(pred_areas)], dtype=np.float64)
+    pairwise_iou[gt_idx, pred_idx] = inters / (gt_areas[gt_idx] + pred_areas[pred_idx] - inters)
+
+    if match_iou >= 0.5:
+        pairwise_iou[pairwise_iou <= match_iou] = 0.0
+        paired_gt, paired_pred = np.nonzero(pairwise_iou)
+        paired_iou = pairwise_iou[paired_gt, paired_pred]
+    else:  # * Exhaustive maximal unique pairing
+        # Munkres pairing with scipy library
+        # the algorithm return (row indices, matched column indices)
+        # if there is multiple same cost in a row, index of first occurence
+        # is return, thus the unique pairing is ensure
+        # inverse pair to get high IoU as minimum
+        paired_gt, paired_pred = linear_sum_assignment(-pairwise_iou)
+        # extract the paired cost and remove invalid pair
+        paired_iou = pairwise_iou[paired_gt, paired_pred]
+
+        # now select those above threshold level
+        # paired with iou = 0.0 i.e no intersection => FP or FN
+        paired_gt = paired_gt[paired_iou > match_iou]
+        paired_pred = paired_pred[paired_iou > match_iou]
+        paired_iou = paired_iou[paired_iou > match_iou]
+
+    # get the actual FP and FN
+    tp = len(paired_gt)
+    fp = len(pred_areas) - len(np.unique(paired_pred))
+    fn = len(gt_areas) - len(np.unique(paired_gt))
+    iou = paired_iou.sum()
+
+    return tp, fp, fn, iou
+
+
+def _class_overlap(sem_id, gt_classes, pred_classes, gt_areas, pred_areas, gt_idx, pred_idx, inters):
+    """Select the part of global overlap table which belongs to `sem_id`."""
+    gt_sel = np.nonzero(gt_classes == sem_id)[0]
+    pred_sel = np.nonzero(pred_classes == sem_id)[0]
+
+    # global component id -> local component index of this class
+    gt_local = np.full(len(gt_classes), -1, dtype=np.int64)
+    gt_local[gt_sel] = np.arange(len(gt_sel))
+    pred_local = np.full(len(pred_classes), -1, dtype=np.int64)
+    pred_local[pred_sel] = np.arange(len(pred_sel))
+
+    gt_idx = gt_local[gt_idx]
+    pred_idx = pred_local[pred_idx]
+    keep = (gt_idx >= 0) & (pred_idx >= 0)
+
+    return gt_areas[gt_sel], pred_areas[pred_sel], gt_idx[keep], pred_idx[keep], inters[keep]
+
+
+def _comp_classes(comp_parents, id_list_per_class):
+    """Map instance classes to connected components."""
+    inst_classes = np.zeros(comp_parents.max() + 1, dtype=np.int64)
+    for sem_id, inst_id_list in id_list_per_class.items():
+        inst_classes[np.array(inst_id_list, dtype=np.int64)] = sem_id
+    comp_classes = inst_classes[comp_parents]
+    # background component doesn't belong to any foreground class
+    comp_classes[0] = 0
+
+    return comp_classes
+
+
+def pre_eval_bin_aji(inst_pred, inst_gt, gt_comps=None):
+    # make instance id contiguous
+    comp_pred, _, pred_areas = label_inst_components(inst_pred)
+    comp_gt, _, gt_areas = label_inst_components(inst_gt) if gt_comps is None else gt_comps
+
+    gt_idx, pred_idx, inters = _pairwise_overlap(comp_pred, comp_gt)
+
+    # Remove background class
+    return _aji_from_overlap(gt_areas[1:], pred_areas[1:], gt_idx - 1, pred_idx - 1, inters)
+
+
+def pre_eval_aji(inst_pred,
+                 inst_gt,
+                 pred_id_list_per_class,
+                 gt_id_list_per_class,
+                 num_classes,
+                 reduce_zero_label=True,
+                 gt_comps=None,
+                 gt_inst_areas=None):
     pred_sem_ids = list(pred_id_list_per_class.keys())
     gt_sem_ids = list(gt_id_list_per_class.keys())
 
     union_sem_ids = list(set(pred_sem_ids + gt_sem_ids))
 
+    # One global overlap table is built and then partitioned by the class of
+    # each instance, instead of rebuilding instance maps for each class.
+    comp_pred, pred_parents, pred_comp_areas = label_inst_components(inst_pred)
+    comp_gt, gt_parents, gt_comp_areas = label_inst_components(inst_gt) if gt_comps is None else gt_comps
+    overlap = _pairwise_overlap(comp_pred, comp_gt)
+    pred_comp_classes = _comp_classes(pred_parents, pred_id_list_per_class)
+    gt_comp_classes = _comp_classes(gt_parents, gt_id_list_per_class)
+
+    # instance areas are the sums of component areas
+    pred_inst_areas = np.bincount(pred_parents, weights=pred_comp_areas)
+    if gt_inst_areas is None:
+        gt_inst_areas = np.bincount(gt_parents, weights=gt_comp_areas)
+
     overall_inter = np.zeros((num_classes), dtype=np.float32)
     overall_union = np.zeros((num_classes), dtype=np.float32)
     for sem_id in union_sem_ids:
@@ -105,28 +188,22 @@ def pre_eval_aji(inst_pred, inst_gt, pred_id_list_per_class, gt_id_list_per_clas
         if sem_id == 0:
             pred_id_list = pred_id_list_per_class[sem_id]
             gt_id_list = gt_id_list_per_class[sem_id]
-            overall_union[sem_id] += sum([np.sum(inst_pred == pred_id) for pred_id in pred_id_list if pred_id != 0])
-            overall_union[sem_id] += sum([np.sum(inst_gt == gt_id) for gt_id in gt_id_list if gt_id != 0])
+            overall_union[sem_id] += sum([pred_inst_areas[pred_id] for pred_id in pred_id_list if pred_id != 0])
+            overall_union[sem_id] += sum([gt_inst_areas[gt_id] for gt_id in gt_id_list if gt_id != 0])
             continue
 
         if sem_id in pred_id_list_per_class and sem_id in gt_id_list_per_class:
-            pred_id_list = pred_id_list_per_class[sem_id]
-            gt_id_list = gt_id_list_per_class[sem_id]
-            pred_inst_map = sum([((inst_pred == pred_id).astype(np.int32) * (idx + 1))
-                                 for idx, pred_id in enumerate(pred_id_list)])
-            gt_inst_map = sum([((inst_gt == gt_id).astype(np.int32) * (idx + 1))
-                               for idx, gt_id in enumerate(gt_id_list)])
-
-            res = pre_eval_bin_aji(pred_inst_map, gt_inst_map)
+            res = _aji_from_overlap(*_class_overlap(sem_id, gt_comp_classes, pred_comp_classes, gt_comp_areas,
+                                                    pred_comp_areas, *overlap))
             overall_inter[sem_id] += res[0]
             overall_union[sem_id] += res[1]
         # NOTE: this part overall union is about semantic results mismatching between prediction & ground truth.
         elif sem_id in pred_id_list_per_class:
             pred_id_list = pred_id_list_per_class[sem_id]
-            overall_union[sem_id] += sum([np.sum(inst_pred == pred_id) for pred_id in pred_id_list if pred_id != 0])
+            overall_union[sem_id] += sum([pred_inst_areas[pred_id] for pred_id in pred_id_list if pred_id != 0])
         elif sem_id in gt_id_list_per_class:
             gt_id_list = gt_id_list_per_class[sem_id]
-            overall_union[sem_id] += sum([np.sum(inst_gt == gt_id) for gt_id in gt_id_list if gt_id != 0])
+            overall_union[sem_id] += sum([gt_inst_areas[gt_id] for gt_id in gt_id_list if gt_id != 0])
 
     if reduce_zero_label:
         overall_inter = overall_inter[1:]
@@ -135,106 +212,39 @@ def pre_eval_aji(inst_pred, inst_gt, pred_id_list_per_class, gt_id_list_per_clas
     return overall_inter, overall_union
 
 
-def pre_eval_bin_pq(inst_pred, inst_gt, match_iou=0.5):
+def pre_eval_bin_pq(inst_pred, inst_gt, match_iou=0.5, gt_comps=None):
     assert match_iou >= 0.0, "Cant' be negative"
 
     # make instance id contiguous
-    inst_pred = measure.label(inst_pred.copy())
-    inst_gt = measure.label(inst_gt.copy())
-
-    pred_id_list = list(np.unique(inst_pred))
-    gt_id_list = list(np.unique(inst_gt))
-
-    if 0 not in pred_id_list:
-        pred_id_list.insert(0, 0)
+    comp_pred, _, pred_areas = label_inst_components(inst_pred)
+    comp_gt, _, gt_areas = label_inst_components(inst_gt) if gt_comps is None else gt_comps
 
-    if 0 not in gt_id_list:
-        gt_id_list.insert(0, 0)
+    gt_idx, pred_idx, inters = _pairwise_overlap(comp_pred, comp_gt)
 
     # Remove background class
-    pred_masks = []
-    for p in pred_id_list:
-        p_mask = (inst_pred == p).astype(np.uint8)
-        pred_masks.append(p_mask)
-
-    gt_masks = []
-    for g in gt_id_list:
-        g_mask = (inst_gt == g).astype(np.uint8)
-        gt_masks.append(g_mask)
-
-    # prefill with value
-    pairwise_iou = np.zeros([len(gt_id_list) - 1, len(pred_id_list) - 1], dtype=np.float64)
-
-    # caching pairwise iou
-    for gt_id in gt_id_list[1:]:  # 0-th is background
-        g_mask = gt_masks[gt_id]
-
-        rmin1, rmax1, cmin1, cmax1 = get_bounding_box(g_mask)
-        g_mask_crop = g_mask[rmin1:rmax1, cmin1:cmax1]
-        g_mask_crop = g_mask_crop.astype("int")
-        p_mask_crop = inst_pred[rmin1:rmax1, cmin1:cmax1]
-        pred_gt_overlap = p_mask_crop[g_mask_crop > 0]
-        pred_gt_overlap_id = np.unique(pred_gt_overlap)
-        pred_gt_overlap_id = list(pred_gt_overlap_id)
-        for pred_id in pred_gt_overlap_id:
-            if pred_id == 0:  # ignore
-                continue  # overlaping background
-            p_mask = pred_masks[pred_id]
-
-            # crop region to speed up computation
-            rmin2, rmax2, cmin2, cmax2 = get_bounding_box(p_mask)
-            rmin = min(rmin1, rmin2)
-            rmax = max(rmax1, rmax2)
-            cmin = min(cmin1, cmin2)
-            cmax = max(cmax1, cmax2)
-            g_mask_union_crop = g_mask[rmin:rmax, cmin:cmax]
-            p_mask_union_crop = p_mask[rmin:rmax, cmin:cmax]
-            total = (g_mask_union_crop + p_mask_union_crop).sum()
-            inter = (g_mask_union_crop * p_mask_union_crop).sum()
-            iou = inter / (total - inter)
-            pairwise_iou[gt_id - 1, pred_id - 1] = iou
-
-    if match_iou >= 0.5:
-        paired_iou = pairwise_iou[pairwise_iou > match_iou]
-        pairwise_iou[pairwise_iou <= match_iou] = 0.0
-        paired_gt, paired_pred = np.nonzero(pairwise_iou)
-        paired_iou = pairwise_iou[paired_gt, paired_pred]
-        paired_gt += 1  # index is instance id - 1
-        paired_pred += 1  # hence return back to original
-    else:  # * Exhaustive maximal unique pairing
-        # Munkres pairing with scipy library
-        # the algorithm return (row indices, matched column indices)
-        # if there is multiple same cost in a row, index of first occurence
-        # is return, thus the unique pairing is ensure
-        # inverse pair to get high IoU as minimum
-        paired_gt, paired_pred = linear_sum_assignment(-pairwise_iou)
-        # extract the paired cost and remove invalid pair
-        paired_iou = pairwise_iou[paired_gt, paired_pred]
+    return _pq_from_overlap(gt_areas[1:], pred_areas[1:], gt_idx - 1, pred_idx - 1, inters, match_iou)
 
-        # now select those above threshold level
-        # paired with iou = 0.0 i.e no intersection => FP or FN
-        paired_gt = list(paired_gt[paired_iou > match_iou] + 1)
-        paired_pred = list(paired_pred[paired_iou > match_iou] + 1)
-        paired_iou = paired_iou[paired_iou > match_iou]
-
-    # get the actual FP and FN
-    unpaired_gt = [idx for idx in gt_id_list[1:] if idx not in paired_gt]
-    unpaired_pred = [idx for idx in pred_id_list[1:] if idx not in paired_pred]
 
-    tp = len(paired_gt)
-    fp = len(unpaired_pred)
-    fn = len(unpaired_gt)
-    iou = paired_iou.sum()
-
-    return tp, fp, fn, iou
-
-
-def pre_eval_pq(inst_pred, inst_gt, pred_id_list_per_class, gt_id_list_per_class, num_classes, reduce_zero_label=True):
+def pre_eval_pq(inst_pred,
+                inst_gt,
+                pred_id_list_per_class,
+                gt_id_list_per_class,
+                num_classes,
+                reduce_zero_label=True,
+                gt_comps=None):
     pred_sem_ids = list(pred_id_list_per_class.keys())
     gt_sem_ids = list(gt_id_list_per_class.keys())
 
     union_sem_ids = list(set(pred_sem_ids + gt_sem_ids))
 
+    # One global overlap table is built and then partitioned by the class of
+    # each instance, instead of rebuilding instance maps for each class.
+    comp_pred, pred_parents, pred_comp_areas = label_inst_components(inst_pred)
+    comp_gt, gt_parents, gt_comp_areas = label_inst_components(inst_gt) if gt_comps is None else gt_comps
+    overlap = _pairwise_overlap(comp_pred, comp_gt)
+    pred_comp_classes = _comp_classes(pred_parents, pred_id_list_per_class)
+    gt_comp_classes = _comp_classes(gt_parents, gt_id_list_per_class)
+
     tp = np.zeros((num_classes), dtype=np.float32)
     fp = np.zeros((num_classes), dtype=np.float32)
     fn = np.zeros((num_classes), dtype=np.float32)
@@ -251,14 +261,8 @@ def pre_eval_pq(inst_pred, inst_gt, pred_id_list_per_class, gt_id_list_per_class
             continue
 
         if sem_id in pred_id_list_per_class and sem_id in gt_id_list_per_class:
-            pred_id_list = pred_id_list_per_class[sem_id]
-            gt_id_list = gt_id_list_per_class[sem_id]
-            pred_inst_map = sum([((inst_pred == pred_id).astype(np.int32) * (idx + 1))
-                                 for idx, pred_id in enumerate(pred_id_list)])
-            gt_inst_map = sum([((inst_gt == gt_id).astype(np.int32) * (idx + 1))
-                               for idx, gt_id in enumerate(gt_id_list)])
-
-            res = pre_eval_bin_pq(pred_inst_map, gt_inst_map)
+            res = _pq_from_overlap(*_class_overlap(sem_id, gt_comp_classes, pred_comp_classes, gt_comp_areas,
+                                                   pred_comp_areas, *overlap))
             tp[sem_id] += res[0]
             fp[sem_id] += res[1]
             fn[sem_id] += res[2]
@@ -380,95 +384,68 @@ def binary_inst_dice(inst_pred, inst_gt, match_iou=0.5):
     return 2 * tp / (2 * tp + fp + fn)
 
 
-def pre_eval_to_bin_aji(pre_eval_results, nan_to_num=None):
-    """Convert aji pre-eval overall intersection & pre-eval overall union to aji score."""
-    # convert list of tuples to tuple of lists, e.g.
-    # [(A_1, B_1, C_1, D_1), ...,  (A_n, B_n, C_n, D_n)] to
-    # ([A_1, ..., A_n], ..., [D_1, ..., D_n])
-    pre_eval_results = tuple(zip(*pre_eval_results))
-    assert len(pre_eval_results) == 2
+def _image_sums(pre_eval_results, num_items):
+    """Sum the pre-eval results of each image over classes, return
+    `num_items` arrays of shape (N, )."""
+    pre_eval_results = stack_pre_eval_results(pre_eval_results, num_items)
+    return pre_eval_results.reshape(*pre_eval_results.shape[:2], -1).sum(axis=2).T
 
-    # [0]: overall intersection
-    # [1]: overall union
-    inst_inter = [np.sum(x) for x in pre_eval_results[0]]
-    inst_union = [np.sum(x) for x in pre_eval_results[1]]
 
-    ret_metrics = {'Aji': sum(inst_inter) / sum(inst_union)}
+def _total_sums(pre_eval_results, num_items):
+    """Sum the pre-eval results over images, return `num_items` arrays of
+    shape (num_classes, ) (or scalars of binary results)."""
+    return stack_pre_eval_results(pre_eval_results, num_items).sum(axis=0)
+
 
+def _nan_to_num(ret_metrics, nan_to_num):
     if nan_to_num is not None:
         ret_metrics = OrderedDict(
             {metric: np.nan_to_num(metric_value, nan=nan_to_num)
              for metric, metric_value in ret_metrics.items()})
-
     return ret_metrics
 
 
-def pre_eval_to_imw_aji(pre_eval_results, nan_to_num=None):
+def pre_eval_to_bin_aji(pre_eval_results, nan_to_num=None):
     """Convert aji pre-eval overall intersection & pre-eval overall union to aji score."""
-    # convert list of tuples to tuple of lists, e.g.
-    # [(A_1, B_1, C_1, D_1), ...,  (A_n, B_n, C_n, D_n)] to
-    # ([A_1, ..., A_n], ..., [D_1, ..., D_n])
-    pre_eval_results = tuple(zip(*pre_eval_results))
-    assert len(pre_eval_results) == 2
+    # [0]: overall intersection
+    # [1]: overall union
+    inst_inter, inst_union = _image_sums(pre_eval_results, 2)
 
-    inst_inter = [np.sum(x) for x in pre_eval_results[0]]
-    inst_union = [np.sum(x) for x in pre_eval_results[1]]
+    ret_metrics = {'Aji': inst_inter.sum() / inst_union.sum()}
 
-    ret_metrics = {}
-    ret_metrics['Aji'] = []
-    for i, u in zip(inst_inter, inst_union):
-        ret_metrics['Aji'].append(i / u)
+    return _nan_to_num(ret_metrics, nan_to_num)
 
-    ret_metrics['Aji'] = np.array(ret_metrics['Aji'])
 
-    if nan_to_num is not None:
-        ret_metrics = OrderedDict(
-            {metric: np.nan_to_num(metric_value, nan=nan_to_num)
-             for metric, metric_value in ret_metrics.items()})
+def pre_eval_to_imw_aji(pre_eval_results, nan_to_num=None):
+    """Convert aji pre-eval overall intersection & pre-eval overall union to aji score."""
+    inst_inter, inst_union = _image_sums(pre_eval_results, 2)
 
-    return ret_metrics
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ret_metrics = {'Aji': inst_inter / inst_union}
+
+    return _nan_to_num(ret_metrics, nan_to_num)
 
 
 def pre_eval_to_aji(pre_eval_results, nan_to_num=None):
     """Convert aji pre-eval overall intersection & pre-eval overall union to aji score."""
-    # convert list of tuples to tuple of lists, e.g.
-    # [(A_1, B_1, C_1, D_1), ...,  (A_n, B_n, C_n, D_n)] to
-    # ([A_1, ..., A_n], ..., [D_1, ..., D_n])
-    pre_eval_results = tuple(zip(*pre_eval_results))
-    assert len(pre_eval_results) == 2
-
     # [0]: overall intersection
     # [1]: overall union
-    overall_inter = sum(pre_eval_results[0])
-    overall_union = sum(pre_eval_results[1])
+    overall_inter, overall_union = _total_sums(pre_eval_results, 2)
 
-    aji = overall_inter / overall_union
+    with np.errstate(divide='ignore', invalid='ignore'):
+        aji = overall_inter / overall_union
 
     ret_metrics = {'Aji': aji}
 
-    if nan_to_num is not None:
-        ret_metrics = OrderedDict(
-            {metric: np.nan_to_num(metric_value, nan=nan_to_num)
-             for metric, metric_value in ret_metrics.items()})
-
-    return ret_metrics
+    return _nan_to_num(ret_metrics, nan_to_num)
 
 
 def pre_eval_to_bin_pq(pre_eval_results, nan_to_num=None, analysis_mode=False):
-    # convert list of tuples to tuple of lists, e.g.
-    # [(A_1, B_1, C_1, D_1), ...,  (A_n, B_n, C_n, D_n)] to
-    # ([A_1, ..., A_n], ..., [D_1, ..., D_n])
-    pre_eval_results = tuple(zip(*pre_eval_results))
-    assert len(pre_eval_results) == 4
-
     # [0]: tp (The number of inst with iou > 0.5)
     # [1]: fp (The number of inst in prediction with iou < 0.5)
     # [2]: fn (The numebr of inst in ground truth with iou < 0.5)
     # [3]: iou (The sum value of paired inst iou)
-    tp = sum([np.sum(x) for x in pre_eval_results[0]])
-    fp = sum([np.sum(x) for x in pre_eval_results[1]])
-    fn = sum([np.sum(x) for x in pre_eval_results[2]])
-    iou = sum([np.sum(x) for x in pre_eval_results[3]])
+    tp, fp, fn, iou = _image_sums(pre_eval_results, 4).sum(axis=1)
 
     # get the F1-score i.e DQ
     dq = tp / (tp + 0.5 * fp + 0.5 * fn)
@@ -477,12 +454,7 @@ def pre_eval_to_bin_pq(pre_eval_results, nan_to_num=None, analysis_mode=False):
 
     pq = dq * sq
 
-    ret_metrics = {'DQ': dq, 'SQ': sq, 'PQ': pq}
-
-    if nan_to_num is not None:
-        ret_metrics = OrderedDict(
-            {metric: np.nan_to_num(metric_value, nan=nan_to_num)
-             for metric, metric_value in ret_metrics.items()})
+    ret_metrics = _nan_to_num({'DQ': dq, 'SQ': sq, 'PQ': pq}, nan_to_num)
 
     if analysis_mode:
         analysis = {'pq_TP': tp, 'pq_FP': fp, 'pq_FN': fn, 'pq_IoU': np.round(iou, 2)}
@@ -492,75 +464,38 @@ def pre_eval_to_bin_pq(pre_eval_results, nan_to_num=None, analysis_mode=False):
 
 
 def pre_eval_to_imw_pq(pre_eval_results, nan_to_num=None):
-    # convert list of tuples to tuple of lists, e.g.
-    # [(A_1, B_1, C_1, D_1), ...,  (A_n, B_n, C_n, D_n)] to
-    # ([A_1, ..., A_n], ..., [D_1, ..., D_n])
-    pre_eval_results = tuple(zip(*pre_eval_results))
-    assert len(pre_eval_results) == 4
-
     # [0]: tp (The number of inst with iou > 0.5)
     # [1]: fp (The number of inst in prediction with iou < 0.5)
     # [2]: fn (The numebr of inst in ground truth with iou < 0.5)
     # [3]: iou (The sum value of paired inst iou)
-    tp_list = [np.sum(x) for x in pre_eval_results[0]]
-    fp_list = [np.sum(x) for x in pre_eval_results[1]]
-    fn_list = [np.sum(x) for x in pre_eval_results[2]]
-    iou_list = [np.sum(x) for x in pre_eval_results[3]]
-
-    ret_metrics = {}
-    ret_metrics['DQ'] = []
-    ret_metrics['SQ'] = []
-    ret_metrics['PQ'] = []
-    for tp, fp, fn, iou in zip(tp_list, fp_list, fn_list, iou_list):
-        # get the F1-score i.e DQ
-        dq = tp / (tp + 0.5 * fp + 0.5 * fn + 1.0e-6)
-        # get the SQ, no paired has 0 iou so not impact
-        sq = iou / (tp + 1.0e-6)
-        pq = dq * sq
-        ret_metrics['DQ'].append(dq)
-        ret_metrics['SQ'].append(sq)
-        ret_metrics['PQ'].append(pq)
-
-    ret_metrics['DQ'] = np.array(ret_metrics['DQ'])
-    ret_metrics['SQ'] = np.array(ret_metrics['SQ'])
-    ret_metrics['PQ'] = np.array(ret_metrics['PQ'])
+    tp, fp, fn, iou = _image_sums(pre_eval_results, 4)
 
-    if nan_to_num is not None:
-        ret_metrics = OrderedDict(
-            {metric: np.nan_to_num(metric_value, nan=nan_to_num)
-             for metric, metric_value in ret_metrics.items()})
+    # get the F1-score i.e DQ
+    dq = tp / (tp + 0.5 * fp + 0.5 * fn + 1.0e-6)
+    # get the SQ, no paired has 0 iou so not impact
+    sq = iou / (tp + 1.0e-6)
+    pq = dq * sq
 
-    return ret_metrics
+    ret_metrics = {'DQ': dq, 'SQ': sq, 'PQ': pq}
 
+    return _nan_to_num(ret_metrics, nan_to_num)
 
-def pre_eval_to_pq(pre_eval_results, nan_to_num=None, analysis_mode=False):
-    # convert list of tuples to tuple of lists, e.g.
-    # [(A_1, B_1, C_1, D_1), ...,  (A_n, B_n, C_n, D_n)] to
-    # ([A_1, ..., A_n], ..., [D_1, ..., D_n])
-    pre_eval_results = tuple(zip(*pre_eval_results))
-    assert len(pre_eval_results) == 4
 
+def pre_eval_to_pq(pre_eval_results, nan_to_num=None, analysis_mode=False):
     # [0]: tp (The number of inst with iou > 0.5)
     # [1]: fp (The number of inst in prediction with iou < 0.5)
     # [2]: fn (The numebr of inst in ground truth with iou < 0.5)
     # [3]: iou (The sum value of paired inst iou)
-    tp = sum(pre_eval_results[0])
-    fp = sum(pre_eval_results[1])
-    fn = sum(pre_eval_results[2])
-    iou = sum(pre_eval_results[3])
+    tp, fp, fn, iou = _total_sums(pre_eval_results, 4)
 
-    # get the F1-score i.e DQ
-    dq = tp / (tp + 0.5 * fp + 0.5 * fn)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # get the F1-score i.e DQ
+        dq = tp / (tp + 0.5 * fp + 0.5 * fn)
     # get the SQ, no paired has 0 iou so not impact
     sq = iou / (tp + 1.0e-6)
     pq = dq * sq
 
-    ret_metrics = {'DQ': dq, 'SQ': sq, 'PQ': pq}
-
-    if nan_to_num is not None:
-        ret_metrics = OrderedDict(
-            {metric: np.nan_to_num(metric_value, nan=nan_to_num)
-             for metric, metric_value in ret_metrics.items()})
+    ret_metrics = _nan_to_num({'DQ': dq, 'SQ': sq, 'PQ': pq}, nan_to_num)
 
     if analysis_mode:
         analysis = {'pq_TP': tp, 'pq_FP': fp, 'pq_FN': fn, 'pq_IoU': np.round(iou, 2)}
@@ -570,57 +505,26 @@ def pre_eval_to_pq(pre_eval_results, nan_to_num=None, analysis_mode=False):
 
 
 def pre_eval_to_imw_inst_dice(pre_eval_results, nan_to_num=None):
-    # convert list of tuples to tuple of lists, e.g.
-    # [(A_1, B_1, C_1, D_1), ...,  (A_n, B_n, C_n, D_n)] to
-    # ([A_1, ..., A_n], ..., [D_1, ..., D_n])
-    pre_eval_results = tuple(zip(*pre_eval_results))
-    assert len(pre_eval_results) == 4
-
     # [0]: tp (The number of inst with iou > 0.5)
     # [1]: fp (The number of inst in prediction with iou < 0.5)
     # [2]: fn (The numebr of inst in ground truth with iou < 0.5)
     # [3]: iou (The sum value of paired inst iou)
-    tp_list = pre_eval_results[0]
-    fp_list = pre_eval_results[1]
-    fn_list = pre_eval_results[2]
-    _ = pre_eval_results[3]
+    tp, fp, fn, _ = _image_sums(pre_eval_results, 4)
 
-    ret_metrics = {}
-    ret_metrics['InstDice'] = []
-    for tp, fp, fn in zip(tp_list, fp_list, fn_list):
-        inst_dice = 2 * tp / (2 * tp + fp + fn)
-        ret_metrics['InstDice'].append(inst_dice)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ret_metrics = {'InstDice': 2 * tp / (2 * tp + fp + fn)}
 
-    ret_metrics['InstDice'] = np.array(ret_metrics['InstDice'])
-
-    if nan_to_num is not None:
-        ret_metrics = OrderedDict(
-            {metric: np.nan_to_num(metric_value, nan=nan_to_num)
-             for metric, metric_value in ret_metrics.items()})
-    return ret_metrics
+    return _nan_to_num(ret_metrics, nan_to_num)
 
 
 def pre_eval_to_inst_dice(pre_eval_results, nan_to_num=None):
-    # convert list of tuples to tuple of lists, e.g.
-    # [(A_1, B_1, C_1, D_1), ...,  (A_n, B_n, C_n, D_n)] to
-    # ([A_1, ..., A_n], ..., [D_1, ..., D_n])
-    pre_eval_results = tuple(zip(*pre_eval_results))
-    assert len(pre_eval_results) == 4
-
     # [0]: tp (The number of inst with iou > 0.5)
     # [1]: fp (The number of inst in prediction with iou < 0.5)
     # [2]: fn (The numebr of inst in ground truth with iou < 0.5)
     # [3]: iou (The sum value of paired inst iou)
-    tp = sum(pre_eval_results[0])
-    fp = sum(pre_eval_results[1])
-    fn = sum(pre_eval_results[2])
+    tp, fp, fn, _ = _total_sums(pre_eval_results, 4)
 
-    ret_metrics = {}
-    ret_metrics['InstDice'] = 2 * tp / (2 * tp + fp + fn)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ret_metrics = {'InstDice': 2 * tp / (2 * tp + fp + fn)}
 
-    if nan_to_num is not None:
-        ret_metrics = OrderedDict(
-            {metric: np.nan_to_num(metric_value, nan=nan_to_num)
-             for metric, metric_value in ret_metrics.items()})
-
-    return ret_metrics
+    return _nan_to_num(ret_metrics, nan_to_num)
@@ -0,0 +1,134 @@
+import numpy as np
+import torch
+
+
+def _to_array(value):
+    if isinstance(value, torch.Tensor):
+        return value.detach().cpu().numpy().astype(np.float64)
+    if isinstance(value, (tuple, list)):
+        return np.stack([_to_array(x) for x in value])
+    return np.asarray(value, dtype=np.float64)
+
+
+def stack_pre_eval_results(pre_eval_results, num_items):
+    """Stack pre-eval results to an array of shape (N, num_items, ...).
+
+    Args:
+        pre_eval_results (list[tuple] | np.ndarray): The pre-eval results
+            (tuples of `num_items` items) of each image, or the stacked
+            array (e.g. from `MetricAccumulator.compute`).
+        num_items (int): The number of items of each pre-eval result.
+    """
+    if not isinstance(pre_eval_results, np.ndarray):
+        pre_eval_results = np.stack([_to_array(x) for x in pre_eval_results])
+    assert pre_eval_results.shape[1] == num_items
+    return pre_eval_results
+
+
+class MetricAccumulator(object):
+    """Streaming accumulator of pre-eval results.
+
+    The pre-eval results of `dataset.pre_eval` (dicts of tensors, numbers or
+    tuples of them) are converted to rows of fixed-size float64 arrays when
+    they arrive, so the memory is O(#images x #metrics) scalars and
+    `dataset.evaluate` reduces the metrics by vectorized sums instead of
+    pivoting lists of tensors. String values (e.g. `name`) are kept in lists.
+
+    The rows are recorded with their dataset indices, `compute` sorts them
+    by index and removes the duplicates (the padding of
+    `DistributedSampler`), so the merged results of all ranks are the same as
+    single gpu test.
+
+    :Example:
+
+    >>> accumulator = MetricAccumulator()
+    >>> for indices, pred in ...:
+    >>>     accumulator.update(dataset.pre_eval(pred, indices), indices)
+    >>> accumulator.merge(other_accumulator)
+    >>> eval_res, _ = dataset.evaluate(accumulator)
+    """
+
+    def __init__(self):
+        self.num_rows = 0
+        self.indices = []
+        self.stats = {}
+        self.texts = {}
+
+    def __len__(self):
+        return self.num_rows
+
+    def update(self, pre_eval_results, indices=None):
+        """Add the pre-eval results of images.
+
+        Args:
+            pre_eval_results (list[dict] | dict): The pre-eval results.
+            indices (list[int] | int | None): The dataset indices of results.
+                Default: None (unknown, the results keep the adding order).
+        """
+        if isinstance(pre_eval_results, dict):
+            pre_eval_results = [pre_eval_results]
+        if indices is None:
+            indices = [-1] * len(pre_eval_results)
+        elif not isinstance(indices, (list, tuple)):
+            indices = [indices]
+        assert len(indices) == len(pre_eval_results)
+
+        for index, result in zip(indices, pre_eval_results):
+            row = self.num_rows
+            for key, value in result.items():
+                if isinstance(value, str):
+                    self.texts.setdefault(key, []).append(value)
+                    continue
+
+                value = _to_array(value)
+                if key not in self.stats:
+                    self.stats[key] = np.zeros((max(16, row + 1), *value.shape), dtype=np.float64)
+                elif row >= len(self.stats[key]):
+                    # grow by doubling
+                    buffer = self.stats[key]
+                    self.stats[key] = np.concatenate([buffer, np.zeros_like(buffer)])
+                self.stats[key][row] = value
+
+            self.indices.append(int(index))
+            self.num_rows += 1
+
+    def merge(self, other):
+        """Merge the results of another accumulator (e.g. of other ranks)."""
+        for key, buffer in other.stats.items():
+            rows = buffer[:other.num_rows]
+            if key in self.stats:
+                self.stats[key] = np.concatenate([self.stats[key][:self.num_rows], rows])
+            else:
+                self.stats[key] = rows.copy()
+        for key, texts in other.texts.items():
+            self.texts.setdefault(key, []).extend(texts)
+        self.indices.extend(other.indices)
+        self.num_rows += other.num_rows
+        return self
+
+    def compute(self):
+        """Get the per-image results.
+
+        Returns:
+            dict[str, np.ndarray | list]: The stacked results of each key,
+                shape (N, ...), in the order of dataset indices.
+        """
+        indices = np.array(self.indices, dtype=np.int64)
+        if self.num_rows > 0 and (indices >= 0).all():
+            _, order = np.unique(indices, return_index=True)
+        else:
+            order = np.arange(self.num_rows)
+
+        results = {key: buffer[:self.num_rows][order] for key, buffer in self.stats.items()}
+        results.update({key: [texts[i] for i in order] for key, texts in self.texts.items()})
+        return results
+
+    @classmethod
+    def from_results(cls, results):
+        """Make accumulator from a list of pre-eval results (the results of
+        offline scripts), an accumulator is returned as is."""
+        if isinstance(results, cls):
+            return results
+        accumulator = cls()
+        accumulator.update(list(results))
+        return accumulator
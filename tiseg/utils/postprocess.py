@@ -13,8 +13,8 @@ def check_coord(x, y, h, w):
 def get_graph_degree(graph):
     n = graph.shape[0]
     m = graph.shape[1]
-    dirx = [0, 0, -1, -1, -1, 0, 1, 1, 1, 0, -1, -1, -1, 0, 1, 1, 1]
-    diry = [0, -1, -1, 0, 1, 1, 1, 0, -1, -1, -1, 0, 1, 1, 1, 0, -1]
+    dirx = np.array([0, 0, -1, -1, -1, 0, 1, 1, 1, 0, -1, -1, -1, 0, 1, 1, 1])
+    diry = np.array([0, -1, -1, 0, 1, 1, 1, 0, -1, -1, -1, 0, 1, 1, 1, 0, -1])
     offset = [0]
     degree = np.zeros((n, m), dtype=np.int16)
     for i in range(n):
@@ -32,8 +32,8 @@ def get_graph_degree(graph):
 def prepare(seg, dir_graph, contour, degree):
     h, w = seg.shape[:2]
     # map between direction & coordinate offset.
-    dirx = [0, 0, -1, -1, -1, 0, 1, 1, 1]
-    diry = [0, -1, -1, 0, 1, 1, 1, 0, -1]
+    dirx = np.array([0, 0, -1, -1, -1, 0, 1, 1, 1])
+    diry = np.array([0, -1, -1, 0, 1, 1, 1, 0, -1])
 
     cnt = 0
     # vis denote whether (i, j) is visited or not.
@@ -43,7 +43,13 @@ def prepare(seg, dir_graph, contour, degree):
     level = np.zeros((h, w), dtype=np.int16)
     hfa = np.zeros((h, w), dtype=np.int16)
     level += 1
-    Q = []
+    # Each point is pushed at most once (guarded by vis), so two preallocated
+    # frontier buffers of h * w points are enough for the whole bfs.
+    Qx = np.empty(h * w, dtype=np.int32)
+    Qy = np.empty(h * w, dtype=np.int32)
+    NQx = np.empty(h * w, dtype=np.int32)
+    NQy = np.empty(h * w, dtype=np.int32)
+    q_len = 0
 
     for i in range(h):
         for j in range(w):
@@ -63,10 +69,14 @@ def prepare(seg, dir_graph, contour, degree):
                     if (nx < 0 and nx >= h and ny < 0 and ny >= w and contour[nx][ny] > 0):
                         ok2 = 1
             if (ok2 == 0 and ok1 == 1):
-                Q.append((i, j))
+                Qx[q_len] = i
+                Qy[q_len] = j
+                q_len += 1
                 vis[i][j] = 1
             if contour[i][j] > 0 and vis[i][j] == 0:
-                Q.append((i, j))
+                Qx[q_len] = i
+                Qy[q_len] = j
+                q_len += 1
                 vis[i][j] = 1
             # process point without direction.
             if dir_graph[i][j] > 0:
@@ -76,22 +86,22 @@ def prepare(seg, dir_graph, contour, degree):
                     hfa[nx][ny] = 1
 
     Iter = 1
-    while (len(Q) > 0):
-        NQ = []
-        ix = 0
+    while (q_len > 0):
+        nq_len = 0
 
         Iter += 1
         cnt = 0
-        while (ix < len(Q)):
-            x, y = Q[ix][0], Q[ix][1]
-            ix += 1
+        for ix in range(q_len):
+            x, y = Qx[ix], Qy[ix]
             # update the point.
             if dir_graph[x][y] != 0:
                 nx = x + dirx[dir_graph[x][y]]
                 ny = y + diry[dir_graph[x][y]]
                 if (nx >= 0 and nx < h and ny >= 0 and ny < w and (seg[nx][ny] > 0 or seg[nx][ny] > 0)):
                     if (vis[nx][ny] == 0):
-                        NQ.append((nx, ny))
+                        NQx[nq_len] = nx
+                        NQy[nq_len] = ny
+                        nq_len += 1
                         vis[nx][ny] = Iter
                         cnt += 1
                     if (vis[nx][ny] == Iter):
@@ -99,16 +109,16 @@ def prepare(seg, dir_graph, contour, degree):
                         if (dir_graph[nx][ny] == 0):
                             dir_graph[nx][ny] = dir_graph[x][y]
         # 更新4邻域的点，加入下一次迭代
-        ix = 0
-        while (ix < len(Q)):
-            x, y = Q[ix][0], Q[ix][1]
-            ix += 1
+        for ix in range(q_len):
+            x, y = Qx[ix], Qy[ix]
             for k in range(1, 9):
                 nx = x + dirx[k]
                 ny = y + diry[k]
                 if (nx >= 0 and nx < h and ny >= 0 and ny < w and (seg[nx][ny] > 0) and vis[nx][ny] == 0
                         and hfa[nx][ny] == 0):
-                    NQ.append((nx, ny))
+                    NQx[nq_len] = nx
+                    NQy[nq_len] = ny
+                    nq_len += 1
                     vis[nx][ny] = Iter
                     if dir_graph[nx][ny] == 0:
                         dir_graph[nx][ny] = k
@@ -116,8 +126,11 @@ def prepare(seg, dir_graph, contour, degree):
                     if level[x][y] <= -1:
                         level[nx][ny] = min(level[nx][ny], level[x][y])
 
-        Q = NQ
-    return vis, level, hfa, Q, seg
+        Qx, NQx = NQx, Qx
+        Qy, NQy = NQy, Qy
+        q_len = nq_len
+    # frontier is always empty after bfs.
+    return vis, level, hfa, np.empty((0, 2), dtype=np.int32), seg
 
 
 @jit(nopython=True)
@@ -125,33 +138,37 @@ def align_foreground(pred, foreground, time):
     h, w = pred.shape[:2]
 
     # 8 个方向对应坐标变化量
-    dirx = [0, 0, -1, -1, -1, 0, 1, 1, 1]
-    diry = [0, -1, -1, 0, 1, 1, 1, 0, -1]
-    vis = np.zeros((h, w), dtype=np.int16)
-    Q = []
+    dirx = np.array([0, 0, -1, -1, -1, 0, 1, 1, 1])
+    diry = np.array([0, -1, -1, 0, 1, 1, 1, 0, -1])
+    # Single multi-source bfs: a FIFO queue visits points ring by ring in the
+    # same order as growing one ring per iteration, and each point is pushed
+    # at most once, so one preallocated buffer of h * w points is enough.
+    Qx = np.empty(h * w, dtype=np.int32)
+    Qy = np.empty(h * w, dtype=np.int32)
+    Qd = np.empty(h * w, dtype=np.int32)
+    head = 0
+    tail = 0
     for i in range(h):
         for j in range(w):
             if pred[i][j] > 0:
-                Q.append((i, j))
-                vis[i][j] = 1
-    Iter = 1
-    while (len(Q) > 0):
-        NQ = []
-        ix = 0
+                Qx[tail] = i
+                Qy[tail] = j
+                Qd[tail] = 1
+                tail += 1
+    while (head < tail):
+        x, y, Iter = Qx[head], Qy[head], Qd[head]
+        head += 1
         if Iter >= time:
             break
-        Iter += 1
-        while (ix < len(Q)):
-            x, y = Q[ix][0], Q[ix][1]
-            ix += 1
-            for k in range(1, 9):
-                nx = x + dirx[k]
-                ny = y + diry[k]
-                if (nx >= 0 and nx < h and ny >= 0 and ny < w and pred[nx][ny] == 0 and foreground[nx][ny] > 0):
-                    NQ.append((nx, ny))
-                    vis[nx][ny] = Iter
-                    pred[nx][ny] = pred[x][y]
-        Q = NQ
+        for k in range(1, 9):
+            nx = x + dirx[k]
+            ny = y + diry[k]
+            if (nx >= 0 and nx < h and ny >= 0 and ny < w and pred[nx][ny] == 0 and foreground[nx][ny] > 0):
+                Qx[tail] = nx
+                Qy[tail] = ny
+                Qd[tail] = Iter + 1
+                tail += 1
+                pred[nx][ny] = pred[x][y]
     return pred
 
 
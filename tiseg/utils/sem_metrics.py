@@ -4,6 +4,8 @@ import mmcv
 import numpy as np
 import torch
 
+from .metric_accumulator import stack_pre_eval_results
+
 
 def to_ndarray(val):
     if isinstance(val, torch.Tensor):
@@ -162,47 +164,33 @@ def intersect_and_union(pred_label, target_label, num_classes, nan_to_num=None):
 
 
 def pre_eval_to_imw_sem_metrics(pre_eval_results, metrics=['IoU'], nan_to_num=None):
+    """Convert pre-eval results to image wise metrics.
+
+    Args:
+        pre_eval_results (list[tuple[torch.Tensor]] | np.ndarray): per image
+            eval results (or the stacked array, shape (N, 6, num_classes)).
+        metrics (list[str] | str): Metrics to be evaluated.
+        nan_to_num (int, optional): If specified, NaN values will be replaced
+            by the numbers defined by the user. Default: None.
+    Returns:
+        dict[str, np.ndarray]: The metrics of each image, shape (N, ).
     """
-    """
-    # convert list of tuples to tuple of lists, e.g.
-    # [(A_1, B_1, C_1, D_1), ...,  (A_n, B_n, C_n, D_n)] to
-    # ([A_1, ..., A_n], ..., [D_1, ..., D_n])
-    pre_eval_results = tuple(zip(*pre_eval_results))
-    assert len(pre_eval_results) == 6
-
-    TP_list = [torch.sum(x) for x in pre_eval_results[0]]
-    TN_list = [torch.sum(x) for x in pre_eval_results[1]]
-    FP_list = [torch.sum(x) for x in pre_eval_results[2]]
-    FN_list = [torch.sum(x) for x in pre_eval_results[3]]
-    # prediction area
-    P_list = [torch.sum(x) for x in pre_eval_results[4]]
-    # Ground Truth area
-    G_list = [torch.sum(x) for x in pre_eval_results[5]]
+    # (N, 6, num_classes) -> 6 arrays of shape (N, ), the areas of all classes
+    pre_eval_results = stack_pre_eval_results(pre_eval_results, 6)
+    TP, TN, FP, FN, P, G = pre_eval_results.reshape(*pre_eval_results.shape[:2], -1).sum(axis=2).T
 
     ret_metrics = {}
-    if 'Accuracy' in metrics:
-        ret_metrics['Accuracy'] = []
-        for TP, TN, G in zip(TP_list, TN_list, G_list):
-            ret_metrics['Accuracy'].append(to_ndarray((TP + TN) / (G.sum())))
-    if 'IoU' in metrics:
-        ret_metrics['IoU'] = []
-        for TP, P, G in zip(TP_list, P_list, G_list):
-            ret_metrics['IoU'].append(to_ndarray(TP / (G + P - TP)))
-    if 'Dice' in metrics:
-        ret_metrics['Dice'] = []
-        for TP, P, G in zip(TP_list, P_list, G_list):
-            ret_metrics['Dice'].append(to_ndarray(2 * TP / (G + P)))
-    if 'Recall' in metrics:
-        ret_metrics['Recall'] = []
-        for TP, FN in zip(TP_list, FN_list):
-            ret_metrics['Recall'].append(to_ndarray(TP / (TP + FN)))
-    if 'Precision' in metrics:
-        ret_metrics['Precision'] = []
-        for TP, FP in zip(TP_list, FP_list):
-            ret_metrics['Precision'].append(to_ndarray(TP / (TP + FP)))
-
-    for key in ret_metrics.keys():
-        ret_metrics[key] = to_ndarray(ret_metrics[key])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if 'Accuracy' in metrics:
+            ret_metrics['Accuracy'] = (TP + TN) / G
+        if 'IoU' in metrics:
+            ret_metrics['IoU'] = TP / (G + P - TP)
+        if 'Dice' in metrics:
+            ret_metrics['Dice'] = 2 * TP / (G + P)
+        if 'Recall' in metrics:
+            ret_metrics['Recall'] = TP / (TP + FN)
+        if 'Precision' in metrics:
+            ret_metrics['Precision'] = TP / (TP + FP)
 
     if nan_to_num is not None:
         ret_metrics = OrderedDict(
@@ -215,8 +203,9 @@ def pre_eval_to_sem_metrics(pre_eval_results, metrics=['IoU'], nan_to_num=None,
     """Convert pre-eval results to metrics.
 
     Args:
-        pre_eval_results (list[tuple[torch.Tensor]]): per image eval results
-            for computing evaluation metric
+        pre_eval_results (list[tuple[torch.Tensor]] | np.ndarray): per image
+            eval results for computing evaluation metric (or the stacked
+            array, shape (N, 6, num_classes)).
         metrics (list[str] | str): Metrics to be evaluated, 'mIoU' and 'mDice'.
         nan_to_num (int, optional): If specified, NaN values will be replaced
             by the numbers defined by the user. Default: None.
@@ -226,18 +215,10 @@ def pre_eval_to_sem_metrics(pre_eval_results, metrics=['IoU'], nan_to_num=None,
         ndarray: Per category evaluation metrics, shape (num_classes, ).
     """
 
-    # convert list of tuples to tuple of lists, e.g.
-    # [(A_1, B_1, C_1, D_1), ...,  (A_n, B_n, C_n, D_n)] to
-    # ([A_1, ..., A_n], ..., [D_1, ..., D_n])
-    pre_eval_results = tuple(zip(*pre_eval_results))
-    assert len(pre_eval_results) == 6
-
-    total_area_TP = sum(pre_eval_results[0])
-    total_area_TN = sum(pre_eval_results[1])
-    total_area_FP = sum(pre_eval_results[2])
-    total_area_FN = sum(pre_eval_results[3])
-    total_area_pred_label = sum(pre_eval_results[4])
-    total_area_label = sum(pre_eval_results[5])
+    # sum over images, (N, 6, num_classes) -> 6 tensors of (num_classes, )
+    pre_eval_results = stack_pre_eval_results(pre_eval_results, 6)
+    total_area_TP, total_area_TN, total_area_FP, total_area_FN, total_area_pred_label, total_area_label = \
+        torch.from_numpy(pre_eval_results.sum(axis=0))
 
     ret_metrics = total_area_to_sem_metrics(total_area_TP, total_area_TN, total_area_FP, total_area_FN,
                                             total_area_pred_label, total_area_label, metrics, nan_to_num)
@@ -0,0 +1,74 @@
+import argparse
+
+import torch
+from mmcv import Config
+from mmcv.runner import load_checkpoint
+
+from tiseg.models import build_segmentor
+from tiseg.utils import get_device
+
+
+def check_streaming_tta(model, img, meta, max_tta_memory):
+    """Compare streaming TTA inference (`max_tta_memory`) of MultiTaskCDNet
+    with the batched one."""
+    model.test_cfg.pop('max_tta_memory', None)
+    with torch.no_grad():
+        tc_logit, sem_logit, dir_map = model.inference(img, meta, True)
+
+    model.test_cfg.max_tta_memory = max_tta_memory
+    with torch.no_grad():
+        stream_tc_logit, stream_sem_logit, stream_dir_map = model.inference(img, meta, True)
+    model.test_cfg.pop('max_tta_memory')
+
+    tc_diff = float((tc_logit - stream_tc_logit).abs().max())
+    sem_diff = float((sem_logit - stream_sem_logit).abs().max())
+    dir_mismatch = int((dir_map != stream_dir_map).sum())
+    print(f'max_tta_memory: {max_tta_memory} MB, tc max abs diff: {tc_diff:.2e}, '
+          f'sem max abs diff: {sem_diff:.2e}, mismatched direction pixels: {dir_mismatch}')
+
+    return tc_diff, sem_diff, dir_mismatch
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Check streaming TTA inference against the batched one.')
+    parser.add_argument('config', help='test config file path (MultiTaskCDNet).')
+    parser.add_argument('--checkpoint', default=None, help='checkpoint file (random weights if not given).')
+    parser.add_argument('--shape', nargs=2, type=int, default=[512, 512], help='height & width of random input.')
+    parser.add_argument(
+        '--max-tta-memory',
+        nargs='+',
+        type=float,
+        default=[1, 1024],
+        help='The TTA memory budgets (MB) to check, small budgets take the two pass path.')
+    parser.add_argument(
+        '--device', default='auto', type=str, help='The inference device (auto, cpu, cuda, cuda:1, ...).')
+    parser.add_argument('--tol', type=float, default=1e-5, help='The tolerance of probability differences.')
+    args = parser.parse_args()
+    return args
+
+
+def main():
+    args = parse_args()
+
+    cfg = Config.fromfile(args.config)
+    model = build_segmentor(cfg.model, train_cfg=cfg.get('train_cfg'), test_cfg=cfg.get('test_cfg'))
+    if args.checkpoint is not None:
+        load_checkpoint(model, args.checkpoint, map_location='cpu')
+
+    device = get_device(args.device)
+    model = model.to(device).eval()
+
+    torch.manual_seed(0)
+    h, w = args.shape
+    img = torch.rand((1, 3, h, w), device=device)
+    meta = dict(ori_hw=(h, w))
+
+    passed = True
+    for max_tta_memory in args.max_tta_memory:
+        tc_diff, sem_diff, dir_mismatch = check_streaming_tta(model, img, meta, max_tta_memory)
+        passed = passed and tc_diff <= args.tol and sem_diff <= args.tol and dir_mismatch == 0
+    print('passed' if passed else 'failed')
+
+
+if __name__ == '__main__':
+    main()
@@ -15,7 +15,7 @@ def test_flops(model, cfg):
             'FLOPs counter is currently not currently supported with {}'.
             format(model.__class__.__name__))
 
-    image_input = torch.randn((1, 3, *cfg.crop_size)).cuda()
+    image_input = torch.randn((1, 3, *cfg.crop_size))
     text_input = torch.randint(0, cfg.vocab_size, (1, 1, cfg.pad_length))
 
     if torch.cuda.is_available():
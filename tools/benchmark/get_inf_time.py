@@ -3,13 +3,13 @@ import time
 
 import torch
 from mmcv import Config
-from mmcv.parallel import MMDataParallel
 
 from tiseg.datasets import build_dataloader, build_dataset
 from tiseg.models import build_segmentor
+from tiseg.utils import get_device, wrap_inference_model
 
 
-def test_inf_time(data_loader, model, log_interval):
+def test_inf_time(data_loader, model, log_interval, device):
     # the first several iterations may be very slow so skip them
     num_warmup = 5
     pure_inf_time = 0
@@ -18,13 +18,15 @@ def test_inf_time(data_loader, model, log_interval):
     # benchmark with 200 image and take the average
     for i, data in enumerate(data_loader):
 
-        torch.cuda.synchronize()
+        if device.type == 'cuda':
+            torch.cuda.synchronize(device)
         start_time = time.perf_counter()
 
         with torch.no_grad():
             model(return_loss=False, rescale=True, **data)
 
-        torch.cuda.synchronize()
+        if device.type == 'cuda':
+            torch.cuda.synchronize(device)
         elapsed = time.perf_counter() - start_time
 
         if i >= num_warmup:
@@ -45,6 +47,10 @@ def parse_args():
     parser.add_argument('config', help='test config file path.')
     parser.add_argument(
         '--log-interval', type=int, default=50, help='interval of logging.')
+    parser.add_argument(
+        '--device', default='auto', type=str, help='The inference device (auto, cpu, cuda, cuda:1, ...).')
+    parser.add_argument('--num-threads', type=int, default=None, help='The number of threads for cpu inference.')
+    parser.add_argument('--channels-last', action='store_true', help='Whether to use channels last memory format.')
     args = parser.parse_args()
     return args
 
@@ -64,7 +70,8 @@ def main():
     # load_checkpoint(model, args.checkpoint, map_location='cpu')
 
     # deploy model
-    model = MMDataParallel(model, device_ids=[0])
+    device = get_device(args.device)
+    model = wrap_inference_model(model, device, args.num_threads, args.channels_last)
     model.eval()
     # build the dataloader
     # TODO: support multiple images per gpu (only minor changes are needed)
@@ -76,7 +83,7 @@ def main():
         dist=False,
         shuffle=False)
 
-    test_inf_time(data_loader, model, args.log_interval)
+    test_inf_time(data_loader, model, args.log_interval, device)
 
 
 if __name__ == '__main__':
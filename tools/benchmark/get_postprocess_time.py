@@ -0,0 +1,67 @@
+import argparse
+import time
+
+import numpy as np
+from scipy.ndimage import binary_dilation, binary_erosion, distance_transform_edt, gaussian_filter
+from skimage import measure
+from skimage.segmentation import watershed
+
+from tiseg.models.segmentors.dist import dynamic_watershed_alias
+from tiseg.models.utils import align_foreground, mudslide_watershed
+
+
+def synthetic_maps(size, num_insts, seed=0):
+    """Generate random touching nuclei-like instances & related maps."""
+    rng = np.random.default_rng(seed)
+    markers = np.zeros((size, size), dtype=np.int32)
+    markers[rng.integers(0, size, num_insts), rng.integers(0, size, num_insts)] = np.arange(1, num_insts + 1)
+    dist = distance_transform_edt(markers == 0)
+    inst_map = watershed(dist, markers, mask=dist < 8)
+
+    fore = binary_dilation(inst_map > 0, iterations=3)
+    inst_pred = measure.label(binary_erosion(inst_map > 0, iterations=2))
+    dir_map = rng.integers(0, 9, (size, size))
+    dir_map[inst_map == 0] = 0
+    dist_map = gaussian_filter(rng.random((size, size)), 4)
+    dist_map = (dist_map - dist_map.min()) / (dist_map.max() - dist_map.min()) * 300 - 40
+
+    return inst_map, fore, inst_pred, dir_map, dist_map
+
+
+def timeit(func, repeat):
+    # the first call includes numba compilation so skip it
+    func()
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start_time) / repeat
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Test postprocess latency on synthetic maps.')
+    parser.add_argument('--size', type=int, default=1000, help='height & width of synthetic maps.')
+    parser.add_argument('--num-insts', type=int, default=2000, help='the number of synthetic instances.')
+    parser.add_argument('--repeat', type=int, default=10, help='the number of repeat times.')
+    args = parser.parse_args()
+    return args
+
+
+def main():
+    args = parse_args()
+
+    inst_map, fore, inst_pred, dir_map, dist_map = synthetic_maps(args.size, args.num_insts)
+    dist_map = np.clip(dist_map, 0, 255).astype(np.uint8)
+
+    results = {
+        'align_foreground': timeit(lambda: align_foreground(inst_pred.copy(), fore, 20), args.repeat),
+        'mudslide_watershed': timeit(lambda: mudslide_watershed(inst_map > 0, dir_map.copy(), fore.copy()),
+                                     args.repeat),
+        'dist_postprocess': timeit(lambda: dynamic_watershed_alias(dist_map, 0.0, 0.5), args.repeat),
+    }
+
+    for name, elapsed in results.items():
+        print(f'{name:<20}: {elapsed * 1000:.2f} ms / {args.size}x{args.size} map')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+import argparse
+import copy
+import itertools
+import time
+
+import torch
+from mmcv import Config
+from mmcv.runner import build_optimizer
+
+from tiseg.datasets import build_dataloader, build_dataset
+from tiseg.models import build_segmentor
+from tiseg.utils import build_grad_scaler, get_device, wrap_inference_model
+
+
+def test_train_memory(data_loader, model, optimizer, total_iters, cumulative_iters, device, precision='fp32'):
+    """Run training iterations and return (samples / s, optimizer steps / s,
+    peak memory in MB)."""
+    # the first several iterations may be very slow so skip them
+    num_warmup = 2 * cumulative_iters
+    pure_train_time = 0
+    num_samples = 0
+    # keep log variables on device, avoid host syncs of logging
+    model.module.deferred_logging = True
+    model.module.train_precision = precision
+    loss_scaler = build_grad_scaler(device, precision)
+
+    if device.type == 'cuda':
+        torch.cuda.reset_peak_memory_stats(device)
+
+    optimizer.zero_grad()
+    data_iter = iter(data_loader)
+    for i in range(num_warmup + total_iters * cumulative_iters):
+        try:
+            data = next(data_iter)
+        except StopIteration:
+            data_iter = iter(data_loader)
+            data = next(data_iter)
+
+        if device.type == 'cuda':
+            torch.cuda.synchronize(device)
+        start_time = time.perf_counter()
+
+        outputs = model.train_step(data, optimizer)
+        loss_scaler.scale(outputs['loss'] / cumulative_iters).backward()
+        if (i + 1) % cumulative_iters == 0:
+            loss_scaler.step(optimizer)
+            loss_scaler.update()
+            optimizer.zero_grad()
+
+        if device.type == 'cuda':
+            torch.cuda.synchronize(device)
+        elapsed = time.perf_counter() - start_time
+
+        if i >= num_warmup:
+            pure_train_time += elapsed
+            num_samples += outputs['num_samples']
+
+    peak_memory = torch.cuda.max_memory_allocated(device) / 2**20 if device.type == 'cuda' else float('nan')
+
+    return num_samples / pure_train_time, total_iters / pure_train_time, peak_memory
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Test model training speed & memory of activation checkpointing and mixed precision.')
+    parser.add_argument('config', help='train config file path.')
+    parser.add_argument(
+        '--with-cp',
+        nargs='+',
+        default=['none', 'backbone', 'backbone,head,dgm'],
+        help='checkpointing settings to compare, each one is "none", "all" or comma separated parts of '
+        '"backbone,head,dgm".')
+    parser.add_argument(
+        '--precision',
+        nargs='+',
+        default=['fp32'],
+        choices=['fp32', 'bf16', 'fp16'],
+        help='training precisions to compare.')
+    parser.add_argument('--crop-size', type=int, nargs=2, default=None, help='training crop size (h, w).')
+    parser.add_argument('--samples-per-gpu', type=int, default=None, help='micro batch size.')
+    parser.add_argument('--cumulative-iters', type=int, default=1, help='the number of accumulated micro batches.')
+    parser.add_argument('--total-iters', type=int, default=20, help='the number of optimizer steps to test.')
+    parser.add_argument(
+        '--device', default='auto', type=str, help='The training device (auto, cpu, cuda, cuda:1, ...).')
+    args = parser.parse_args()
+    return args
+
+
+def main():
+    args = parse_args()
+
+    cfg = Config.fromfile(args.config)
+    torch.backends.cudnn.benchmark = cfg.get('cudnn_benchmark', False)
+    cfg.model.pretrained = None
+
+    if args.samples_per_gpu is not None:
+        cfg.data.samples_per_gpu = args.samples_per_gpu
+    if args.crop_size is not None:
+        for process in cfg.data.train.processes:
+            if process['type'] == 'RandomCrop':
+                process['crop_size'] = tuple(args.crop_size)
+            elif process['type'] == 'Pad':
+                process['pad_size'] = tuple(args.crop_size)
+
+    dataset = build_dataset(cfg.data.train)
+    data_loader = build_dataloader(
+        dataset, cfg.data.samples_per_gpu, cfg.data.workers_per_gpu, dist=False, shuffle=True, drop_last=True)
+
+    device = get_device(args.device)
+    results = []
+    for precision, with_cp in itertools.product(args.precision, args.with_cp):
+        model_cfg = copy.deepcopy(cfg.model)
+        if with_cp in ['none', 'all']:
+            model_cfg.train_cfg.with_cp = with_cp == 'all'
+        else:
+            model_cfg.train_cfg.with_cp = with_cp.split(',')
+
+        model = build_segmentor(model_cfg)
+        model = wrap_inference_model(model, device)
+        model.train()
+        optimizer = build_optimizer(model.module, cfg.optimizer)
+
+        sample_fps, step_fps, peak_memory = test_train_memory(data_loader, model, optimizer, args.total_iters,
+                                                              args.cumulative_iters, device, precision)
+        print(f'precision: {precision}, with_cp: {with_cp:<20} {sample_fps:.2f} img / s, {step_fps:.3f} step / s, '
+              f'peak memory: {peak_memory:.0f} MB')
+        results.append((precision, with_cp, sample_fps, step_fps, peak_memory))
+
+        del model, optimizer
+        if device.type == 'cuda':
+            torch.cuda.empty_cache()
+
+    crop_size = 'x'.join(str(x) for x in args.crop_size) if args.crop_size is not None else 'default'
+    print(f'\ncrop size: {crop_size}, micro batch: {cfg.data.samples_per_gpu}, '
+          f'cumulative iters: {args.cumulative_iters}')
+    print(f'{"precision":<9} | {"with_cp":<20} | {"img / s":>8} | {"step / s":>8} | {"peak memory (MB)":>16}')
+    for precision, with_cp, sample_fps, step_fps, peak_memory in results:
+        print(f'{precision:<9} | {with_cp:<20} | {sample_fps:>8.2f} | {step_fps:>8.3f} | {peak_memory:>16.0f}')
+
+
+if __name__ == '__main__':
+    main()
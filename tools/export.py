@@ -0,0 +1,68 @@
+import argparse
+import os.path as osp
+
+import mmcv
+import torch
+from mmcv.runner import load_checkpoint
+
+from tiseg.apis import build_exported_segmentor, export_calculate
+from tiseg.models import build_segmentor
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='export calculate() of a segmentor to TorchScript/ONNX')
+    parser.add_argument('config', help='test config file path.')
+    parser.add_argument('checkpoint', help='checkpoint file.')
+    parser.add_argument('--out-dir', default='.exported', type=str, help='The storage folder of exported files.')
+    parser.add_argument(
+        '--format', nargs='+', default=['torchscript', 'onnx'], choices=['torchscript', 'onnx'], help='export formats.')
+    parser.add_argument('--shape', nargs=2, type=int, default=None, help='height & width of dummy input.')
+    parser.add_argument('--opset-version', type=int, default=13, help='ONNX opset version.')
+    parser.add_argument('--verify', action='store_true', help='Whether to compare exported outputs with eager ones.')
+    args = parser.parse_args()
+    return args
+
+
+def main():
+    args = parse_args()
+
+    cfg = mmcv.Config.fromfile(args.config)
+
+    # build the model and load checkpoint
+    model = build_segmentor(cfg.model, train_cfg=cfg.get('train_cfg'), test_cfg=cfg.get('test_cfg'))
+    _ = load_checkpoint(model, args.checkpoint, map_location='cpu')
+    model.eval()
+
+    if args.shape is None:
+        h, w = cfg.get('test_cfg', {}).get('crop_size', (256, 256))
+    else:
+        h, w = args.shape
+
+    mmcv.mkdir_or_exist(osp.abspath(args.out_dir))
+    name = osp.splitext(osp.basename(args.config))[0]
+    torchscript_file = osp.join(args.out_dir, f'{name}.pt') if 'torchscript' in args.format else None
+    onnx_file = osp.join(args.out_dir, f'{name}.onnx') if 'onnx' in args.format else None
+
+    export_calculate(model, (1, 3, h, w), torchscript_file, onnx_file, args.opset_version)
+
+    if args.verify:
+        # use another batch size to check dynamic axes
+        img = torch.rand((2, 3, h, w))
+        with torch.no_grad():
+            outputs = model.calculate(img)
+        outputs = outputs if isinstance(outputs, (tuple, list)) else (outputs, )
+        for exported_file in [torchscript_file, onnx_file]:
+            if exported_file is None:
+                continue
+            # compare the segmentor built on exported graph, which is how the
+            # exported graph runs in inference.
+            exported_model = build_exported_segmentor(cfg.model, exported_file)
+            with torch.no_grad():
+                exported_outputs = exported_model.run_calculate(img)
+            exported_outputs = exported_outputs if isinstance(exported_outputs, (tuple, list)) else (exported_outputs, )
+            max_diff = max(float((x - y).abs().max()) for x, y in zip(outputs, exported_outputs))
+            print(f'{exported_file}: max abs diff {max_diff:.6f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -9,8 +9,11 @@ import matplotlib.pyplot as plt
 from mmcv.runner import load_checkpoint
 from PIL import Image
 
+from tiseg.apis import build_exported_segmentor
 from tiseg.datasets.ops import TorchFormatting, Normalize
 from tiseg.models import build_segmentor
+from tiseg.models.utils import fuse_for_inference
+from tiseg.utils import get_device
 
 
 def read_image(path):
@@ -55,11 +58,18 @@ def pillow_load(img_path):
 def parse_args():
     parser = argparse.ArgumentParser(description='test (and eval) a model')
     parser.add_argument('config', help='test config file path.')
-    parser.add_argument('checkpoint', help='checkpoint file.')
+    parser.add_argument('checkpoint', help='checkpoint file (unused with --exported).')
     parser.add_argument('img_path', help='The inference image path.')
     parser.add_argument('--show', action='store_true', help='Whether to illustrate evaluation results.')
     parser.add_argument(
         '--show-folder', default='.nuclei_show', type=str, help='The storage folder of illustration results.')
+    parser.add_argument(
+        '--device', default='auto', type=str, help='The inference device (auto, cpu, cuda, cuda:1, ...).')
+    parser.add_argument('--num-threads', type=int, default=None, help='The number of threads for cpu inference.')
+    parser.add_argument(
+        '--exported', default=None, type=str, help='The exported graph (.pt or .onnx) to run.')
+    parser.add_argument('--channels-last', action='store_true', help='Whether to use channels last memory format.')
+    parser.add_argument('--fuse', action='store_true', help='Whether to fold BN layers into conv layers.')
     args = parser.parse_args()
     return args
 
@@ -73,11 +83,23 @@ def main():
     if cfg.get('cudnn_benchmark', False):
         torch.backends.cudnn.benchmark = True
 
-    # build the model and load checkpoint
-    model = build_segmentor(cfg.model, train_cfg=cfg.get('train_cfg'), test_cfg=cfg.get('test_cfg'))
-    _ = load_checkpoint(model, args.checkpoint, map_location='cpu')
+    device = get_device(args.device)
+    if device.type == 'cpu' and args.num_threads is not None:
+        torch.set_num_threads(args.num_threads)
+
+    if args.exported is not None:
+        # run on exported graph without building network & loading checkpoint
+        model = build_exported_segmentor(cfg.model, args.exported, device)
+    else:
+        # build the model and load checkpoint
+        model = build_segmentor(cfg.model, train_cfg=cfg.get('train_cfg'), test_cfg=cfg.get('test_cfg'))
+        _ = load_checkpoint(model, args.checkpoint, map_location='cpu')
+        model = model.to(device).eval()
+        if args.fuse:
+            model = fuse_for_inference(model)
+        if args.channels_last:
+            model = model.to(memory_format=torch.channels_last)
 
-    model = model.cuda().eval()
     img = read_image(args.img_path)
 
     data = {}
@@ -89,8 +111,9 @@ def main():
     trans_pre = [Normalize(), TorchFormatting(data_keys=['img'], label_keys=[])]
     for p in trans_pre:
         data = p(data)
-    data['data']['img'] = data['data']['img'][None, ...].cuda()
-    res = model(**data)[0]
+    data['data']['img'] = data['data']['img'][None, ...].to(device)
+    with torch.no_grad():
+        res = model(**data)[0]
 
     plt.subplot(131)
     plt.imshow(img)
@@ -5,13 +5,15 @@ import pickle
 
 import mmcv
 import torch
-from mmcv.parallel import MMDataParallel, MMDistributedDataParallel
+from mmcv.parallel import MMDistributedDataParallel
 from mmcv.runner import get_dist_info, init_dist, load_checkpoint
 from mmcv.utils import DictAction, get_logger
 
 from tiseg.apis import multi_gpu_test, single_gpu_test
-from tiseg.datasets import build_dataloader, build_dataset
+from tiseg.datasets import DevicePrefetcher, build_dataloader, build_dataset
 from tiseg.models import build_segmentor
+from tiseg.models.utils import fuse_for_inference
+from tiseg.utils import get_device, wrap_inference_model
 
 
 def parse_args():
@@ -22,6 +24,13 @@ def parse_args():
     parser.add_argument(
         '--show-folder', default='.nuclei_show', type=str, help='The storage folder of illustration results.')
     parser.add_argument('--eval-options', nargs='+', action=DictAction, help='custom options for evaluation')
+    parser.add_argument(
+        '--device', default='auto', type=str, help='The inference device (auto, cpu, cuda, cuda:1, ...).')
+    parser.add_argument('--num-threads', type=int, default=None, help='The number of threads for cpu inference.')
+    parser.add_argument('--channels-last', action='store_true', help='Whether to use channels last memory format.')
+    parser.add_argument('--fuse', action='store_true', help='Whether to fold BN layers into conv layers.')
+    parser.add_argument(
+        '--prefetch', type=int, default=0, help='The number of batches prefetched to device (0 means no prefetch).')
     parser.add_argument('--launcher', choices=['none', 'pytorch', 'slurm', 'mpi'], default='none', help='job launcher')
     parser.add_argument('--local_rank', type=int, default=0)
     args = parser.parse_args()
@@ -58,9 +67,15 @@ def main():
     log_file = osp.join(eval_dir, 'eval.log')
     logger = get_logger(name='TorchImageSeg', log_file=log_file, log_level=cfg.log_level)
 
+    # test in the same precision as mixed precision training
+    if cfg.get('amp', None) is not None and cfg.model.get('test_cfg', None) is not None:
+        cfg.model.test_cfg.setdefault('precision', cfg.amp.get('precision', 'fp16'))
+
     # build the model and load checkpoint
     model = build_segmentor(cfg.model, train_cfg=cfg.get('train_cfg'), test_cfg=cfg.get('test_cfg'))
     _ = load_checkpoint(model, args.checkpoint, map_location='cpu')
+    if args.fuse:
+        model = fuse_for_inference(model.eval())
 
     if not isinstance(cfg.data.test, list):
         cfg.data.test = [cfg.data.test]
@@ -90,16 +105,24 @@ def main():
                 os.makedirs(args.show_folder, 0o775)
 
         # clean gpu memory when starting a new evaluation.
-        torch.cuda.empty_cache()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+        if args.prefetch > 0:
+            device = get_device(args.device) if not distributed else torch.device('cuda', torch.cuda.current_device())
+            data_loader = DevicePrefetcher(data_loader, device, num_prefetch=args.prefetch)
 
         if not distributed:
-            model = MMDataParallel(model, device_ids=[0])
-            results = single_gpu_test(model, data_loader, pre_eval=True, pre_eval_args=eval_kwargs)
+            test_model = wrap_inference_model(model, args.device, args.num_threads, args.channels_last)
+            results = single_gpu_test(test_model, data_loader, pre_eval=True, pre_eval_args=eval_kwargs)
         else:
             model = MMDistributedDataParallel(
                 model.cuda(), device_ids=[torch.cuda.current_device()], broadcast_buffers=False)
             results = multi_gpu_test(model, data_loader, pre_eval=True, pre_eval_args=eval_kwargs)
 
+        if args.prefetch > 0:
+            logger.info(f'prefetch metrics: {data_loader.metrics}')
+
         rank, _ = get_dist_info()
         if rank == 0:
             ckpt_name = osp.splitext(osp.basename(args.checkpoint))[0]